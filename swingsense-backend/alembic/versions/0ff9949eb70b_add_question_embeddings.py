@@ -0,0 +1,35 @@
+"""add_question_embeddings
+
+Revision ID: 0ff9949eb70b
+Revises: 4d1e7b93a0f5
+Create Date: 2026-10-18 09:12:03.481220
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from pgvector.sqlalchemy import Vector
+
+
+# revision identifiers, used by Alembic.
+revision = '0ff9949eb70b'
+down_revision = '4d1e7b93a0f5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute('create extension if not exists vector')
+    op.add_column('swing_questions', sa.Column('embedding', Vector(1536), nullable=True))
+    # HNSW index for cosine nearest-neighbour lookups from the semantic cache
+    op.create_index(
+        'ix_swing_questions_embedding',
+        'swing_questions',
+        ['embedding'],
+        postgresql_using='hnsw',
+        postgresql_ops={'embedding': 'vector_cosine_ops'},
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_swing_questions_embedding', table_name='swing_questions')
+    op.drop_column('swing_questions', 'embedding')
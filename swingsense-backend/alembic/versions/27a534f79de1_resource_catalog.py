@@ -0,0 +1,81 @@
+"""resource_catalog
+
+Revision ID: 27a534f79de1
+Revises: 86aafcb259bc
+Create Date: 2026-10-18 11:31:52.660418
+
+"""
+import re
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '27a534f79de1'
+down_revision = '86aafcb259bc'
+branch_labels = None
+depends_on = None
+
+# frozen copy of app.routers.resources.normalize_issue as of this revision:
+# stored keys must match what lookups compute
+_FILLER_WORDS = {
+    "a", "an", "the", "my", "i", "im", "how", "to", "do", "fix", "fixing", "stop",
+    "stopping", "with", "on", "of", "for", "help", "keep", "keeps", "is",
+}
+_NON_WORD_RE = re.compile(r"[^a-z0-9]+")
+_BATCH = 1000
+
+
+def _normalize_issue(issue: str) -> str:
+    words = [w for w in _NON_WORD_RE.sub(" ", issue.lower()).split() if w not in _FILLER_WORDS]
+    return " ".join(words) or issue.strip().lower()
+
+
+def upgrade() -> None:
+    op.execute('create extension if not exists pg_trgm')
+    op.add_column('resources', sa.Column('issue_key', sa.Text(), nullable=True))
+    op.add_column('resources', sa.Column('title', sa.Text(), nullable=True))
+    op.add_column('resources', sa.Column('description', sa.Text(), nullable=True))
+    op.add_column('resources', sa.Column('position', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('resources', sa.Column('refreshed_at', postgresql.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=True))
+    conn = op.get_bind()
+    rows = conn.execute(sa.text("select id, issue from resources")).all()
+    keys = [{"id": r.id, "issue_key": _normalize_issue(r.issue)} for r in rows]
+    update = sa.text("update resources set issue_key = :issue_key where id = :id")
+    for i in range(0, len(keys), _BATCH):
+        conn.execute(update, keys[i:i + _BATCH])
+    # several old issue spellings can share a key: keep one row per (issue_key, url)
+    op.execute("""
+        delete from resources r using (
+            select id, row_number() over (partition by issue_key, url order by id) as n from resources
+        ) d
+        where r.id = d.id and d.n > 1
+    """)
+    # distinct positions per key so catalog order is well defined
+    op.execute("""
+        update resources r set position = d.n - 1 from (
+            select id, row_number() over (partition by issue_key order by id) as n from resources
+        ) d
+        where r.id = d.id
+    """)
+    op.alter_column('resources', 'issue_key', nullable=False)
+    op.create_unique_constraint('uq_resources_issue_key_url', 'resources', ['issue_key', 'url'])
+    op.create_index(
+        'ix_resources_issue_key_trgm',
+        'resources',
+        ['issue_key'],
+        postgresql_using='gin',
+        postgresql_ops={'issue_key': 'gin_trgm_ops'},
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_resources_issue_key_trgm', table_name='resources')
+    op.drop_constraint('uq_resources_issue_key_url', 'resources', type_='unique')
+    op.drop_column('resources', 'refreshed_at')
+    op.drop_column('resources', 'position')
+    op.drop_column('resources', 'description')
+    op.drop_column('resources', 'title')
+    op.drop_column('resources', 'issue_key')
@@ -0,0 +1,27 @@
+"""add_structured_plan_weeks
+
+Revision ID: 3e9b71c5d8a2
+Revises: d83f6a0b2c14
+Create Date: 2026-10-18 18:12:37.051846
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '3e9b71c5d8a2'
+down_revision = 'd83f6a0b2c14'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('training_plans', sa.Column('summary', sa.Text(), nullable=True))
+    op.add_column('training_plans', sa.Column('weeks', postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('training_plans', 'weeks')
+    op.drop_column('training_plans', 'summary')
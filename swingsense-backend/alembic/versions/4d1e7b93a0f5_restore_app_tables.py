@@ -0,0 +1,73 @@
+"""restore_app_tables
+
+Revision ID: 4d1e7b93a0f5
+Revises: 56ae12611a5c
+Create Date: 2026-10-18 08:55:37.902114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4d1e7b93a0f5'
+down_revision = '56ae12611a5c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # 56ae12611a5c dropped the app's tables, which were then recreated from
+    # app/db/models.py outside of alembic. Create them as the models defined
+    # them at that point, so a fresh database can be migrated to head;
+    # databases that already have them are left alone.
+    op.execute("""
+    create table if not exists swing_questions(
+        id uuid primary key,
+        user_id uuid,
+        question text not null,
+        created_at timestamptz default now()
+    );
+
+    create table if not exists swing_feedback(
+        id uuid primary key,
+        question_id uuid references swing_questions(id) on delete cascade,
+        feedback text not null,
+        created_at timestamptz default now()
+    );
+
+    create table if not exists training_plans(
+        id uuid primary key,
+        user_id uuid,
+        plan text not null,
+        years_played integer not null,
+        handicap double precision not null,
+        strengths text not null,
+        weaknesses text not null,
+        goals text not null,
+        created_at timestamptz default now()
+    );
+
+    create table if not exists progress_metrics(
+        id uuid primary key,
+        user_id uuid,
+        metric jsonb not null,
+        created_at timestamptz default now()
+    );
+
+    create table if not exists resources(
+        id uuid primary key,
+        issue text not null,
+        url text not null
+    );
+    """)
+
+
+def downgrade() -> None:
+    op.execute("""
+    drop table if exists resources;
+    drop table if exists progress_metrics;
+    drop table if exists training_plans;
+    drop table if exists swing_feedback;
+    drop table if exists swing_questions;
+    """)
@@ -18,13 +18,14 @@ depends_on = None
 
 def upgrade() -> None:
     # ### commands auto generated by Alembic - please adjust! ###
-    op.drop_table('users')
     op.drop_table('training_plans')
     op.drop_table('profiles')
     op.drop_table('swing_feedback')
     op.drop_table('swing_questions')
     op.drop_table('progress_metrics')
     op.drop_table('resources')
+    # last: the tables above reference it
+    op.drop_table('users')
     # ### end Alembic commands ###
 
 
@@ -0,0 +1,39 @@
+"""progress_metrics_user_index
+
+Revision ID: 5b8e02f4d7a3
+Revises: c41d7e9a2b60
+Create Date: 2026-10-18 12:52:27.406113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b8e02f4d7a3'
+down_revision = 'c41d7e9a2b60'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # btree rather than BRIN: rows from many users interleave, and client-supplied
+    # recorded_at timestamps arrive out of order, so created_at is not physically sorted
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_progress_metrics_user_created',
+            'progress_metrics',
+            ['user_id', sa.text('created_at DESC'), sa.text('id DESC')],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_progress_metrics_user_created',
+            table_name='progress_metrics',
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
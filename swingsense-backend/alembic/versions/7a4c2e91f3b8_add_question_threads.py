@@ -0,0 +1,46 @@
+"""add_question_threads
+
+Revision ID: 7a4c2e91f3b8
+Revises: 3e9b71c5d8a2
+Create Date: 2026-10-18 19:31:08.442170
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7a4c2e91f3b8'
+down_revision = '3e9b71c5d8a2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('swing_questions', sa.Column('thread_id', sa.UUID(), nullable=True))
+    op.add_column('swing_questions', sa.Column('thread_summary', sa.Text(), nullable=True))
+    op.add_column('swing_questions', sa.Column('thread_summary_until', sa.TIMESTAMP(timezone=True), nullable=True))
+    op.create_foreign_key(
+        'swing_questions_thread_id_fkey', 'swing_questions', 'swing_questions',
+        ['thread_id'], ['id'], ondelete='CASCADE',
+    )
+    # follow-ups of one thread, newest first (context window); only follow-ups have a thread_id
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_swing_questions_thread_created',
+            'swing_questions',
+            ['thread_id', sa.text('created_at DESC'), sa.text('id DESC')],
+            postgresql_where=sa.text('thread_id IS NOT NULL'),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_swing_questions_thread_created', table_name='swing_questions',
+                      postgresql_concurrently=True, if_exists=True)
+    op.drop_constraint('swing_questions_thread_id_fkey', 'swing_questions', type_='foreignkey')
+    op.drop_column('swing_questions', 'thread_summary_until')
+    op.drop_column('swing_questions', 'thread_summary')
+    op.drop_column('swing_questions', 'thread_id')
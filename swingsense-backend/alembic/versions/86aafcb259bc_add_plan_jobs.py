@@ -0,0 +1,48 @@
+"""add_plan_jobs
+
+Revision ID: 86aafcb259bc
+Revises: f7c58c7d4bfb
+Create Date: 2026-10-18 10:47:15.902364
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '86aafcb259bc'
+down_revision = 'f7c58c7d4bfb'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('plan_jobs',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('status', sa.Text(), nullable=False),
+    sa.Column('payload', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('max_attempts', sa.Integer(), nullable=False),
+    sa.Column('run_after', postgresql.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('locked_at', postgresql.TIMESTAMP(timezone=True), nullable=True),
+    sa.Column('plan_id', sa.UUID(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('created_at', postgresql.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('started_at', postgresql.TIMESTAMP(timezone=True), nullable=True),
+    sa.Column('finished_at', postgresql.TIMESTAMP(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['plan_id'], ['training_plans.id'], ondelete='SET NULL'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    # workers only ever scan claimable jobs
+    op.create_index(
+        'ix_plan_jobs_claimable',
+        'plan_jobs',
+        ['status', 'run_after'],
+        postgresql_where=sa.text("status in ('queued', 'running')"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_plan_jobs_claimable', table_name='plan_jobs')
+    op.drop_table('plan_jobs')
@@ -0,0 +1,31 @@
+"""add_user_data_versions
+
+Revision ID: a7f3d95c6e21
+Revises: e93a6c1f08d4
+Create Date: 2026-10-18 14:05:13.582640
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7f3d95c6e21'
+down_revision = 'e93a6c1f08d4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('user_data_versions',
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('scope', sa.Text(), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.Column('updated_at', postgresql.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('user_id', 'scope')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('user_data_versions')
@@ -0,0 +1,32 @@
+"""add_training_plan_status
+
+Revision ID: b2f6d41c8e07
+Revises: 7a4c2e91f3b8
+Create Date: 2026-10-19 09:14:52.306118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b2f6d41c8e07'
+down_revision = '7a4c2e91f3b8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'training_plans',
+        sa.Column('status', sa.Text(), nullable=False, server_default='complete'),
+    )
+    # plans saved from an interrupted stream: fewer than four weeks and no summary
+    op.execute("""
+        update training_plans set status = 'partial'
+        where weeks is not null and summary is null and jsonb_array_length(weeks) < 4
+    """)
+
+
+def downgrade() -> None:
+    op.drop_column('training_plans', 'status')
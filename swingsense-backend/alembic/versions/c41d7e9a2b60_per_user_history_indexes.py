@@ -0,0 +1,69 @@
+"""per_user_history_indexes
+
+Revision ID: c41d7e9a2b60
+Revises: 27a534f79de1
+Create Date: 2026-10-18 12:14:05.338190
+
+"""
+import uuid
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41d7e9a2b60'
+down_revision = '27a534f79de1'
+branch_labels = None
+depends_on = None
+
+# (index name, table) - each matches ORDER BY created_at DESC, id DESC within one user
+HISTORY_INDEXES = [
+    ('ix_swing_questions_user_created', 'swing_questions'),
+    ('ix_swing_feedback_user_created', 'swing_feedback'),
+    ('ix_training_plans_user_created', 'training_plans'),
+]
+_BACKFILL_BATCH = 5000
+
+# copy the question owner onto the next batch of feedback rows (in id order); returns the batch's last id
+_BACKFILL_SQL = sa.text("""
+    with batch as (
+        select id, question_id from swing_feedback
+        where id > :after order by id limit :batch
+    ), updated as (
+        update swing_feedback f set user_id = q.user_id
+        from batch b join swing_questions q on q.id = b.question_id
+        where f.id = b.id and q.user_id is not null
+    )
+    select id from batch order by id desc limit 1
+""")
+
+
+def upgrade() -> None:
+    op.add_column('swing_feedback', sa.Column('user_id', sa.UUID(), nullable=True))
+    # CONCURRENTLY cannot run inside a transaction; it avoids locking writes on large tables
+    with op.get_context().autocommit_block():
+        # backfill in keyset batches, each committed on its own, so a large
+        # swing_feedback is never locked by one table-long transaction
+        conn = op.get_bind()
+        after = uuid.UUID(int=0)
+        while True:
+            last_id = conn.execute(_BACKFILL_SQL, {"after": after, "batch": _BACKFILL_BATCH}).scalar()
+            if last_id is None:
+                break
+            after = last_id
+        for name, table in HISTORY_INDEXES:
+            op.create_index(
+                name,
+                table,
+                ['user_id', sa.text('created_at DESC'), sa.text('id DESC')],
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table in HISTORY_INDEXES:
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+    op.drop_column('swing_feedback', 'user_id')
@@ -0,0 +1,58 @@
+"""restore_users_and_profiles
+
+Revision ID: d83f6a0b2c14
+Revises: b5d2e8f41c97
+Create Date: 2026-10-18 17:05:12.604218
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd83f6a0b2c14'
+down_revision = 'b5d2e8f41c97'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('users',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('email', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('profiles',
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('name', sa.Text(), nullable=True),
+    sa.Column('years_played', sa.Integer(), nullable=True),
+    sa.Column('handicap', sa.Float(), nullable=True),
+    sa.Column('strengths', sa.Text(), nullable=True),
+    sa.Column('weaknesses', sa.Text(), nullable=True),
+    sa.Column('goals', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('updated_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+    # every user who already owns data gets a row, so joins on user_id find them
+    op.execute("""
+        insert into users (id)
+        select user_id from swing_questions where user_id is not null
+        union select user_id from training_plans where user_id is not null
+        union select user_id from progress_metrics where user_id is not null
+        on conflict do nothing
+    """)
+    # start profiles from each user's latest plan inputs
+    op.execute("""
+        insert into profiles (user_id, years_played, handicap, strengths, weaknesses, goals)
+        select distinct on (user_id) user_id, years_played, handicap, strengths, weaknesses, goals
+        from training_plans where user_id is not null
+        order by user_id, created_at desc
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('profiles')
+    op.drop_table('users')
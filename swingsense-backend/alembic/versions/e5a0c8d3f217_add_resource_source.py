@@ -0,0 +1,29 @@
+"""add_resource_source
+
+Revision ID: e5a0c8d3f217
+Revises: b2f6d41c8e07
+Create Date: 2026-10-19 11:02:18.447391
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a0c8d3f217'
+down_revision = 'b2f6d41c8e07'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'resources',
+        sa.Column('source', sa.Text(), nullable=False, server_default='llm'),
+    )
+    # rows from before the catalog (no title) were curated by hand; the LLM always sets one
+    op.execute("update resources set source = 'imported' where title is null")
+
+
+def downgrade() -> None:
+    op.drop_column('resources', 'source')
@@ -0,0 +1,38 @@
+"""add_progress_rollups
+
+Revision ID: e93a6c1f08d4
+Revises: 5b8e02f4d7a3
+Create Date: 2026-10-18 13:26:48.771902
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'e93a6c1f08d4'
+down_revision = '5b8e02f4d7a3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # fill it afterwards with: python -m app.db.rollups rebuild
+    op.create_table('progress_rollups',
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('period', sa.Text(), nullable=False),
+    sa.Column('period_start', sa.Date(), nullable=False),
+    sa.Column('metric_key', sa.Text(), nullable=False),
+    sa.Column('count', sa.BigInteger(), nullable=False),
+    sa.Column('sum', sa.Float(), nullable=False),
+    sa.Column('min', sa.Float(), nullable=False),
+    sa.Column('max', sa.Float(), nullable=False),
+    sa.Column('sumsq', sa.Float(), nullable=False),
+    sa.Column('updated_at', postgresql.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('user_id', 'period', 'period_start', 'metric_key')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('progress_rollups')
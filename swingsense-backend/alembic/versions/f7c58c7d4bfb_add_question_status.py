@@ -0,0 +1,29 @@
+"""add_question_status
+
+Revision ID: f7c58c7d4bfb
+Revises: 0ff9949eb70b
+Create Date: 2026-10-18 10:02:41.117093
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f7c58c7d4bfb'
+down_revision = '0ff9949eb70b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # existing rows were written in one transaction together with their feedback
+    op.add_column(
+        'swing_questions',
+        sa.Column('status', sa.Text(), nullable=False, server_default='answered'),
+    )
+    op.alter_column('swing_questions', 'status', server_default='pending')
+
+
+def downgrade() -> None:
+    op.drop_column('swing_questions', 'status')
@@ -1,38 +1,191 @@
 from fastapi import HTTPException, Depends, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from typing import Dict, Any
-import jwt
+from typing import Dict, Any, Optional
+from collections import OrderedDict
+from pathlib import Path
+from urllib.parse import urlparse
+import asyncio
+import hashlib
 import json
+import logging
+import time
+import uuid
+
+import httpx
+import jwt
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
 
 security = HTTPBearer()
 
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> Dict[str, Any]:
+# ---------- Signing keys ----------
+
+class JWKSCache:
+    """
+    In-memory copy of the Supabase JWKS.
+
+    Refreshed periodically by run_refresh_loop (started from the app lifespan)
+    and on demand when a token names a `kid` we don't know yet, i.e. after a
+    key rotation. On-demand refreshes happen at most once per
+    JWKS_MIN_REFRESH_SECONDS so tokens with bogus kids can't hammer the endpoint.
+    The URL may also be a local file path (or file:// URL) for development/tests.
+    """
+
+    def __init__(self, url: str) -> None:
+        self.url = url
+        self._keys: Dict[str, jwt.PyJWK] = {}
+        self._fetched_at = float("-inf")
+        self._lock = asyncio.Lock()
+
+    async def _fetch(self) -> Dict[str, Any]:
+        parsed = urlparse(self.url)
+        if parsed.scheme in ("", "file"):
+            path = parsed.path if parsed.scheme == "file" else self.url
+            return json.loads(await asyncio.to_thread(Path(path).read_text))
+        async with httpx.AsyncClient(timeout=5.0) as http:
+            resp = await http.get(self.url)
+            resp.raise_for_status()
+            return resp.json()
+
+    async def refresh(self) -> None:
+        data = await self._fetch()
+        keys = {}
+        for jwk in data.get("keys", []):
+            try:
+                keys[jwk.get("kid", "")] = jwt.PyJWK(jwk)
+            except jwt.PyJWKError as e:
+                logger.warning("Skipping unusable JWK %s: %s", jwk.get("kid"), e)
+        self._keys = keys
+        self._fetched_at = time.monotonic()
+
+    async def get_key(self, kid: Optional[str]) -> Optional[jwt.PyJWK]:
+        key = self._keys.get(kid or "")
+        if key is not None:
+            return key
+        async with self._lock:
+            # another request may have refreshed while we waited for the lock
+            key = self._keys.get(kid or "")
+            if key is None and time.monotonic() - self._fetched_at >= settings.JWKS_MIN_REFRESH_SECONDS:
+                try:
+                    await self.refresh()
+                except Exception as e:
+                    logger.warning("JWKS refresh failed: %s", e)
+                key = self._keys.get(kid or "")
+        return key
+
+    async def run_refresh_loop(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning("JWKS refresh failed, keeping cached keys: %s", e)
+            await asyncio.sleep(settings.JWKS_REFRESH_SECONDS)
+
+
+jwks = JWKSCache(settings.SUPABASE_JWKS_URL)
+
+# ---------- Verified token cache ----------
+
+class VerifiedTokenCache:
+    """Bounded LRU of verified claims keyed by token hash. Entries expire with the token's `exp`."""
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def get(self, token_hash: str) -> Optional[Dict[str, Any]]:
+        claims = self._entries.get(token_hash)
+        if claims is None:
+            return None
+        if claims["exp"] <= time.time():
+            del self._entries[token_hash]
+            return None
+        self._entries.move_to_end(token_hash)
+        return claims
+
+    def put(self, token_hash: str, claims: Dict[str, Any]) -> None:
+        self._entries[token_hash] = claims
+        self._entries.move_to_end(token_hash)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+
+token_cache = VerifiedTokenCache(settings.AUTH_TOKEN_CACHE_SIZE)
+
+async def verify_token(token: str) -> Dict[str, Any]:
+    """Check signature, expiry and audience. Raises jwt.InvalidTokenError."""
+    header = jwt.get_unverified_header(token)
+    if header.get("alg") == "HS256" and settings.SUPABASE_JWT_SECRET:
+        # legacy Supabase projects sign with the shared JWT secret
+        key, algorithms = settings.SUPABASE_JWT_SECRET, ["HS256"]
+    else:
+        jwk = await jwks.get_key(header.get("kid"))
+        if jwk is None:
+            raise jwt.InvalidTokenError("Unknown signing key")
+        key, algorithms = jwk.key, [jwk.algorithm_name]
+    return jwt.decode(
+        token,
+        key,
+        algorithms=algorithms,
+        audience=settings.JWT_AUDIENCE or None,
+        leeway=settings.JWT_LEEWAY_SECONDS,
+        options={"require": ["exp", "sub"], "verify_aud": bool(settings.JWT_AUDIENCE)},
+    )
+
+def _keys_configured() -> bool:
+    return bool(settings.SUPABASE_JWKS_URL or settings.SUPABASE_JWT_SECRET)
+
+def check_auth_config() -> None:
+    """Called at startup: say loudly when tokens will not be verified, or cannot be."""
+    if _keys_configured():
+        return
+    if settings.AUTH_ALLOW_UNVERIFIED:
+        logger.warning("AUTH_ALLOW_UNVERIFIED=true: JWT signatures are NOT checked; never use this in production")
+    else:
+        logger.error("Neither SUPABASE_JWKS_URL nor SUPABASE_JWT_SECRET is set: every token will be rejected")
+
+async def decode_token(token: str) -> Dict[str, Any]:
+    if not _keys_configured():
+        if not settings.AUTH_ALLOW_UNVERIFIED:
+            # fail closed: a deploy missing its key settings must not accept forged `sub` claims
+            raise jwt.InvalidTokenError("No signing keys configured")
+        # explicit opt-in for local development: decode unverified
+        return jwt.decode(token, options={"verify_signature": False})
+
+    token_hash = hashlib.sha256(token.encode()).hexdigest()
+    claims = token_cache.get(token_hash)
+    if claims is None:
+        claims = await verify_token(token)
+        token_cache.put(token_hash, claims)
+    return claims
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> Dict[str, Any]:
     """
-    Parse JWT token from Authorization header and extract user info.
-    For MVP: decode unverified and extract sub (user_id) and email.
-    TODO: Add JWKS verification for production security.
+    Verify the JWT from the Authorization header and extract user info.
+    Signatures are checked against the cached JWKS (or the Supabase JWT secret for
+    HS256 tokens); already-verified tokens are served from an LRU until they expire.
     """
     try:
-        token = credentials.credentials
-        
-        # For MVP: decode without verification
-        # TODO: Implement JWKS verification for production
-        decoded_token = jwt.decode(token, options={"verify_signature": False})
-        
+        decoded_token = await decode_token(credentials.credentials)
+
         user_id = decoded_token.get("sub")
         email = decoded_token.get("email")
-        
+
         if not user_id:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid token: missing user ID"
             )
-        
+
         return {
             "user_id": user_id,
             "email": email
         }
-        
+
+    except HTTPException:
+        raise
     except jwt.InvalidTokenError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -43,3 +196,13 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail=f"Authentication failed: {str(e)}"
         )
+
+async def get_current_user_id(current_user: Dict[str, Any] = Depends(get_current_user)) -> uuid.UUID:
+    """The authenticated user's id as a UUID, for scoping queries and stamping rows."""
+    try:
+        return uuid.UUID(current_user["user_id"])
+    except (TypeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid token: user ID is not a UUID"
+        )
@@ -0,0 +1,183 @@
+"""
+Conditional GET and a small response cache for per-user read endpoints.
+
+Each cached view belongs to a scope ("questions", "plans"). Every write to a
+scope bumps a per-user version row (user_data_versions) in the same
+transaction, so the version is a validator all worker processes agree on:
+
+- ETag = hash(user, scope, view, query, version). A request whose If-None-Match
+  (or If-Modified-Since) still matches gets 304 after one primary-key lookup,
+  without running the list query or building the body.
+- Rendered bodies are kept in a per-process TTL + LRU cache keyed by the same
+  ETag, so a changed version can never serve a stale body. bump_version()
+  also drops the user's local entries to free the memory straight away.
+
+Bodies are rendered with orjson (ORJSONResponse; pinned in requirements.txt)
+and fall back to the standard JSONResponse if it is missing.
+"""
+from __future__ import annotations
+
+import hashlib
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse, ORJSONResponse
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.models import UserDataVersion
+
+try:
+    import orjson  # noqa: F401
+    FastJSONResponse = ORJSONResponse
+except ImportError:  # optional speedup
+    FastJSONResponse = JSONResponse
+
+# UserDataVersion.scope values
+SCOPE_QUESTIONS = "questions"  # questions, feedback, threads
+SCOPE_PLANS = "plans"
+
+# browsers keep the body but revalidate it on every use
+CACHE_CONTROL = "private, no-cache"
+
+
+class ResponseCache:
+    """Per-process TTL + LRU map of (user, scope, view) -> (etag, rendered body)."""
+
+    def __init__(self, maxsize: int, ttl_seconds: float) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl_seconds
+        self._entries: "OrderedDict[Tuple[uuid.UUID, str, str], Tuple[str, float, bytes, Dict[str, str]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def get(self, key: Tuple[uuid.UUID, str, str], etag: str) -> Optional[Tuple[bytes, Dict[str, str]]]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != etag or entry[1] <= time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[2], entry[3]
+
+    def put(self, key: Tuple[uuid.UUID, str, str], etag: str, body: bytes, headers: Dict[str, str]) -> None:
+        self._entries[key] = (etag, time.monotonic() + self.ttl, body, headers)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: uuid.UUID, scope: str) -> None:
+        for key in [k for k in self._entries if k[0] == user_id and k[1] == scope]:
+            del self._entries[key]
+
+    def info(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "hit_rate": self.hits / lookups if lookups else None,
+        }
+
+
+response_cache = ResponseCache(settings.HTTP_CACHE_MAX_ENTRIES, settings.HTTP_CACHE_TTL_SECONDS)
+
+
+# ---------- Versions ----------
+
+async def bump_version(db: AsyncSession, user_id: Optional[uuid.UUID], scope: str) -> None:
+    """Mark the user's `scope` data as changed. Call inside the write's transaction."""
+    if user_id is None:
+        return
+    stmt = insert(UserDataVersion).values(user_id=user_id, scope=scope, version=1)
+    await db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[UserDataVersion.user_id, UserDataVersion.scope],
+            set_={"version": UserDataVersion.version + 1, "updated_at": func.now()},
+        )
+    )
+    response_cache.invalidate(user_id, scope)
+
+
+async def _current_version(db: AsyncSession, user_id: uuid.UUID, scope: str) -> Tuple[int, Optional[datetime]]:
+    row = (await db.execute(
+        select(UserDataVersion.version, UserDataVersion.updated_at).where(
+            UserDataVersion.user_id == user_id, UserDataVersion.scope == scope
+        )
+    )).first()
+    # no row: nothing written through a versioned path yet, the data is unchanged since deploy
+    return (row.version, row.updated_at) if row else (0, None)
+
+
+# ---------- Conditional GET ----------
+
+def _etag(user_id: uuid.UUID, scope: str, view: str, query: str, version: int) -> str:
+    # the user is part of the tag: versions start at 0 for everyone, so without
+    # it a browser switching accounts would get 304 for the previous user's body
+    digest = hashlib.sha1(f"{user_id}|{scope}|{view}|{query}|{version}".encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def _is_fresh(request: Request, etag: str, last_modified: Optional[datetime]) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # weak comparison: W/"x" matches "x"
+        tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+        return "*" in tags or etag.removeprefix("W/") in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            return last_modified.replace(microsecond=0) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+async def cached_json(
+    request: Request,
+    db: AsyncSession,
+    user_id: uuid.UUID,
+    scope: str,
+    view: str,
+    build: Callable[[], Awaitable[Tuple[Any, Dict[str, str]]]],
+) -> Response:
+    """
+    Serve a per-user JSON view with ETag / Last-Modified.
+    `build` runs only when neither the client nor the local cache has the
+    current version; it returns (content, extra_headers).
+    """
+    version, updated_at = await _current_version(db, user_id, scope)
+    query = str(request.query_params)
+    etag = _etag(user_id, scope, view, query, version)
+    # Vary: a browser keeps one stored body per token, so If-Modified-Since is per user too
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL, "Vary": "Authorization"}
+    if updated_at is not None:
+        headers["Last-Modified"] = format_datetime(updated_at.astimezone(timezone.utc), usegmt=True)
+
+    if _is_fresh(request, etag, updated_at):
+        response_cache.not_modified += 1
+        return Response(status_code=304, headers=headers)
+
+    key = (user_id, scope, f"{view}?{query}")
+    cached = response_cache.get(key, etag) if settings.HTTP_CACHE_ENABLED else None
+    if cached is not None:
+        body, extra = cached
+    else:
+        content, extra = await build()
+        body = FastJSONResponse(content).body
+        if settings.HTTP_CACHE_ENABLED:
+            response_cache.put(key, etag, body, extra)
+    return Response(content=body, media_type="application/json", headers={**headers, **extra})
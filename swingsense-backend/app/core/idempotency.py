@@ -0,0 +1,297 @@
+"""
+Idempotency-Key support for POST endpoints that call the LLM.
+
+Keys belong to a user and live in idempotency_keys, together with a
+fingerprint of the request (endpoint, body and relevant query parameters).
+The first request with a key claims it with INSERT ... ON CONFLICT DO NOTHING
+and runs. Its 2xx response is stored on the row. A retry with the same key:
+
+- after the original finished, gets the stored response straight away
+  (Idempotent-Replayed: true), without an LLM call or new rows;
+- while the original is still running, waits for it for up to
+  IDEMPOTENCY_WAIT_SECONDS, then gets 409 with Retry-After. Waiters in the same
+  process are woken directly; other processes re-read the row;
+- with a different request, gets 422, because the key was reused.
+
+A failed or cancelled request releases its key, so the client's retry runs
+again. A claim left behind by a process that died is taken over once it is
+older than IDEMPOTENCY_LEASE_SECONDS; a request that outlives its lease still
+returns its response, but leaves the new owner's row alone. Rows expire after
+IDEMPOTENCY_TTL_SECONDS, and run_sweeper() deletes them.
+
+No database connection is held while waiting or while the wrapped handler
+runs: every step uses its own short session.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import anyio
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import delete, select, text, update
+from sqlalchemy.dialects.postgresql import insert
+
+from app.core.config import settings
+from app.core.metrics import Counter, registry
+from app.db.models import IDEMPOTENCY_COMPLETED, IDEMPOTENCY_IN_PROGRESS, IdempotencyKey
+from app.db.session import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+
+# re-read an in-progress key this often when its request runs in another process
+_POLL_SECONDS = 1.0
+_SWEEP_BATCH = 1000
+
+outcomes = registry.register(Counter(
+    "idempotency_requests_total",
+    "Requests with an Idempotency-Key: executed, replayed, waited (replayed after waiting), "
+    "mismatch, still_running, lease_lost (finished after another request took the key over)",
+    ("outcome",),
+))
+
+_Key = Tuple[uuid.UUID, str]
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def request_fingerprint(endpoint: str, body: Any, **params: Any) -> str:
+    """Stable hash of what the request asks for; a reused key must match it."""
+    payload = {"endpoint": endpoint, "body": jsonable_encoder(body), "params": jsonable_encoder(params)}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, separators=(",", ":")).encode()).hexdigest()
+
+
+class _Waiters:
+    """Per-key events so retries in this process wake as soon as the original finishes here."""
+
+    def __init__(self) -> None:
+        self._events: Dict[_Key, List[Any]] = {}  # key -> [event, refcount]
+
+    def acquire(self, key: _Key) -> None:
+        self._events.setdefault(key, [asyncio.Event(), 0])[1] += 1
+
+    def event(self, key: _Key) -> asyncio.Event:
+        return self._events[key][0]
+
+    def release(self, key: _Key) -> None:
+        entry = self._events.get(key)
+        if entry is not None:
+            entry[1] -= 1
+            if entry[1] <= 0:
+                del self._events[key]
+
+    def notify(self, key: _Key) -> None:
+        entry = self._events.get(key)
+        if entry is not None:
+            entry[0].set()
+            entry[0] = asyncio.Event()  # later waits block until the next change
+
+
+_waiters = _Waiters()
+
+
+def _pk(user_id: uuid.UUID, key: str):
+    return (IdempotencyKey.user_id == user_id, IdempotencyKey.key == key)
+
+
+async def _claim(
+    user_id: uuid.UUID, key: str, fingerprint: str,
+) -> Tuple[Optional[datetime], Optional[IdempotencyKey]]:
+    """
+    Try to own `key`. Returns (locked_at, None) when this request now owns it,
+    locked_at identifying the lease, (None, row) when another request holds it,
+    and (None, None) when the row changed under us (released or taken over) and
+    the caller should try again.
+    """
+    now = _utcnow()
+    fresh = dict(
+        fingerprint=fingerprint,
+        status=IDEMPOTENCY_IN_PROGRESS,
+        response_status=None,
+        response_body=None,
+        locked_at=now,
+        created_at=now,
+        expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_TTL_SECONDS),
+    )
+    async with AsyncSessionLocal() as db:
+        stmt = (
+            insert(IdempotencyKey)
+            .values(user_id=user_id, key=key, **fresh)
+            .on_conflict_do_nothing(index_elements=[IdempotencyKey.user_id, IdempotencyKey.key])
+            .returning(IdempotencyKey.key)
+        )
+        if (await db.execute(stmt)).first() is not None:
+            await db.commit()
+            return now, None
+
+        row = (await db.execute(select(IdempotencyKey).where(*_pk(user_id, key)))).scalars().first()
+        if row is None:
+            await db.rollback()
+            return None, None
+        abandoned = (
+            row.status == IDEMPOTENCY_IN_PROGRESS
+            and row.locked_at < now - timedelta(seconds=settings.IDEMPOTENCY_LEASE_SECONDS)
+        )
+        if row.expires_at > now and not abandoned:
+            # no rollback(): it would expire `row`; closing the session ends the transaction
+            # and leaves the row's loaded attributes readable
+            return None, row
+
+        # expired or abandoned: take it over, unless another retry got there first
+        result = await db.execute(
+            update(IdempotencyKey)
+            .where(*_pk(user_id, key), IdempotencyKey.locked_at == row.locked_at)
+            .values(**fresh)
+        )
+        await db.commit()
+        if result.rowcount != 1:
+            return None, None
+        if abandoned:
+            logger.warning("Taking over abandoned Idempotency-Key %r for user %s", key, user_id)
+        return now, None
+
+
+def _lease(user_id: uuid.UUID, key: str, locked_at: datetime):
+    # our claim, unless it was taken over as abandoned in the meantime
+    return (*_pk(user_id, key), IdempotencyKey.locked_at == locked_at, IdempotencyKey.status == IDEMPOTENCY_IN_PROGRESS)
+
+
+async def _store_response(user_id: uuid.UUID, key: str, locked_at: datetime, status_code: int, body: Any) -> bool:
+    """Complete our claim with the response. False if the lease was lost, leaving the new owner's row alone."""
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            update(IdempotencyKey)
+            .where(*_lease(user_id, key, locked_at))
+            .values(status=IDEMPOTENCY_COMPLETED, response_status=status_code, response_body=body)
+        )
+        await db.commit()
+    return result.rowcount == 1
+
+
+async def _release(user_id: uuid.UUID, key: str, locked_at: datetime) -> None:
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(IdempotencyKey).where(*_lease(user_id, key, locked_at)))
+        await db.commit()
+
+
+def _replay(row: IdempotencyKey) -> JSONResponse:
+    return JSONResponse(row.response_body, status_code=row.response_status, headers={REPLAYED_HEADER: "true"})
+
+
+async def run_idempotent(
+    user_id: uuid.UUID,
+    key: Optional[str],
+    fingerprint: str,
+    run: Callable[[], Awaitable[Any]],
+    status_code: int = 201,
+) -> Any:
+    """
+    Run `run()` at most once per (user, key) and replay its response to retries.
+    Without a key this is just `await run()`.
+    """
+    if key is None:
+        return await run()
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"{IDEMPOTENCY_HEADER} must be 1-{MAX_KEY_LENGTH} characters")
+
+    waiter_key = (user_id, key)
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+    waited = False
+    _waiters.acquire(waiter_key)
+    try:
+        while True:
+            locked_at, row = await _claim(user_id, key, fingerprint)
+            if locked_at is not None:
+                break
+            if row is None:
+                continue
+            if row.fingerprint != fingerprint:
+                outcomes.inc(outcome="mismatch")
+                raise HTTPException(
+                    status_code=422, detail=f"{IDEMPOTENCY_HEADER} was already used for a different request"
+                )
+            if row.status == IDEMPOTENCY_COMPLETED:
+                outcomes.inc(outcome="waited" if waited else "replayed")
+                return _replay(row)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                outcomes.inc(outcome="still_running")
+                raise HTTPException(
+                    status_code=409,
+                    detail=f"A request with this {IDEMPOTENCY_HEADER} is still in progress",
+                    headers={"Retry-After": "5"},
+                )
+            waited = True
+            try:
+                await asyncio.wait_for(_waiters.event(waiter_key).wait(), timeout=min(remaining, _POLL_SECONDS))
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        _waiters.release(waiter_key)
+
+    outcomes.inc(outcome="executed")
+    try:
+        content = await run()
+        body = jsonable_encoder(content)
+        if not await _store_response(user_id, key, locked_at, status_code, body):
+            # ran longer than IDEMPOTENCY_LEASE_SECONDS and a retry took the key over:
+            # that retry's response is the one stored, this one is still returned
+            outcomes.inc(outcome="lease_lost")
+            logger.warning("Lost the lease on Idempotency-Key %r for user %s before storing the response",
+                           key, user_id)
+    except BaseException:
+        # let the client's retry run the request again; shielded so a disconnect cannot skip it
+        with anyio.CancelScope(shield=True):
+            await _release(user_id, key, locked_at)
+        _waiters.notify(waiter_key)
+        raise
+    _waiters.notify(waiter_key)
+    return JSONResponse(body, status_code=status_code)
+
+
+# ---------- Expiry ----------
+
+_SWEEP_SQL = text("""
+    delete from idempotency_keys
+    where ctid = any(array(
+        select ctid from idempotency_keys where expires_at < now() limit :batch
+    ))
+""")
+
+
+async def sweep_expired() -> int:
+    """Delete expired keys in small batches (short transactions, no long locks)."""
+    deleted = 0
+    while True:
+        async with AsyncSessionLocal() as db:
+            count = (await db.execute(_SWEEP_SQL, {"batch": _SWEEP_BATCH})).rowcount
+            await db.commit()
+        deleted += count
+        if count < _SWEEP_BATCH:
+            return deleted
+
+
+async def run_sweeper() -> None:
+    """Background loop started by the app lifespan."""
+    while True:
+        try:
+            deleted = await sweep_expired()
+            if deleted:
+                logger.info("Deleted %d expired idempotency keys", deleted)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("Idempotency key sweep failed: %s", e)
+        await asyncio.sleep(settings.IDEMPOTENCY_SWEEP_SECONDS)
@@ -0,0 +1,585 @@
+"""
+Gateway for every outbound LLM call (chat, streaming chat, embeddings).
+
+Each call goes through, in order:
+- a circuit breaker that fails fast (CircuitOpenError -> 503) after
+  LLM_BREAKER_FAILURE_THRESHOLD consecutive upstream failures, until a probe
+  call succeeds LLM_BREAKER_RESET_SECONDS later;
+- token buckets sized to the account's request and token quotas
+  (LLM_RPM_LIMIT / LLM_TPM_LIMIT), so bursts queue here instead of
+  coming back as 429s;
+- llm_slots, the per-process cap on in-flight requests;
+- a per-attempt timeout (LLM_TIMEOUT_SECONDS), with up to LLM_MAX_RETRIES
+  retries on 429 / 5xx / timeouts / connection errors. Backoff is full
+  jitter, and never shorter than the server's Retry-After;
+- optionally (LLM_HEDGE_ENABLED) a hedged second request for non-streaming
+  calls that are still running after the observed p95 latency; the first
+  answer wins and the other is cancelled.
+
+There is one AsyncOpenAI client per process, created by the app lifespan with
+create_llm_client() (a pooled keep-alive httpx client, max_retries=0 so
+retries happen only here) and handed to routes through get_llm_client.
+With LLM_MODE=record or replay that client is wrapped by a CassetteClient
+(app/core/llm_cassette.py); replay needs no API key and skips the quota buckets.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+import openai
+from fastapi import HTTPException, Request
+from openai import AsyncOpenAI
+
+from app.core.config import settings
+from app.core.llm_cassette import MODE_LIVE, MODE_RECORD, MODE_REPLAY, MODES, CassetteClient, CassetteStore
+from app.core.metrics import Counter, Gauge, LLMSpan, registry
+from app.core.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Caps in-flight LLM requests per worker process. Handlers are async, so waiting
+# on the model no longer occupies a threadpool worker; this is the only limit.
+llm_slots = asyncio.Semaphore(settings.LLM_MAX_CONCURRENCY)
+
+# Identical concurrent chat requests share one upstream call
+chat_flights = SingleFlight()
+
+
+def prompt_key(model: str, temperature: float, messages: List[Dict[str, str]], **extra: Any) -> str:
+    """Stable hash of everything that determines a completion."""
+    normalized = {
+        "model": model,
+        "temperature": temperature,
+        "messages": [{"role": m["role"], "content": m["content"].strip()} for m in messages],
+        **extra,
+    }
+    return hashlib.sha256(json.dumps(normalized, sort_keys=True).encode()).hexdigest()
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling upstream while the circuit breaker is open."""
+
+    def __init__(self, retry_after: float) -> None:
+        super().__init__(f"LLM upstream unavailable, retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+def llm_http_error(e: Exception) -> HTTPException:
+    """Map a gateway failure to the HTTP error routers return."""
+    if isinstance(e, HTTPException):
+        return e
+    if isinstance(e, CircuitOpenError):
+        return HTTPException(
+            status_code=503, detail=str(e), headers={"Retry-After": str(max(1, round(e.retry_after)))}
+        )
+    return HTTPException(status_code=502, detail=f"LLM error: {e}")
+
+
+# ---------- Building blocks ----------
+
+class TokenBucket:
+    """Refills at `per_minute` / 60 per second up to `per_minute`. A limit of 0 disables it."""
+
+    def __init__(self, per_minute: int) -> None:
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()  # FIFO: earlier callers are served first
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, amount: float) -> bool:
+        if self.rate <= 0:
+            return True
+        if self._lock.locked():
+            return False
+        self._refill()
+        if self.tokens < min(amount, self.capacity):
+            return False
+        self.tokens -= amount
+        return True
+
+    async def acquire(self, amount: float) -> None:
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                self._refill()
+                # a request bigger than the bucket waits for a full bucket, then overdraws it
+                needed = min(amount, self.capacity)
+                if self.tokens >= needed:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((needed - self.tokens) / self.rate)
+
+    def adjust(self, amount: float) -> None:
+        """Correct an estimate once the real cost is known (positive = charge more)."""
+        if self.rate > 0:
+            self._refill()
+            self.tokens -= amount
+
+
+class LatencyWindow:
+    """Latencies of the most recent successful attempts."""
+
+    def __init__(self, size: int = 200) -> None:
+        self._samples: deque = deque(maxlen=size)
+
+    def add(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+
+class CircuitBreaker:
+    """closed -> open after N consecutive failures -> half-open probe after the reset delay."""
+
+    def __init__(self, failure_threshold: int, reset_seconds: float) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+        self.times_opened = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.reset_seconds:
+            return "open"
+        return "half_open"
+
+    def before_call(self) -> None:
+        state = self.state
+        if state == "open" or (state == "half_open" and self._probing):
+            retry_after = self.reset_seconds - (time.monotonic() - self.opened_at)
+            raise CircuitOpenError(max(retry_after, 1.0))
+        if state == "half_open":
+            self._probing = True  # only one probe at a time
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._probing or (self.opened_at is None and self.failures >= self.failure_threshold):
+            if self.opened_at is None:
+                self.times_opened += 1
+                logger.warning("LLM circuit breaker opened after %d consecutive failures", self.failures)
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+    def record_neutral(self) -> None:
+        """The call finished without saying anything about upstream health (e.g. a 400)."""
+        self._probing = False
+
+
+class GatewayStats:
+    def __init__(self) -> None:
+        self.calls = 0
+        self.retries = 0
+        self.rate_limited = 0  # 429s received despite the local limiter
+        self.timeouts = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.rejected = 0  # failed fast by the open circuit
+        self.failures = 0
+        self.limiter_wait_seconds = 0.0
+
+
+def _is_retryable(e: BaseException) -> bool:
+    return isinstance(e, (
+        asyncio.TimeoutError,
+        openai.APITimeoutError,
+        openai.APIConnectionError,
+        openai.RateLimitError,
+        openai.InternalServerError,
+    ))
+
+
+def _is_upstream_failure(e: BaseException) -> bool:
+    # 429 means "slow down", not "broken": left to the limiter and backoff
+    return _is_retryable(e) and not isinstance(e, openai.RateLimitError)
+
+
+def _retry_after_seconds(e: BaseException) -> Optional[float]:
+    response = getattr(e, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _backoff_seconds(attempt: int, e: BaseException) -> float:
+    """Full jitter, but never sooner than the server's Retry-After."""
+    ceiling = min(settings.LLM_RETRY_MAX_SECONDS, settings.LLM_RETRY_BASE_SECONDS * (2 ** attempt))
+    delay = random.uniform(0, ceiling)
+    retry_after = _retry_after_seconds(e)
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, settings.LLM_RETRY_MAX_SECONDS))
+    return delay
+
+
+# per-message framing (role, separators) the chat format adds to the content tokens
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_encoding: Any = None  # tiktoken encoding once load_tokenizer() succeeded
+
+
+def load_tokenizer() -> bool:
+    """
+    Load tiktoken's o200k_base (pinned in requirements.txt). Blocking: the
+    first load may download the BPE file, so the app calls this from a thread
+    at startup (init_tokenizer); request paths never load it. Without tiktoken,
+    or when the file cannot be fetched, counts fall back to an estimate.
+    """
+    global _encoding
+    try:
+        import tiktoken  # optional
+        _encoding = tiktoken.get_encoding("o200k_base")
+    except Exception as e:  # not installed, or the encoding file cannot be fetched
+        logger.info("tiktoken unavailable, estimating tokens at ~4 characters each: %s", e)
+        _encoding = None
+    return _encoding is not None
+
+
+async def init_tokenizer() -> None:
+    await asyncio.to_thread(load_tokenizer)
+
+
+def count_tokens(text: str) -> int:
+    """
+    Local token count, used by both the TPM bucket and prompt budgets: tiktoken
+    when load_tokenizer() has run, otherwise ~4 characters per token.
+    """
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+def estimate_tokens(messages: List[Dict[str, str]], max_tokens: Optional[int] = None) -> int:
+    """Prompt + completion size for the TPM bucket."""
+    prompt = sum(count_tokens(m.get("content") or "") + MESSAGE_OVERHEAD_TOKENS for m in messages)
+    return prompt + (max_tokens or settings.LLM_COMPLETION_TOKENS_ESTIMATE)
+
+
+# ---------- Gateway ----------
+
+class LLMGateway:
+    def __init__(self) -> None:
+        # the account quota only applies to real API calls
+        live = settings.LLM_MODE != MODE_REPLAY
+        self.requests = TokenBucket(settings.LLM_RPM_LIMIT if live else 0)
+        self.tokens = TokenBucket(settings.LLM_TPM_LIMIT if live else 0)
+        self.breaker = CircuitBreaker(settings.LLM_BREAKER_FAILURE_THRESHOLD, settings.LLM_BREAKER_RESET_SECONDS)
+        self.latency = LatencyWindow()
+        self.stats = GatewayStats()
+
+    async def _wait_for_quota(self, est_tokens: int) -> None:
+        start = time.monotonic()
+        await self.requests.acquire(1)
+        await self.tokens.acquire(est_tokens)
+        self.stats.limiter_wait_seconds += time.monotonic() - start
+
+    async def _attempt(self, fn: Callable[[], Awaitable[Any]], hold_slot: bool) -> Any:
+        start = time.monotonic()
+        if hold_slot:
+            async with llm_slots:
+                result = await asyncio.wait_for(fn(), timeout=settings.LLM_TIMEOUT_SECONDS)
+        else:
+            result = await asyncio.wait_for(fn(), timeout=settings.LLM_TIMEOUT_SECONDS)
+        self.latency.add(time.monotonic() - start)
+        return result
+
+    def _hedge_delay(self) -> Optional[float]:
+        if not settings.LLM_HEDGE_ENABLED or len(self.latency) < settings.LLM_HEDGE_MIN_SAMPLES:
+            return None
+        return max(self.latency.percentile(0.95), settings.LLM_HEDGE_MIN_DELAY_SECONDS)
+
+    async def _hedged(self, fn: Callable[[], Awaitable[Any]], est_tokens: int, delay: float) -> Any:
+        first = asyncio.create_task(self._attempt(fn, hold_slot=True))
+        tasks = {first}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done:
+                return first.result()
+            # only hedge with spare quota; never queue behind the limiter for it
+            if not (self.requests.try_acquire(1) and self.tokens.try_acquire(est_tokens)):
+                return await first
+            self.stats.hedges += 1
+            second = asyncio.create_task(self._attempt(fn, hold_slot=True))
+            tasks.add(second)
+            error: Optional[BaseException] = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self.stats.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def call(
+        self,
+        fn: Callable[[], Awaitable[Any]],
+        *,
+        est_tokens: int,
+        hedge: bool = False,
+        hold_slot: bool = True,
+    ) -> Any:
+        """Run `fn` (one upstream request) with limiting, retries, hedging and the breaker."""
+        self.stats.calls += 1
+        attempt = 0
+        while True:
+            try:
+                self.breaker.before_call()
+            except CircuitOpenError:
+                self.stats.rejected += 1
+                raise
+            try:
+                await self._wait_for_quota(est_tokens)
+                delay = self._hedge_delay() if hedge else None
+                if delay is not None:
+                    result = await self._hedged(fn, est_tokens, delay)
+                else:
+                    result = await self._attempt(fn, hold_slot)
+            except asyncio.CancelledError:
+                self.breaker.record_neutral()
+                raise
+            except Exception as e:
+                if isinstance(e, openai.RateLimitError):
+                    self.stats.rate_limited += 1
+                if isinstance(e, (asyncio.TimeoutError, openai.APITimeoutError)):
+                    self.stats.timeouts += 1
+                if _is_upstream_failure(e):
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_neutral()
+                if not _is_retryable(e) or attempt >= settings.LLM_MAX_RETRIES:
+                    self.stats.failures += 1
+                    raise
+                attempt += 1
+                self.stats.retries += 1
+                backoff = _backoff_seconds(attempt, e)
+                logger.info("LLM call failed (%s), retry %d in %.2fs", type(e).__name__, attempt, backoff)
+                await asyncio.sleep(backoff)
+                continue
+            self.breaker.record_success()
+            usage = getattr(result, "usage", None)
+            if usage is not None and getattr(usage, "total_tokens", None):
+                self.tokens.adjust(usage.total_tokens - est_tokens)
+            return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        p50, p95 = self.latency.percentile(0.5), self.latency.percentile(0.95)
+        return {
+            **vars(self.stats),
+            "breaker_state": self.breaker.state,
+            "breaker_times_opened": self.breaker.times_opened,
+            "consecutive_failures": self.breaker.failures,
+            "requests_available": self.requests.tokens if self.requests.rate > 0 else None,
+            "tokens_available": self.tokens.tokens if self.tokens.rate > 0 else None,
+            "latency_p50_ms": p50 * 1000 if p50 is not None else None,
+            "latency_p95_ms": p95 * 1000 if p95 is not None else None,
+            "hedge_delay_ms": (self._hedge_delay() or 0) * 1000 or None,
+        }
+
+
+gateway = LLMGateway()
+
+
+def _gateway_metrics():
+    events = Counter("llm_gateway_events_total", "Gateway calls, retries, hedges and failures", ("event",))
+    for name, value in vars(gateway.stats).items():
+        if name != "limiter_wait_seconds":
+            events.inc(value, event=name)
+    waited = Counter("llm_limiter_wait_seconds_total", "Time spent queued for RPM/TPM quota")
+    waited.inc(gateway.stats.limiter_wait_seconds)
+    breaker = Gauge("llm_breaker_open", "1 while the circuit breaker rejects calls (open or half-open)")
+    breaker.set(0 if gateway.breaker.state == "closed" else 1)
+    return [events, waited, breaker]
+
+
+registry.add_collector(_gateway_metrics)
+
+
+# ---------- Shared client ----------
+
+def create_llm_client() -> AsyncOpenAI:
+    """
+    The process-wide LLM client for LLM_MODE: the pooled OpenAI client (live),
+    that client behind a recording cassette (record), or the cassette alone (replay).
+    """
+    mode = settings.LLM_MODE
+    if mode not in MODES:
+        raise ValueError(f"LLM_MODE must be one of {', '.join(MODES)}, got {mode!r}")
+    if mode == MODE_REPLAY:
+        store = CassetteStore(settings.LLM_CASSETTE_PATH)
+        logger.info("LLM replay from %s (%d entries)", store.path, store.info()["entries"])
+        return CassetteClient(None, store, mode, replay_latency=settings.LLM_REPLAY_LATENCY == "recorded")
+    client = _openai_client()
+    if mode == MODE_RECORD:
+        logger.info("LLM calls are recorded to %s", settings.LLM_CASSETTE_PATH)
+        return CassetteClient(client, CassetteStore(settings.LLM_CASSETTE_PATH), mode, replay_latency=False)
+    return client
+
+
+def _openai_client() -> AsyncOpenAI:
+    """One keep-alive connection pool for every call."""
+    http2 = settings.LLM_HTTP2
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.warning("LLM_HTTP2 is set but the h2 package is not installed; using HTTP/1.1")
+            http2 = False
+    if not settings.OPENAI_API_KEY:
+        logger.warning("OPENAI_API_KEY is not set; LLM calls will fail")
+    http_client = openai.DefaultAsyncHttpxClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=settings.LLM_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_POOL_MAX_KEEPALIVE,
+            keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY_SECONDS,
+        ),
+        timeout=httpx.Timeout(settings.LLM_TIMEOUT_SECONDS, connect=settings.LLM_CONNECT_TIMEOUT_SECONDS),
+    )
+    return AsyncOpenAI(
+        api_key=settings.OPENAI_API_KEY,
+        base_url=settings.OPENAI_BASE_URL or None,
+        http_client=http_client,
+        max_retries=0,  # the gateway retries
+    )
+
+
+async def warm_up(client: AsyncOpenAI, connections: int) -> None:
+    """Open `connections` pooled connections (DNS + TCP + TLS) before the first real request."""
+    start = time.monotonic()
+    results = await asyncio.gather(
+        *(client.with_options(timeout=settings.LLM_CONNECT_TIMEOUT_SECONDS * 2).models.list() for _ in range(connections)),
+        return_exceptions=True,
+    )
+    failed = [r for r in results if isinstance(r, BaseException)]
+    if failed:
+        logger.warning("LLM warm-up: %d/%d requests failed (%s)", len(failed), connections, failed[0])
+    logger.info("LLM warm-up of %d connections took %.0fms", connections, (time.monotonic() - start) * 1000)
+
+
+def get_llm_client(request: Request) -> AsyncOpenAI:
+    """FastAPI dependency: the client created in the app lifespan."""
+    return request.app.state.llm_client
+
+
+def backend_info(client: Any) -> Dict[str, Any]:
+    """LLM_MODE and, when recording or replaying, the cassette counters."""
+    return client.info() if isinstance(client, CassetteClient) else {"mode": MODE_LIVE}
+
+
+# ---------- Call helpers used by the routers ----------
+
+async def chat_completion(client, *, model: str, temperature: float, messages: List[Dict[str, str]], **kwargs: Any):
+    """
+    Non-streaming chat completion through the gateway (hedging allowed),
+    coalesced with any identical request already in flight in this process.
+    """
+    est = estimate_tokens(messages, kwargs.get("max_tokens"))
+
+    async def call():
+        # inside the flight: coalesced callers do not count the same tokens twice
+        with LLMSpan(model, "chat") as span:
+            resp = await gateway.call(
+                lambda: client.chat.completions.create(
+                    model=model, temperature=temperature, messages=messages, **kwargs
+                ),
+                est_tokens=est,
+                hedge=True,
+            )
+            span.record_usage(getattr(resp, "usage", None))
+            return resp
+
+    key = prompt_key(model, temperature, messages, **kwargs)
+    return await chat_flights.do(key, call, timeout=settings.LLM_SINGLEFLIGHT_TIMEOUT_SECONDS)
+
+
+async def chat_stream(
+    client, *, model: str, temperature: float, messages: List[Dict[str, str]], **kwargs: Any
+) -> AsyncIterator[str]:
+    """
+    Streaming chat completion yielding text deltas. Opening the stream is
+    limited and retried like any call; once tokens flow there are no retries
+    (the caller has already forwarded them). Holds an llm_slot until the end.
+    Asks for usage in the final chunk so streamed tokens are counted too.
+    """
+    est = estimate_tokens(messages, kwargs.get("max_tokens"))
+    kwargs.setdefault("stream_options", {"include_usage": True})
+    async with llm_slots:
+        with LLMSpan(model, "chat_stream") as span:
+            stream = await gateway.call(
+                lambda: client.chat.completions.create(
+                    model=model, temperature=temperature, messages=messages, stream=True, **kwargs
+                ),
+                est_tokens=est,
+                hold_slot=False,
+            )
+            try:
+                async for chunk in stream:
+                    usage = getattr(chunk, "usage", None)
+                    if usage is not None:
+                        span.record_usage(usage)
+                        if getattr(usage, "total_tokens", None):
+                            gateway.tokens.adjust(usage.total_tokens - est)
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        span.first_token()
+                        yield delta
+            except Exception as e:
+                if _is_upstream_failure(e):
+                    gateway.breaker.record_failure()
+                raise
+
+
+async def create_embedding(client, *, model: str, input: str):
+    """Embeddings request through the gateway (no hedging: they are fast and cheap)."""
+    with LLMSpan(model, "embedding") as span:
+        resp = await gateway.call(
+            lambda: client.embeddings.create(model=model, input=input),
+            est_tokens=count_tokens(input),
+        )
+        span.record_usage(getattr(resp, "usage", None))
+        return resp
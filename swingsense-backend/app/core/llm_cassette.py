@@ -0,0 +1,257 @@
+"""
+Record/replay for LLM calls, selected by LLM_MODE, so benchmark and regression
+runs are repeatable and can run offline:
+
+- live:   calls go to the API (the default).
+- record: calls go to the API, and every successful request/response pair is
+          appended to the cassette file (LLM_CASSETTE_PATH), one JSON line each.
+- replay: calls are answered from the cassette and never reach the network.
+          A request that was not recorded fails with CassetteMissError (502).
+          LLM_REPLAY_LATENCY=recorded waits as long as the original call did,
+          including the gaps between streamed chunks. "none" answers straight
+          away, so only the Python and database side of a request is measured.
+
+Entries are keyed by a hash of the whole request (model, messages, temperature,
+stream flag and the other parameters). A prompt sent at temperature 0.7 therefore
+replays the exact text that was recorded. Recording the same prompt again
+appends a new line, and the last line wins. Embedding vectors are stored as
+base64 float32, which is about a quarter of their JSON size.
+
+CassetteClient wraps AsyncOpenAI and exposes only what app/core/llm.py uses
+(chat.completions.create, embeddings.create, models.list, with_options, close).
+The gateway and the routers therefore do not know which mode is active.
+"""
+import array
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+from openai import AsyncOpenAI
+from openai.types import CreateEmbeddingResponse
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+logger = logging.getLogger(__name__)
+
+MODE_LIVE = "live"
+MODE_RECORD = "record"
+MODE_REPLAY = "replay"
+MODES = (MODE_LIVE, MODE_RECORD, MODE_REPLAY)
+
+KIND_CHAT = "chat"
+KIND_EMBEDDING = "embedding"
+
+# per-call transport settings: they do not change the answer, so they are not part of the key
+_TRANSPORT_OPTIONS = {"stream_options", "timeout", "extra_headers", "extra_query", "extra_body"}
+
+
+class CassetteMissError(Exception):
+    """Replay mode received a request that is not in the cassette."""
+
+
+def _request_params(params: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in params.items() if k not in _TRANSPORT_OPTIONS}
+
+
+def request_key(kind: str, params: Dict[str, Any]) -> str:
+    normalized = {"kind": kind, **_request_params(params)}
+    return hashlib.sha256(json.dumps(normalized, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _pack_embeddings(response: Dict[str, Any]) -> Dict[str, Any]:
+    for item in response.get("data", []):
+        vector = item.pop("embedding", None)
+        if isinstance(vector, list):
+            item["embedding_b64"] = base64.b64encode(array.array("f", vector).tobytes()).decode()
+        elif vector is not None:
+            item["embedding"] = vector
+    return response
+
+
+def _unpack_embeddings(response: Dict[str, Any]) -> Dict[str, Any]:
+    response = {**response, "data": [dict(item) for item in response.get("data", [])]}
+    for item in response["data"]:
+        packed = item.pop("embedding_b64", None)
+        if packed is not None:
+            item["embedding"] = array.array("f", base64.b64decode(packed)).tolist()
+    return response
+
+
+class CassetteStore:
+    """Append-only JSON-lines file, loaded into a dict keyed by request hash."""
+
+    def __init__(self, path: str) -> None:
+        self.path = Path(path)
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+        if self.path.exists():
+            with self.path.open() as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._entries[entry["key"]] = entry
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def put(self, entry: Dict[str, Any]) -> None:
+        self._entries[entry["key"]] = entry
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        line = (json.dumps(entry, separators=(",", ":")) + "\n").encode()
+        # one O_APPEND write per entry, so several workers can record into the same file
+        fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+        self.recorded += 1
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "path": str(self.path),
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "recorded": self.recorded,
+        }
+
+
+def _elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 1)
+
+
+class _RecordingStream:
+    """Passes chunks through and saves them (with their arrival times) once the stream completes."""
+
+    def __init__(self, stream: Any, start: float, save: Callable[[List[List[Any]]], None]) -> None:
+        self._stream = stream
+        self._start = start
+        self._save = save
+
+    async def __aiter__(self) -> AsyncIterator[ChatCompletionChunk]:
+        chunks: List[List[Any]] = []
+        async for chunk in self._stream:
+            chunks.append([_elapsed_ms(self._start), chunk.model_dump(mode="json", exclude_unset=True)])
+            yield chunk
+        # an aborted stream is not saved: replaying half an answer would hide the failure
+        self._save(chunks)
+
+    async def close(self) -> None:
+        await self._stream.close()
+
+
+class _ReplayStream:
+    def __init__(self, chunks: List[List[Any]], with_latency: bool) -> None:
+        self._chunks = chunks
+        self._with_latency = with_latency
+
+    async def __aiter__(self) -> AsyncIterator[ChatCompletionChunk]:
+        start = time.perf_counter()
+        for offset_ms, data in self._chunks:
+            if self._with_latency:
+                delay = offset_ms / 1000 - (time.perf_counter() - start)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            yield ChatCompletionChunk.model_validate(data)
+
+    async def close(self) -> None:
+        pass
+
+
+class CassetteClient:
+    """AsyncOpenAI stand-in that records to, or replays from, a CassetteStore."""
+
+    def __init__(self, inner: Optional[AsyncOpenAI], store: CassetteStore, mode: str, replay_latency: bool) -> None:
+        if mode == MODE_RECORD and inner is None:
+            raise ValueError("record mode needs a live client")
+        self._inner = inner
+        self.store = store
+        self.mode = mode
+        self.replay_latency = replay_latency
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._chat_create))
+        self.embeddings = SimpleNamespace(create=self._embeddings_create)
+        self.models = SimpleNamespace(list=self._models_list)
+
+    def with_options(self, **options: Any) -> "CassetteClient":
+        inner = self._inner.with_options(**options) if self._inner is not None else None
+        return CassetteClient(inner, self.store, self.mode, self.replay_latency)
+
+    async def close(self) -> None:
+        if self._inner is not None:
+            await self._inner.close()
+
+    def info(self) -> Dict[str, Any]:
+        return {"mode": self.mode, "replay_latency": self.replay_latency, **self.store.info()}
+
+    def _lookup(self, key: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        entry = self.store.get(key)
+        if entry is None:
+            raise CassetteMissError(
+                f"no recorded response for {params.get('model')} request {key[:12]} in {self.store.path}"
+            )
+        return entry
+
+    async def _replay_wait(self, entry: Dict[str, Any]) -> None:
+        if self.replay_latency and entry.get("latency_ms"):
+            await asyncio.sleep(entry["latency_ms"] / 1000)
+
+    def _save(self, key: str, kind: str, params: Dict[str, Any], **recorded: Any) -> None:
+        self.store.put({
+            "key": key,
+            "kind": kind,
+            "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "request": _request_params(params),
+            **recorded,
+        })
+
+    async def _models_list(self) -> Any:
+        # only used for connection warm-up; replay has no connections to warm
+        return await self._inner.models.list() if self._inner is not None else None
+
+    async def _chat_create(self, **params: Any) -> Any:
+        key = request_key(KIND_CHAT, params)
+        stream = bool(params.get("stream"))
+        if self.mode == MODE_REPLAY:
+            entry = self._lookup(key, params)
+            if stream:
+                return _ReplayStream(entry["chunks"], self.replay_latency)
+            await self._replay_wait(entry)
+            return ChatCompletion.model_validate(entry["response"])
+
+        start = time.perf_counter()
+        resp = await self._inner.chat.completions.create(**params)
+        if stream:
+            return _RecordingStream(
+                resp, start,
+                lambda chunks: self._save(key, KIND_CHAT, params, latency_ms=_elapsed_ms(start), chunks=chunks),
+            )
+        self._save(key, KIND_CHAT, params, latency_ms=_elapsed_ms(start),
+                   response=resp.model_dump(mode="json", exclude_unset=True))
+        return resp
+
+    async def _embeddings_create(self, **params: Any) -> Any:
+        key = request_key(KIND_EMBEDDING, params)
+        if self.mode == MODE_REPLAY:
+            entry = self._lookup(key, params)
+            await self._replay_wait(entry)
+            return CreateEmbeddingResponse.model_validate(_unpack_embeddings(entry["response"]))
+
+        start = time.perf_counter()
+        resp = await self._inner.embeddings.create(**params)
+        self._save(key, KIND_EMBEDDING, params, latency_ms=_elapsed_ms(start),
+                   response=_pack_embeddings(resp.model_dump(mode="json", exclude_unset=True)))
+        return resp
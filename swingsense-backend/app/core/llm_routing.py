@@ -0,0 +1,194 @@
+"""
+Model routing: pick a model tier per request without an extra LLM call.
+
+There are two tiers, both configured in Settings:
+- fast:   a small model with a tight max_tokens (LLM_FAST_MODEL /
+          LLM_FAST_MAX_TOKENS). Used for short, common swing questions, single
+          plan week rewrites and the resource catalog.
+- strong: a stronger model with room for long answers (LLM_STRONG_MODEL /
+          LLM_STRONG_MAX_TOKENS). Used for long or multi-part questions, deep
+          follow-up threads and training plans.
+
+classify_question() scores a question locally. It looks at the length, how
+many parts it has, keywords (common faults lower the score, analysis or
+medical topics raise it) and how many earlier turns the conversation has.
+
+A fast-tier answer cut off by max_tokens (finish_reason "length") is asked
+again once on the strong tier (LLM_ROUTING_ESCALATE), so the tight limit does
+not cost answer quality. LLM_ROUTING_ENABLED=false sends everything to the
+strong tier.
+
+Every routed call logs one line (operation, tier, model, reasons, latency,
+tokens, escalation) and counts llm_routes_total / llm_route_escalations_total.
+Per-model latency and token totals are already in the llm_* metrics, so the
+tiers can be tuned from /metrics and the logs.
+"""
+import logging
+import re
+import time
+from dataclasses import dataclass, replace
+from typing import Any, Dict, List, Tuple
+
+from app.core.config import settings
+from app.core.llm import chat_completion
+from app.core.metrics import Counter, registry
+
+logger = logging.getLogger(__name__)
+
+TIER_FAST = "fast"
+TIER_STRONG = "strong"
+
+# score at or above which a question goes to the strong tier
+_STRONG_SCORE = 2
+
+_WORD_RE = re.compile(r"[a-z0-9']+")
+# "1. ...", "2) ...", "- ..." at the start of a line
+_LIST_ITEM_RE = re.compile(r"(?m)^\s*(?:\d+[.)]|[-*•])\s+")
+
+# everyday faults with well-known fixes: a short answer is enough
+_COMMON_TERMS = {
+    "slice", "slicing", "hook", "hooking", "shank", "shanks", "top", "topping", "chunk", "chunking",
+    "fat", "thin", "grip", "stance", "alignment", "posture", "tempo", "putt", "putting", "chip",
+    "chipping", "bunker", "sand", "driver", "wedge", "aim",
+}
+# topics that need reasoning, numbers or care
+_COMPLEX_TERMS = {
+    "compare", "comparison", "versus", "vs", "difference", "biomechanics", "kinematic", "sequence",
+    "trackman", "launch", "spin", "smash", "attack", "dynamic", "loft", "shaft", "fitting",
+    "injury", "injured", "pain", "surgery", "wrist", "elbow", "program", "schedule",
+    "periodization", "statistics", "gained", "analyze", "analyse", "explain",
+}
+
+routes = registry.register(Counter(
+    "llm_routes_total", "LLM calls by routed tier", ("operation", "tier"),
+))
+escalations = registry.register(Counter(
+    "llm_route_escalations_total", "Fast-tier answers cut off by max_tokens and retried on the strong tier",
+    ("operation",),
+))
+
+
+@dataclass(frozen=True)
+class Route:
+    tier: str
+    model: str
+    max_tokens: int
+    reasons: Tuple[str, ...] = ()
+    # max_tokens set by the operation, not the tier default: kept when escalating
+    max_tokens_fixed: bool = False
+
+    def params(self) -> Dict[str, Any]:
+        return {"model": self.model, "max_tokens": self.max_tokens}
+
+
+def tier_route(tier: str, *reasons: str) -> Route:
+    if tier == TIER_FAST:
+        return Route(TIER_FAST, settings.LLM_FAST_MODEL, settings.LLM_FAST_MAX_TOKENS, reasons)
+    return Route(TIER_STRONG, settings.LLM_STRONG_MODEL, settings.LLM_STRONG_MAX_TOKENS, reasons)
+
+
+def classify_question(text: str, history_turns: int = 0) -> Route:
+    """
+    Route a coaching question. Each signal adds to a score; the question goes
+    to the strong tier when the score reaches 2:
+    - long question (> LLM_ROUTING_LONG_WORDS words): +2
+    - several parts (two or more '?', or a list): +2
+    - analysis / medical / equipment terms: +1 each, at most +2
+    - a thread with LLM_ROUTING_HISTORY_TURNS or more earlier turns: +1
+    - a common fault and no other signal: stays fast
+    """
+    if not settings.LLM_ROUTING_ENABLED:
+        return tier_route(TIER_STRONG, "routing_disabled")
+
+    words = _WORD_RE.findall(text.lower())
+    score = 0
+    reasons: List[str] = []
+    if len(words) > settings.LLM_ROUTING_LONG_WORDS:
+        score += 2
+        reasons.append("long")
+    if text.count("?") >= 2 or len(_LIST_ITEM_RE.findall(text)) >= 2:
+        score += 2
+        reasons.append("multi_part")
+    complex_hits = len(_COMPLEX_TERMS.intersection(words))
+    if complex_hits:
+        score += min(complex_hits, 2)
+        reasons.append("complex_terms")
+    if history_turns >= settings.LLM_ROUTING_HISTORY_TURNS:
+        score += 1
+        reasons.append("history")
+
+    if score >= _STRONG_SCORE:
+        return tier_route(TIER_STRONG, *reasons)
+    if _COMMON_TERMS.intersection(words):
+        reasons.append("common_fault")
+    return tier_route(TIER_FAST, *(reasons or ["short"]))
+
+
+def plan_route() -> Route:
+    """Four-week plans are long, structured answers: always the strong tier."""
+    return tier_route(TIER_STRONG, "plan")
+
+
+def week_route() -> Route:
+    """Rewriting one week of a plan is a short answer, so it uses the fast tier."""
+    if not settings.LLM_ROUTING_ENABLED:
+        return tier_route(TIER_STRONG, "routing_disabled")
+    return tier_route(TIER_FAST, "plan_week")
+
+
+def summary_route() -> Route:
+    """Folding turns into a thread's rolling summary: fast tier, capped at the summary length."""
+    tier = TIER_FAST if settings.LLM_ROUTING_ENABLED else TIER_STRONG
+    return replace(
+        tier_route(tier, "thread_summary"), max_tokens=settings.THREAD_SUMMARY_MAX_TOKENS, max_tokens_fixed=True
+    )
+
+
+def resources_route() -> Route:
+    """Three catalog entries as JSON: short and formulaic."""
+    if not settings.LLM_ROUTING_ENABLED:
+        return tier_route(TIER_STRONG, "routing_disabled")
+    return tier_route(TIER_FAST, "catalog")
+
+
+def log_route(operation: str, route: Route, elapsed: float, usage: Any = None, escalated: bool = False) -> None:
+    """The per-request routing record used to tune the tiers."""
+    routes.inc(operation=operation, tier=route.tier)
+    logger.info(
+        "llm route operation=%s tier=%s model=%s reasons=%s escalated=%s latency_ms=%.0f "
+        "prompt_tokens=%s completion_tokens=%s",
+        operation, route.tier, route.model, ",".join(route.reasons), escalated, elapsed * 1000,
+        getattr(usage, "prompt_tokens", None), getattr(usage, "completion_tokens", None),
+    )
+
+
+async def routed_completion(
+    client, route: Route, operation: str, *, temperature: float, messages: List[Dict[str, str]], **kwargs: Any
+):
+    """
+    chat_completion() on `route`. A fast-tier answer that hit max_tokens is
+    retried once on the strong tier, and that answer is returned instead. A
+    route with max_tokens_fixed keeps its max_tokens on the retry.
+    """
+    start = time.perf_counter()
+    resp = await chat_completion(client, temperature=temperature, messages=messages, **route.params(), **kwargs)
+    escalated = False
+    if (
+        route.tier == TIER_FAST
+        and settings.LLM_ROUTING_ESCALATE
+        and resp.choices
+        and resp.choices[0].finish_reason == "length"
+    ):
+        escalations.inc(operation=operation)
+        escalated = True
+        # the strong tier's room for the answer, unless the operation set its own cap (summaries)
+        route = replace(
+            route,
+            tier=TIER_STRONG,
+            model=settings.LLM_STRONG_MODEL,
+            max_tokens=route.max_tokens if route.max_tokens_fixed else settings.LLM_STRONG_MAX_TOKENS,
+            reasons=(*route.reasons, "truncated"),
+        )
+        resp = await chat_completion(client, temperature=temperature, messages=messages, **route.params(), **kwargs)
+    log_route(operation, route, time.perf_counter() - start, getattr(resp, "usage", None), escalated)
+    return resp
@@ -0,0 +1,362 @@
+"""
+Request, database and LLM metrics in the Prometheus text format (GET /metrics).
+
+There is no client library here, just labelled counters, gauges and
+histograms kept per worker process. Scrape each worker, or run one worker per
+container. What gets recorded:
+
+- HTTP: a latency histogram and status counts per route (MetricsMiddleware).
+  Routes are labelled with their template (/plans/jobs/{job_id}) and unmatched
+  paths as "unmatched", so the number of series stays bounded.
+- Database: the execution time of every statement, how long each pool checkout
+  took, and the pool's size, connections in use, overflow, waiters and
+  saturation, read at scrape time (instrument_engine, InstrumentedAsyncPool).
+- LLM: one span per upstream call with model, latency, prompt and completion
+  tokens, and errors (LLMSpan, used by the call helpers in app/core/llm.py).
+"""
+import asyncio
+import logging
+import math
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0, 120.0)
+
+
+# ---------- Metric types ----------
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+def _series(name: str, labels: Sequence[Tuple[str, str]], value: float) -> str:
+    if not labels:
+        return f"{name} {_format_value(value)}"
+    rendered = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+    return f"{name}{{{rendered}}} {_format_value(value)}"
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def _samples(self) -> Iterable[str]:
+        for key, value in sorted(self._values.items()):
+            yield _series(self.name, list(zip(self.labelnames, key)), value)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", *self._samples()]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: Any) -> None:
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = HTTP_BUCKETS) -> None:
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        entry = self._values.get(key)
+        if entry is None:
+            # [per-bucket counts (not cumulative), sum, count]
+            entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                entry[0][i] += 1
+                break
+        entry[1] += value
+        entry[2] += 1
+
+    def _samples(self) -> Iterable[str]:
+        for key, (counts, total, count) in sorted(self._values.items()):
+            labels = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                le = "+Inf" if math.isinf(bound) else _format_value(bound)
+                yield _series(f"{self.name}_bucket", labels + [("le", le)], cumulative)
+            yield _series(f"{self.name}_sum", labels, total)
+            yield _series(f"{self.name}_count", labels, count)
+
+
+class Registry:
+    """Metrics updated as events happen, plus collectors that read current state at scrape time."""
+
+    def __init__(self) -> None:
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], Iterable[_Metric]]] = []
+
+    def register(self, metric: _Metric) -> Any:
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], Iterable[_Metric]]) -> None:
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                for metric in collector():
+                    lines.extend(metric.render())
+            except Exception:
+                # a broken collector must not take the whole scrape down
+                logger.exception("Metrics collector %r failed", collector)
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.register(Counter(
+    "http_requests_total", "HTTP responses by route and status", ("method", "route", "status")))
+http_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "Time until the response body was fully sent", ("method", "route")))
+http_in_flight = registry.register(Gauge(
+    "http_requests_in_flight", "HTTP requests currently being handled"))
+
+db_query_duration = registry.register(Histogram(
+    "db_query_duration_seconds", "Statement execution time", ("statement",), buckets=DB_BUCKETS))
+db_query_errors = registry.register(Counter(
+    "db_query_errors_total", "Statements that raised", ("statement",)))
+db_checkout_duration = registry.register(Histogram(
+    "db_pool_checkout_seconds", "Time to obtain a pooled connection (queueing plus any new connection)",
+    buckets=DB_BUCKETS))
+db_checkout_timeouts = registry.register(Counter(
+    "db_pool_checkout_timeouts_total", "Checkouts that gave up waiting for a free connection"))
+
+llm_duration = registry.register(Histogram(
+    "llm_request_duration_seconds", "Upstream LLM call time including retries (whole stream for streaming)",
+    ("model", "operation", "outcome"), buckets=LLM_BUCKETS))
+llm_first_token = registry.register(Histogram(
+    "llm_time_to_first_token_seconds", "Streaming calls: time until the first text delta",
+    ("model", "operation"), buckets=LLM_BUCKETS))
+llm_tokens = registry.register(Counter(
+    "llm_tokens_total", "Tokens reported in the response usage", ("model", "operation", "type")))
+llm_errors = registry.register(Counter(
+    "llm_errors_total", "Failed LLM calls by exception type", ("model", "operation", "error")))
+
+
+# ---------- HTTP ----------
+
+class MetricsMiddleware:
+    """
+    Plain ASGI middleware (no BaseHTTPMiddleware), so streamed responses pass
+    through untouched and their duration covers the whole body.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500  # if the app raises before starting a response
+        start = time.perf_counter()
+
+        async def send_with_status(message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        http_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            http_in_flight.dec()
+            # the router stores the matched route in the (shared) scope
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            method = scope["method"]
+            http_duration.observe(time.perf_counter() - start, method=method, route=route)
+            http_requests.inc(method=method, route=route, status=status)
+
+
+# ---------- Database ----------
+
+_STATEMENT_KINDS = {"select", "insert", "update", "delete", "with", "lock"}
+
+
+def _statement_kind(statement: Optional[str]) -> str:
+    word = (statement or "").lstrip().split(None, 1)[:1]
+    kind = word[0].lower() if word else ""
+    return kind if kind in _STATEMENT_KINDS else "other"
+
+
+class InstrumentedAsyncPool(AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool that times checkouts and counts callers waiting for one."""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.waiting = 0
+
+    def connect(self):
+        self.waiting += 1
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            db_checkout_timeouts.inc()
+            raise
+        finally:
+            self.waiting -= 1
+            db_checkout_duration.observe(time.perf_counter() - start)
+
+
+def pool_status(pool: Pool, max_overflow: int) -> Dict[str, Any]:
+    """Current pool usage; saturation is checked-out connections over the pool's hard limit."""
+    size = pool.size()
+    checked_out = pool.checkedout()
+    capacity = size + max(max_overflow, 0)
+    return {
+        "size": size,
+        "checked_out": checked_out,
+        "overflow": max(pool.overflow(), 0),
+        "waiting": getattr(pool, "waiting", 0),
+        "capacity": capacity,
+        "saturation": checked_out / capacity if capacity else 0.0,
+    }
+
+
+def instrument_engine(engine: Engine, max_overflow: int) -> None:
+    """Time every statement on `engine` (the sync_engine of an async engine) and export its pool."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_start"].pop()
+        db_query_duration.observe(time.perf_counter() - started, statement=_statement_kind(statement))
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        conn = context.connection
+        if conn is not None and conn.info.get("query_start"):
+            conn.info["query_start"].pop()
+        # no statement: the connection itself failed
+        db_query_errors.inc(statement=_statement_kind(context.statement) if context.statement else "connect")
+
+    def collect() -> Iterable[_Metric]:
+        status = pool_status(engine.pool, max_overflow)
+        for key, help in (
+            ("size", "Connections kept open by the pool"),
+            ("checked_out", "Connections currently in use"),
+            ("overflow", "Connections open beyond the pool size"),
+            ("waiting", "Callers waiting for a connection"),
+            ("capacity", "Pool size plus max overflow"),
+            ("saturation", "Connections in use / capacity"),
+        ):
+            gauge = Gauge(f"db_pool_{key}", help)
+            gauge.set(status[key])
+            yield gauge
+
+    registry.add_collector(collect)
+
+
+# ---------- LLM ----------
+
+class LLMSpan:
+    """
+    One upstream LLM call: records latency, outcome, token usage and errors
+    when the block exits, and logs a one-line summary at DEBUG.
+
+        with LLMSpan(model, "chat") as span:
+            resp = await ...
+            span.record_usage(resp.usage)
+    """
+
+    def __init__(self, model: str, operation: str) -> None:
+        self.model = model
+        self.operation = operation
+        self.prompt_tokens: Optional[int] = None
+        self.completion_tokens: Optional[int] = None
+        self._start = 0.0
+        self._first_token_seen = False
+
+    def __enter__(self) -> "LLMSpan":
+        self._start = time.perf_counter()
+        return self
+
+    def record_usage(self, usage: Any) -> None:
+        if usage is None:
+            return
+        self.prompt_tokens = getattr(usage, "prompt_tokens", None)
+        self.completion_tokens = getattr(usage, "completion_tokens", None)
+
+    def first_token(self) -> None:
+        if not self._first_token_seen:
+            self._first_token_seen = True
+            llm_first_token.observe(time.perf_counter() - self._start, model=self.model, operation=self.operation)
+
+    def __exit__(self, exc_type, exc_value, tb) -> bool:
+        elapsed = time.perf_counter() - self._start
+        if exc_type is None:
+            outcome = "ok"
+        elif issubclass(exc_type, (asyncio.CancelledError, GeneratorExit)):
+            outcome = "cancelled"  # client went away; not an upstream error
+        else:
+            outcome = "error"
+            llm_errors.inc(model=self.model, operation=self.operation, error=exc_type.__name__)
+        llm_duration.observe(elapsed, model=self.model, operation=self.operation, outcome=outcome)
+        if self.prompt_tokens:
+            llm_tokens.inc(self.prompt_tokens, model=self.model, operation=self.operation, type="prompt")
+        if self.completion_tokens:
+            llm_tokens.inc(self.completion_tokens, model=self.model, operation=self.operation, type="completion")
+        logger.debug(
+            "llm span model=%s operation=%s outcome=%s latency_ms=%.0f prompt_tokens=%s completion_tokens=%s",
+            self.model, self.operation, outcome, elapsed * 1000, self.prompt_tokens, self.completion_tokens,
+        )
+        return False
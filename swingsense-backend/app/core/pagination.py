@@ -0,0 +1,55 @@
+"""
+Keyset (cursor) pagination on (created_at, id), newest first.
+
+The cursor is an opaque token encoding the last row of the previous page;
+the next page is everything strictly older than it. Unlike OFFSET this costs
+the same on every page, given an index ending in (created_at DESC, id DESC).
+"""
+import base64
+import uuid
+from datetime import datetime
+from typing import Dict, Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import Select, tuple_
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# response header carrying the cursor for the next page (absent on the last page)
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(created_at: datetime, row_id: uuid.UUID) -> str:
+    raw = f"{created_at.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, uuid.UUID]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, row_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), uuid.UUID(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def paginate(stmt: Select, model, cursor: Optional[str], limit: int) -> Select:
+    """Order newest first, resume after `cursor`, and fetch one extra row to detect a next page."""
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        stmt = stmt.where(tuple_(model.created_at, model.id) < tuple_(created_at, row_id))
+    return stmt.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1)
+
+
+def split_page(rows: Sequence, limit: int) -> Tuple[Sequence, Optional[str]]:
+    """Trim the extra row fetched by paginate() and return (page, next_cursor)."""
+    if len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    last = page[-1]
+    return page, encode_cursor(last.created_at, last.id)
+
+
+def cursor_headers(next_cursor: Optional[str]) -> Dict[str, str]:
+    return {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else {}
@@ -0,0 +1,164 @@
+"""
+User and profile rows, and a per-process profile cache.
+
+bootstrap_profile() creates the users and profiles rows the first time a
+user is seen and returns the profile, all in one statement and one round trip:
+
+    with new_user as (insert into users ... on conflict do nothing),
+         new_profile as (insert into profiles ... on conflict do nothing returning ...)
+    select ... from new_profile
+    union all
+    select ... from profiles where user_id = :user_id and not exists (select 1 from new_profile)
+
+Profiles are kept in a TTL + LRU cache per worker process, so GET /me and
+routers that only read profile fields (generate_plan fills in handicap,
+strengths and other missing fields) usually make no query. update_profile()
+refreshes this process's entry. Other workers may serve the old profile for
+up to PROFILE_CACHE_TTL_SECONDS.
+"""
+from __future__ import annotations
+
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.models import Profile, User
+from app.db.session import AsyncSessionLocal
+
+PROFILE_FIELDS = ("name", "years_played", "handicap", "strengths", "weaknesses", "goals")
+
+_COLUMNS = ", ".join(PROFILE_FIELDS)
+
+_BOOTSTRAP_SQL = text(f"""
+    with new_user as (
+        insert into users (id, email) values (:user_id, :email)
+        on conflict (id) do nothing
+    ),
+    new_profile as (
+        insert into profiles (user_id) values (:user_id)
+        on conflict (user_id) do nothing
+        returning {_COLUMNS}
+    )
+    select {_COLUMNS} from new_profile
+    union all
+    select {_COLUMNS} from profiles
+    where user_id = :user_id and not exists (select 1 from new_profile)
+""")
+
+
+class ProfileCache:
+    """Per-process TTL + LRU map of user id -> profile dict (None: the user has no profile row)."""
+
+    def __init__(self, maxsize: int, ttl_seconds: float) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl_seconds
+        self._entries: "OrderedDict[uuid.UUID, Tuple[float, Optional[Dict[str, Any]]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: uuid.UUID) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """(found, profile). found is False on a miss or an expired entry."""
+        entry = self._entries.get(user_id)
+        if entry is None or entry[0] <= time.monotonic():
+            if entry is not None:
+                del self._entries[user_id]
+            self.misses += 1
+            return False, None
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return True, entry[1]
+
+    def put(self, user_id: uuid.UUID, profile: Optional[Dict[str, Any]]) -> None:
+        if self.ttl <= 0:
+            return
+        self._entries[user_id] = (time.monotonic() + self.ttl, profile)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: uuid.UUID) -> None:
+        self._entries.pop(user_id, None)
+
+    def info(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else None,
+        }
+
+
+profile_cache = ProfileCache(settings.PROFILE_CACHE_MAX_ENTRIES, settings.PROFILE_CACHE_TTL_SECONDS)
+
+
+def _profile_dict(row: Any) -> Dict[str, Any]:
+    return {field: getattr(row, field) for field in PROFILE_FIELDS}
+
+
+async def bootstrap_profile(db: AsyncSession, user_id: uuid.UUID, email: Optional[str]) -> Dict[str, Any]:
+    """The user's profile, creating the user and profile rows on first sight."""
+    found, profile = profile_cache.get(user_id)
+    if found and profile is not None:
+        return profile
+
+    params = {"user_id": user_id, "email": email}
+    row = (await db.execute(_BOOTSTRAP_SQL, params)).first()
+    if row is None:
+        # a concurrent first request inserted the profile after this statement's snapshot
+        await db.commit()
+        row = (await db.execute(_BOOTSTRAP_SQL, params)).first()
+    await db.commit()
+    profile = _profile_dict(row)
+    profile_cache.put(user_id, profile)
+    return profile
+
+
+async def get_profile(user_id: uuid.UUID, db: Optional[AsyncSession] = None) -> Optional[Dict[str, Any]]:
+    """
+    The cached profile, or None if the user has none yet. Does not create rows.
+    Without `db`, a miss is read in a short session of its own.
+    """
+    found, profile = profile_cache.get(user_id)
+    if found:
+        return profile
+
+    stmt = select(Profile).where(Profile.user_id == user_id)
+    if db is None:
+        async with AsyncSessionLocal() as own:
+            row = (await own.execute(stmt)).scalars().first()
+    else:
+        row = (await db.execute(stmt)).scalars().first()
+    profile = _profile_dict(row) if row is not None else None
+    profile_cache.put(user_id, profile)
+    return profile
+
+
+async def update_profile(
+    db: AsyncSession, user_id: uuid.UUID, email: Optional[str], fields: Dict[str, Any]
+) -> Dict[str, Any]:
+    """Set `fields` on the profile (creating the rows if needed) and return the new profile."""
+    await db.execute(
+        insert(User).values(id=user_id, email=email).on_conflict_do_nothing(index_elements=[User.id])
+    )
+    stmt = insert(Profile).values(user_id=user_id, **fields)
+    if fields:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Profile.user_id], set_={**fields, "updated_at": text("now()")}
+        )
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=[Profile.user_id])
+    await db.execute(stmt)
+    row = (await db.execute(select(Profile).where(Profile.user_id == user_id))).scalars().first()
+    await db.commit()
+    profile = _profile_dict(row)
+    profile_cache.put(user_id, profile)
+    return profile
@@ -0,0 +1,213 @@
+"""
+Semantic answer cache for coaching questions.
+
+Incoming questions are embedded and compared against earlier questions that
+already have feedback. If one is similar enough (cosine similarity above
+SEMANTIC_CACHE_THRESHOLD) and newer than SEMANTIC_CACHE_TTL_SECONDS, its
+feedback is reused and the chat completion is skipped.
+
+Two lookup backends:
+- "pgvector": nearest neighbour over swing_questions.embedding (HNSW index)
+- "numpy":    in-process matrix of recent embeddings (also used as a fallback
+              when the vector column / extension is not available)
+
+A failed pgvector lookup (missing extension, pool timeout, cancelled
+statement) falls back to numpy for SEMANTIC_CACHE_PGVECTOR_RETRY_SECONDS;
+the next lookup after that tries pgvector again.
+"""
+from __future__ import annotations
+
+import logging
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.llm import create_embedding
+from app.db.models import QUESTION_ANSWERED, SwingQuestion, SwingFeedback
+
+logger = logging.getLogger(__name__)
+
+_WS_RE = re.compile(r"\s+")
+
+
+@dataclass
+class CacheHit:
+    question_id: uuid.UUID
+    feedback: str
+    similarity: float
+
+
+def normalize_question(text: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation."""
+    return _WS_RE.sub(" ", text).strip().lower().rstrip("?!. ")
+
+
+async def embed_question(client, text: str) -> Optional[np.ndarray]:
+    """Return a unit-length embedding for the question, or None if embedding fails."""
+    try:
+        resp = await create_embedding(client, model=settings.EMBEDDING_MODEL, input=normalize_question(text))
+    except Exception as e:
+        # The cache is an optimization; never fail the request because of it
+        logger.warning("Embedding failed, skipping semantic cache: %s", e)
+        return None
+    vec = np.asarray(resp.data[0].embedding, dtype=np.float32)
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else None
+
+
+class CacheStats:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.bypassed = 0
+
+    def record(self, hit: bool) -> None:
+        with self._lock:
+            self.lookups += 1
+            self.hits += int(hit)
+
+    def record_bypass(self) -> None:
+        with self._lock:
+            self.bypassed += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "misses": self.lookups - self.hits,
+                "bypassed": self.bypassed,
+                "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+            }
+
+
+class NumpyIndex:
+    """Bounded in-process matrix of (embedding, feedback) pairs."""
+
+    def __init__(self, dim: int, max_entries: int) -> None:
+        self._lock = threading.Lock()
+        self._max_entries = max_entries
+        self._matrix = np.empty((0, dim), dtype=np.float32)
+        self._stamps = np.empty(0, dtype=np.float64)
+        self._ids: list[uuid.UUID] = []
+        self._feedback: list[str] = []
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def add(self, question_id: uuid.UUID, vec: np.ndarray, feedback: str, stamp: Optional[float] = None) -> None:
+        with self._lock:
+            self._matrix = np.vstack([self._matrix, vec[None, :]])
+            self._stamps = np.append(self._stamps, stamp if stamp is not None else time.time())
+            self._ids.append(question_id)
+            self._feedback.append(feedback)
+            self._prune()
+
+    def _prune(self) -> None:
+        cutoff = time.time() - settings.SEMANTIC_CACHE_TTL_SECONDS
+        keep = np.flatnonzero(self._stamps >= cutoff)[-self._max_entries:]
+        if len(keep) == len(self._ids):
+            return
+        self._matrix = self._matrix[keep]
+        self._stamps = self._stamps[keep]
+        self._ids = [self._ids[i] for i in keep]
+        self._feedback = [self._feedback[i] for i in keep]
+
+    def search(self, vec: np.ndarray, threshold: float) -> Optional[CacheHit]:
+        with self._lock:
+            if not self._ids:
+                return None
+            sims = self._matrix @ vec
+            sims[self._stamps < time.time() - settings.SEMANTIC_CACHE_TTL_SECONDS] = -1.0
+            best = int(np.argmax(sims))
+            if sims[best] < threshold:
+                return None
+            return CacheHit(self._ids[best], self._feedback[best], float(sims[best]))
+
+
+class SemanticCache:
+    def __init__(self) -> None:
+        self.stats = CacheStats()
+        self.index = NumpyIndex(settings.EMBEDDING_DIM, settings.SEMANTIC_CACHE_MAX_ENTRIES)
+        self._pgvector_enabled = settings.SEMANTIC_CACHE_BACKEND == "pgvector"
+        self._pgvector_down_until = 0.0  # monotonic time of the next pgvector attempt
+
+    @property
+    def _pgvector_ok(self) -> bool:
+        return self._pgvector_enabled and time.monotonic() >= self._pgvector_down_until
+
+    @property
+    def backend(self) -> str:
+        return "pgvector" if self._pgvector_ok else "numpy"
+
+    @property
+    def persists_embeddings(self) -> bool:
+        """Whether embeddings should be written to swing_questions.embedding."""
+        return self._pgvector_ok
+
+    async def lookup(self, db: AsyncSession, vec: np.ndarray) -> Optional[CacheHit]:
+        threshold = settings.SEMANTIC_CACHE_THRESHOLD
+        hit = None
+        if self._pgvector_ok:
+            try:
+                hit = await self._lookup_pgvector(db, vec, threshold)
+            except Exception as e:
+                retry = settings.SEMANTIC_CACHE_PGVECTOR_RETRY_SECONDS
+                logger.warning("pgvector lookup failed, using the numpy index for %.0fs: %s", retry, e)
+                await db.rollback()
+                self._pgvector_down_until = time.monotonic() + retry
+                hit = self.index.search(vec, threshold)
+        else:
+            hit = self.index.search(vec, threshold)
+        self.stats.record(hit is not None)
+        return hit
+
+    def remember(self, question_id: uuid.UUID, vec: np.ndarray, feedback: str) -> None:
+        """Index a complete answer (callers never pass partial ones, matching the pgvector status filter)."""
+        if not self._pgvector_ok:
+            self.index.add(question_id, vec, feedback)
+
+    async def _lookup_pgvector(self, db: AsyncSession, vec: np.ndarray, threshold: float) -> Optional[CacheHit]:
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=settings.SEMANTIC_CACHE_TTL_SECONDS)
+        distance = SwingQuestion.embedding.cosine_distance(vec)
+        stmt = (
+            select(SwingQuestion.id, SwingFeedback.feedback, distance.label("distance"))
+            .join(SwingFeedback, SwingFeedback.question_id == SwingQuestion.id)
+            .where(
+                SwingQuestion.embedding.is_not(None),
+                SwingQuestion.created_at >= cutoff,
+                # partial (interrupted stream) answers are stored but never reused
+                SwingQuestion.status == QUESTION_ANSWERED,
+            )
+            .order_by(distance)
+            .limit(1)
+        )
+        row = (await db.execute(stmt)).first()
+        if row is None:
+            return None
+        similarity = 1.0 - float(row.distance)
+        if similarity < threshold:
+            return None
+        return CacheHit(row.id, row.feedback, similarity)
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            **self.stats.snapshot(),
+            "backend": self.backend,
+            "threshold": settings.SEMANTIC_CACHE_THRESHOLD,
+            "ttl_seconds": settings.SEMANTIC_CACHE_TTL_SECONDS,
+            "indexed_in_process": len(self.index),
+        }
+
+
+semantic_cache = SemanticCache()
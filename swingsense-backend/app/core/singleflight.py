@@ -0,0 +1,51 @@
+"""
+Single-flight: concurrent calls with the same key share one execution.
+
+The first caller for a key starts the work as a separate task; callers that
+arrive while it is running await the same task. Every caller gets the same
+result, or the same exception. Each caller waits at most `timeout` seconds,
+and the shared task itself is cancelled after `timeout` so a stuck upstream
+call cannot pin the key forever.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+
+
+class SingleFlight:
+    def __init__(self) -> None:
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.executed = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.timeouts = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]], timeout: float) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            self.executed += 1
+            task = asyncio.ensure_future(asyncio.wait_for(fn(), timeout=timeout))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, key=key: self._done(key, t))
+        else:
+            self.coalesced += 1
+        try:
+            # shield: one waiter giving up (timeout, client disconnect) must not cancel the others
+            return await asyncio.wait_for(asyncio.shield(task), timeout=timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+
+    def _done(self, key: str, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled() and task.exception() is not None:
+            self.errors += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "inflight": len(self._inflight),
+        }
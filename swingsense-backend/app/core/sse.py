@@ -0,0 +1,14 @@
+"""Helpers for Server-Sent Events responses."""
+import json
+from typing import Any, Dict
+
+# Stop proxies (nginx) from buffering the stream so tokens reach the client immediately
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",
+}
+
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format one SSE frame with a named event and a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
@@ -0,0 +1,120 @@
+"""
+Bounded context for follow-up questions.
+
+A thread is a first question plus its follow-ups. A follow-up is answered
+with this prompt:
+
+    system prompt
+    rolling summary of the older turns     (if there is one)
+    the last THREAD_CONTEXT_TURNS turns     (question / answer pairs)
+    the new question
+
+The whole prompt must fit in THREAD_CONTEXT_TOKEN_BUDGET tokens, counted with
+count_tokens(). When it does not fit, the oldest verbatim turns are dropped
+first, then the summary is shortened. The new question is always kept.
+Prompt size, and so latency and cost, therefore stays flat however long the
+thread gets.
+
+The summary is kept up to date incrementally. After an answer, the turns
+that have just left the verbatim window are folded into the summary with one
+small fast-tier call: the old summary and the new turns go in, the new
+summary comes out. The thread's first question stores the summary and the
+timestamp of the last turn it covers.
+"""
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+from app.core.config import settings
+from app.core.llm import MESSAGE_OVERHEAD_TOKENS, count_tokens
+from app.core.llm_routing import routed_completion, summary_route
+
+logger = logging.getLogger(__name__)
+
+# at most this many turns folded into the summary per call
+MAX_FOLD_TURNS = 8
+
+SUMMARY_PROMPT = (
+    "You keep a running summary of a golf coaching conversation. Merge the new turns into "
+    "the summary. Keep the player's issues, what they tried, what did or did not work, and "
+    "the current advice. Drop pleasantries. At most {words} words, plain text."
+)
+
+
+@dataclass
+class Turn:
+    question: str
+    answer: str
+
+
+def _tokens(message: Dict[str, str]) -> int:
+    return count_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+
+
+def _summary_message(summary: str) -> Dict[str, str]:
+    return {"role": "system", "content": f"Summary of the earlier conversation: {summary}"}
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    """Shorten `text` to about `max_tokens` tokens, keeping whole words."""
+    if max_tokens <= 0:
+        return ""
+    words = text.split()
+    while words and count_tokens(" ".join(words)) > max_tokens:
+        # cut proportionally, then fine-tune; a few iterations at most
+        over = count_tokens(" ".join(words)) / max_tokens
+        words = words[: max(0, min(len(words) - 1, int(len(words) / over)))]
+    return " ".join(words)
+
+
+def build_messages(
+    system_prompt: str, question: str, summary: Optional[str], turns: Sequence[Turn]
+) -> List[Dict[str, str]]:
+    """
+    The follow-up prompt within THREAD_CONTEXT_TOKEN_BUDGET. `turns` are the
+    most recent turns, oldest first.
+    """
+    system = {"role": "system", "content": system_prompt}
+    final = {"role": "user", "content": question}
+    remaining = settings.THREAD_CONTEXT_TOKEN_BUDGET - _tokens(system) - _tokens(final)
+
+    # newest turns first, until the budget runs out
+    history: List[Dict[str, str]] = []
+    turns = list(turns)[-settings.THREAD_CONTEXT_TURNS:] if settings.THREAD_CONTEXT_TURNS > 0 else []
+    summary_cost = _tokens(_summary_message(summary)) if summary else 0
+    for turn in reversed(turns):
+        pair = [{"role": "user", "content": turn.question}, {"role": "assistant", "content": turn.answer}]
+        cost = sum(_tokens(m) for m in pair)
+        # the latest turn outranks the summary; older turns only fit next to it
+        reserve = summary_cost if history else 0
+        if cost > remaining - reserve:
+            break
+        history[:0] = pair
+        remaining -= cost
+
+    messages = [system]
+    if summary and remaining > MESSAGE_OVERHEAD_TOKENS * 2:
+        overhead = _tokens(_summary_message(""))
+        summary = _truncate(summary, remaining - overhead)
+        if summary:
+            messages.append(_summary_message(summary))
+    return messages + history + [final]
+
+
+async def fold_summary(client, summary: Optional[str], turns: Sequence[Turn]) -> str:
+    """Merge `turns` (oldest first) into `summary` with one fast-tier call."""
+    words = max(20, settings.THREAD_SUMMARY_MAX_TOKENS * 3 // 4)
+    transcript = "\n".join(f"Player: {t.question}\nCoach: {t.answer}" for t in turns)
+    resp = await routed_completion(
+        client,
+        summary_route(),
+        "thread_summary",
+        temperature=0.2,
+        messages=[
+            {"role": "system", "content": SUMMARY_PROMPT.format(words=words)},
+            {"role": "user", "content": f"Summary so far: {summary or '(none)'}\n\nNew turns:\n{transcript}"},
+        ],
+    )
+    return _truncate(resp.choices[0].message.content.strip(), settings.THREAD_SUMMARY_MAX_TOKENS)
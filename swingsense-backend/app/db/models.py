@@ -2,28 +2,89 @@
 from __future__ import annotations
 
 import uuid
-from datetime import datetime
+from datetime import date, datetime
 
-from sqlalchemy import Text, ForeignKey, TIMESTAMP, func
+from sqlalchemy import BigInteger, Date, Float, Text, ForeignKey, TIMESTAMP, UniqueConstraint, func
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.orm import Mapped, mapped_column, relationship
+from pgvector.sqlalchemy import Vector
 
+from app.core.config import settings
 from app.db.session import Base
 
 
+# ---------- Users ----------
+
+class User(Base):
+    """One row per authenticated user; id is the auth provider's `sub`."""
+    __tablename__ = "users"
+
+    id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True)
+    email: Mapped[str | None] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        TIMESTAMP(timezone=True), server_default=func.now()
+    )
+
+    profile: Mapped["Profile | None"] = relationship(back_populates="user", cascade="all, delete-orphan")
+
+
+class Profile(Base):
+    """Golfer details; generate_plan falls back to these for fields the request leaves out."""
+    __tablename__ = "profiles"
+
+    user_id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    name: Mapped[str | None] = mapped_column(Text, nullable=True)
+    years_played: Mapped[int | None] = mapped_column(nullable=True)
+    handicap: Mapped[float | None] = mapped_column(nullable=True)
+    strengths: Mapped[str | None] = mapped_column(Text, nullable=True)
+    weaknesses: Mapped[str | None] = mapped_column(Text, nullable=True)
+    goals: Mapped[str | None] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        TIMESTAMP(timezone=True), server_default=func.now()
+    )
+    updated_at: Mapped[datetime] = mapped_column(
+        TIMESTAMP(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
+
+    user: Mapped["User"] = relationship(back_populates="profile")
+
+
 # ---------- Core questions/feedback ----------
 
+# SwingQuestion.status values
+QUESTION_PENDING = "pending"    # recorded, waiting on the LLM
+QUESTION_ANSWERED = "answered"  # feedback saved
+QUESTION_PARTIAL = "partial"    # stream interrupted, partial feedback saved
+QUESTION_FAILED = "failed"      # LLM call failed, no feedback
+
 class SwingQuestion(Base):
     __tablename__ = "swing_questions"
 
     id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
     )
-    # keep nullable for now (no auth wiring yet)
+    # nullable: rows created before auth wiring have no owner
     user_id: Mapped[uuid.UUID | None] = mapped_column(
         UUID(as_uuid=True), nullable=True
     )
     question: Mapped[str] = mapped_column(Text, nullable=False)
+    status: Mapped[str] = mapped_column(
+        Text, nullable=False, default=QUESTION_PENDING, server_default=QUESTION_PENDING
+    )
+    # follow-ups point at the first question of their thread; null on that first question
+    thread_id: Mapped[uuid.UUID | None] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("swing_questions.id", ondelete="CASCADE"), nullable=True
+    )
+    # set on a thread's first question: rolling summary of the turns older than the
+    # last THREAD_CONTEXT_TURNS, covering turns created up to thread_summary_until
+    thread_summary: Mapped[str | None] = mapped_column(Text, nullable=True, deferred=True)
+    thread_summary_until: Mapped[datetime | None] = mapped_column(TIMESTAMP(timezone=True), nullable=True)
+    # embedding of the normalized question text, used by the semantic answer cache
+    embedding: Mapped[list[float] | None] = mapped_column(
+        Vector(settings.EMBEDDING_DIM), nullable=True, deferred=True
+    )
     created_at: Mapped[datetime] = mapped_column(
         TIMESTAMP(timezone=True), server_default=func.now()
     )
@@ -42,6 +103,10 @@ class SwingFeedback(Base):
     question_id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True), ForeignKey("swing_questions.id", ondelete="CASCADE")
     )
+    # copied from the question so per-user history can be read from this table alone
+    user_id: Mapped[uuid.UUID | None] = mapped_column(
+        UUID(as_uuid=True), nullable=True
+    )
     feedback: Mapped[str] = mapped_column(Text, nullable=False)
     created_at: Mapped[datetime] = mapped_column(
         TIMESTAMP(timezone=True), server_default=func.now()
@@ -52,6 +117,10 @@ class SwingFeedback(Base):
 
 # ---------- Simple placeholders for other routers (plans/progress/resources) ----------
 
+# TrainingPlan.status values
+PLAN_COMPLETE = "complete"
+PLAN_PARTIAL = "partial"  # stream interrupted: only the weeks received so far, no summary
+
 class TrainingPlan(Base):
     __tablename__ = "training_plans"
 
@@ -59,7 +128,14 @@ class TrainingPlan(Base):
         UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
     )
     user_id: Mapped[uuid.UUID | None] = mapped_column(UUID(as_uuid=True), nullable=True)
+    # plain-text rendering of `weeks` (the whole plan text for plans created before `weeks` existed)
     plan: Mapped[str] = mapped_column(Text, nullable=False)
+    summary: Mapped[str | None] = mapped_column(Text, nullable=True)
+    # [{"week": 1, "focus": str, "drills": [str], "tips": [str]}, ...]; null on older plans
+    weeks: Mapped[list | None] = mapped_column(JSONB, nullable=True)
+    status: Mapped[str] = mapped_column(
+        Text, nullable=False, default=PLAN_COMPLETE, server_default=PLAN_COMPLETE
+    )
     years_played: Mapped[int] = mapped_column(nullable=False)
     handicap: Mapped[float] = mapped_column(nullable=False)
     strengths: Mapped[str] = mapped_column(Text, nullable=False)
@@ -70,6 +146,40 @@ class TrainingPlan(Base):
     )
 
 
+# PlanJob.status values
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+class PlanJob(Base):
+    """Durable queue entry for background training plan generation."""
+    __tablename__ = "plan_jobs"
+
+    id: Mapped[uuid.UUID] = mapped_column(
+        UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
+    )
+    status: Mapped[str] = mapped_column(Text, nullable=False, default=JOB_QUEUED)
+    payload: Mapped[dict] = mapped_column(JSONB, nullable=False)
+    attempts: Mapped[int] = mapped_column(nullable=False, default=0)
+    max_attempts: Mapped[int] = mapped_column(nullable=False)
+    # not picked up before this time (retry backoff)
+    run_after: Mapped[datetime] = mapped_column(
+        TIMESTAMP(timezone=True), server_default=func.now()
+    )
+    # lease: a running job whose lock is older than the job timeout is reclaimed
+    locked_at: Mapped[datetime | None] = mapped_column(TIMESTAMP(timezone=True), nullable=True)
+    plan_id: Mapped[uuid.UUID | None] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("training_plans.id", ondelete="SET NULL"), nullable=True
+    )
+    error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        TIMESTAMP(timezone=True), server_default=func.now()
+    )
+    started_at: Mapped[datetime | None] = mapped_column(TIMESTAMP(timezone=True), nullable=True)
+    finished_at: Mapped[datetime | None] = mapped_column(TIMESTAMP(timezone=True), nullable=True)
+
+
 class ProgressMetric(Base):
     __tablename__ = "progress_metrics"
 
@@ -83,11 +193,87 @@ class ProgressMetric(Base):
     )
 
 
+# ProgressRollup.period values
+ROLLUP_DAY = "day"
+ROLLUP_WEEK = "week"  # ISO weeks, starting Monday (UTC)
+
+class ProgressRollup(Base):
+    """
+    Per-user aggregates of each numeric metric key over a day or week, kept up to
+    date on ingestion. mean = sum / count, variance = sumsq / count - mean ** 2.
+    """
+    __tablename__ = "progress_rollups"
+
+    user_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True)
+    period: Mapped[str] = mapped_column(Text, primary_key=True)
+    period_start: Mapped[date] = mapped_column(Date, primary_key=True)
+    metric_key: Mapped[str] = mapped_column(Text, primary_key=True)
+    count: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    sum: Mapped[float] = mapped_column(Float, nullable=False)
+    min: Mapped[float] = mapped_column(Float, nullable=False)
+    max: Mapped[float] = mapped_column(Float, nullable=False)
+    sumsq: Mapped[float] = mapped_column(Float, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(
+        TIMESTAMP(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
+
+
+class UserDataVersion(Base):
+    """Per-user change counter for one area of data; the validator behind ETags on read endpoints."""
+    __tablename__ = "user_data_versions"
+
+    user_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True)
+    scope: Mapped[str] = mapped_column(Text, primary_key=True)
+    version: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(
+        TIMESTAMP(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
+
+
+# IdempotencyKey.status values
+IDEMPOTENCY_IN_PROGRESS = "in_progress"
+IDEMPOTENCY_COMPLETED = "completed"
+
+class IdempotencyKey(Base):
+    """A client-supplied Idempotency-Key and the response to the first request that used it."""
+    __tablename__ = "idempotency_keys"
+
+    user_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True)
+    key: Mapped[str] = mapped_column(Text, primary_key=True)
+    # hash of endpoint + body: the same key with a different request is rejected
+    fingerprint: Mapped[str] = mapped_column(Text, nullable=False)
+    status: Mapped[str] = mapped_column(Text, nullable=False)
+    response_status: Mapped[int | None] = mapped_column(nullable=True)
+    response_body: Mapped[dict | list | None] = mapped_column(JSONB, nullable=True)
+    # claim time: an in-progress key older than the lease belongs to a dead request
+    locked_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), nullable=False)
+    created_at: Mapped[datetime] = mapped_column(
+        TIMESTAMP(timezone=True), server_default=func.now()
+    )
+    expires_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=True), nullable=False)
+
+
+# Resource.source values
+RESOURCE_SOURCE_IMPORTED = "imported"  # curated via POST /resources/import: never replaced by the LLM
+RESOURCE_SOURCE_LLM = "llm"
+
 class Resource(Base):
     __tablename__ = "resources"
+    __table_args__ = (UniqueConstraint("issue_key", "url", name="uq_resources_issue_key_url"),)
 
     id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True), primary_key=True, default=uuid.uuid4
     )
     issue: Mapped[str] = mapped_column(Text, nullable=False)
+    # normalized issue text; trigram-indexed for fuzzy catalog lookups
+    issue_key: Mapped[str] = mapped_column(Text, nullable=False)
     url: Mapped[str] = mapped_column(Text, nullable=False)
+    title: Mapped[str | None] = mapped_column(Text, nullable=True)
+    description: Mapped[str | None] = mapped_column(Text, nullable=True)
+    position: Mapped[int] = mapped_column(nullable=False, default=0)
+    source: Mapped[str] = mapped_column(
+        Text, nullable=False, default=RESOURCE_SOURCE_LLM, server_default=RESOURCE_SOURCE_LLM
+    )
+    refreshed_at: Mapped[datetime] = mapped_column(
+        TIMESTAMP(timezone=True), server_default=func.now()
+    )
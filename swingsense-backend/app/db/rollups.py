@@ -0,0 +1,162 @@
+"""
+Daily and weekly rollups of progress metrics (table progress_rollups).
+
+Every numeric top-level key of a metric object contributes to one day row and
+one week row per user: count, sum, min, max and sum of squares, which is enough
+to derive mean and standard deviation for any range of whole buckets.
+
+Ingestion calls apply_rollups() in the same transaction as the metric insert,
+so rollups never drift from the raw rows. Rows written before the table existed
+(or after a bug) are fixed with the rebuild command, which recomputes rollups
+from progress_metrics using the same sync SessionLocal as Alembic:
+
+    python -m app.db.rollups rebuild                   # every user
+    python -m app.db.rollups rebuild --user-id <uuid>  # one user
+"""
+import argparse
+import math
+import uuid
+from datetime import date, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, func, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.db.models import ProgressRollup, ROLLUP_DAY, ROLLUP_WEEK
+
+PERIODS = (ROLLUP_DAY, ROLLUP_WEEK)
+
+
+def period_start(period: str, day: date) -> date:
+    return day - timedelta(days=day.weekday()) if period == ROLLUP_WEEK else day
+
+
+def _numeric_items(metric: Dict[str, Any]) -> Iterable[Tuple[str, float]]:
+    for key, value in metric.items():
+        # bool is an int subclass but true/false are not measurements
+        if isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value):
+            yield key, float(value)
+
+
+def rollup_deltas(rows: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Aggregate new metric rows (user_id, metric, created_at) into rollup upsert rows."""
+    acc: Dict[Tuple, List[float]] = {}
+    for row in rows:
+        day = row["created_at"].astimezone(timezone.utc).date()
+        for key, value in _numeric_items(row["metric"]):
+            for period in PERIODS:
+                k = (row["user_id"], period, period_start(period, day), key)
+                a = acc.get(k)
+                if a is None:
+                    acc[k] = [1, value, value, value, value * value]
+                else:
+                    a[0] += 1
+                    a[1] += value
+                    a[2] = min(a[2], value)
+                    a[3] = max(a[3], value)
+                    a[4] += value * value
+    # sorted so concurrent batches lock rollup rows in the same order (no deadlocks)
+    return [
+        {"user_id": k[0], "period": k[1], "period_start": k[2], "metric_key": k[3],
+         "count": a[0], "sum": a[1], "min": a[2], "max": a[3], "sumsq": a[4]}
+        for k, a in sorted(acc.items(), key=lambda item: (str(item[0][0]),) + item[0][1:])
+    ]
+
+
+def _upsert(deltas: List[Dict[str, Any]]):
+    stmt = insert(ProgressRollup).values(deltas)
+    t, new = ProgressRollup.__table__.c, stmt.excluded
+    return stmt.on_conflict_do_update(
+        index_elements=[t.user_id, t.period, t.period_start, t.metric_key],
+        set_={
+            "count": t.count + new.count,
+            "sum": t.sum + new.sum,
+            "min": func.least(t.min, new.min),
+            "max": func.greatest(t.max, new.max),
+            "sumsq": t.sumsq + new.sumsq,
+            "updated_at": func.now(),
+        },
+    )
+
+
+# one statement per chunk keeps the bind count well under the protocol limit
+_UPSERT_CHUNK = 1000
+
+
+async def apply_rollups(db: AsyncSession, rows: Iterable[Dict[str, Any]]) -> int:
+    """Fold newly inserted metric rows into the rollups. Call inside the insert's transaction."""
+    deltas = rollup_deltas(rows)
+    for i in range(0, len(deltas), _UPSERT_CHUNK):
+        await db.execute(_upsert(deltas[i:i + _UPSERT_CHUNK]))
+    return len(deltas)
+
+
+def rollup_stats(r: ProgressRollup) -> Dict[str, Any]:
+    mean = r.sum / r.count
+    return {
+        "count": r.count,
+        "mean": mean,
+        "min": r.min,
+        "max": r.max,
+        "stddev": math.sqrt(max(r.sumsq / r.count - mean * mean, 0.0)),
+    }
+
+
+# ---------- Rebuild ----------
+
+_REBUILD_SQL = text("""
+    insert into progress_rollups (user_id, period, period_start, metric_key, count, sum, min, max, sumsq)
+    select m.user_id,
+           :period,
+           date_trunc(:period, timezone('UTC', m.created_at))::date,
+           kv.key,
+           count(*),
+           sum(kv.value::text::float8),
+           min(kv.value::text::float8),
+           max(kv.value::text::float8),
+           sum(kv.value::text::float8 ^ 2)
+    from progress_metrics m
+    cross join lateral jsonb_each(m.metric) as kv
+    where m.user_id is not null
+      and jsonb_typeof(m.metric) = 'object'
+      and jsonb_typeof(kv.value) = 'number'
+      and (cast(:user_id as uuid) is null or m.user_id = cast(:user_id as uuid))
+    group by 1, 3, 4
+""")
+
+
+def rebuild(db: Session, user_id: Optional[uuid.UUID] = None) -> int:
+    """Recompute rollups from progress_metrics (for one user or everyone) in one transaction."""
+    # blocks ingestion until commit, so a metric is counted either by this
+    # rebuild or by its own apply_rollups(), never both or neither
+    db.execute(text("lock table progress_rollups in exclusive mode"))
+    stmt = delete(ProgressRollup)
+    if user_id is not None:
+        stmt = stmt.where(ProgressRollup.user_id == user_id)
+    db.execute(stmt)
+    written = 0
+    for period in PERIODS:
+        written += db.execute(_REBUILD_SQL, {"period": period, "user_id": str(user_id) if user_id else None}).rowcount
+    db.commit()
+    return written
+
+
+def main() -> None:
+    from app.db.session import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Maintain progress_rollups")
+    sub = parser.add_subparsers(dest="command", required=True)
+    cmd = sub.add_parser("rebuild", help="recompute rollups from progress_metrics (also backfills)")
+    cmd.add_argument("--user-id", type=uuid.UUID, default=None)
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        written = rebuild(db, args.user_id)
+    scope = f"user {args.user_id}" if args.user_id else "all users"
+    print(f"Rebuilt {written} rollup rows for {scope}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+"""
+Write-behind buffer for high-volume inserts.
+
+Under burst load, most of the database cost of a small write is its own
+transaction: the round trips and the WAL fsync of every commit. With
+WRITE_BEHIND_ENABLED, such writes are queued per process as plain dicts (no
+ORM objects) and written in batches. One transaction per stream and flush
+holds multi-row INSERTs (executemany, which SQLAlchemy sends as
+INSERT ... VALUES batches). A flush runs WRITE_BEHIND_FLUSH_MS after the
+first queued row, or as soon as WRITE_BEHIND_MAX_BATCH rows are queued.
+
+Each kind of row is a stream. The module that owns the table registers a
+writer for it, `writer(db, rows)`. A writer runs inside the flush
+transaction and may add follow-up statements for the whole batch, such as
+status updates, rollups or version bumps:
+
+    write_behind.register("progress_metrics", _write_metrics)
+    await write_behind.add("progress_metrics", row)
+
+WRITE_BEHIND_DURABILITY picks what a caller waits for:
+- "commit": add() returns once the batch holding its row has committed.
+  Responses mean what they did before, and concurrent requests share one
+  commit (group commit).
+- "buffered": add() returns once the row is queued, and flushes commit with
+  synchronous_commit off. This is faster, but rows queued or in flight when a
+  process crashes are lost, and a read right after the write may not see it yet.
+
+When more than WRITE_BEHIND_MAX_PENDING rows are queued or being written,
+add() waits for room (backpressure). After WRITE_BEHIND_BLOCK_SECONDS it fails
+with 503 and Retry-After. A failed flush is retried, up to
+WRITE_BEHIND_MAX_ATTEMPTS times in all. After that its rows are written one at
+a time, so a single bad row fails alone: its caller gets the error ("commit"),
+or the row is dropped and logged ("buffered").
+stop(), called from the app lifespan, flushes everything still queued.
+
+Without the buffer running (disabled, or before start / after stop), add()
+writes the row straight away in its own short transaction.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import anyio
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.metrics import Counter, Gauge, registry
+from app.db.session import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+DURABILITY_COMMIT = "commit"
+DURABILITY_BUFFERED = "buffered"
+
+# Writes one batch of a stream's rows inside the flush transaction
+Writer = Callable[[AsyncSession, List[Dict[str, Any]]], Awaitable[None]]
+
+_RETRY_BACKOFF_SECONDS = 0.2  # doubled on every retry
+
+rows_written = registry.register(Counter(
+    "write_behind_rows_total", "Rows written by write-behind flushes", ("stream",),
+))
+flushes = registry.register(Counter(
+    "write_behind_flushes_total", "Write-behind flush transactions by trigger (size, time, shutdown)",
+    ("stream", "trigger"),
+))
+dropped = registry.register(Counter(
+    "write_behind_dropped_rows_total", "Rows lost in \"buffered\" mode because they could not be written",
+    ("stream",),
+))
+rejected = registry.register(Counter(
+    "write_behind_rejected_total", "Writes refused with 503 because the buffer stayed full", ("stream",),
+))
+pending_rows = registry.register(Gauge(
+    "write_behind_pending_rows", "Rows queued or being written",
+))
+
+# a queued row, and the future its caller waits on in "commit" mode
+_Item = Tuple[Dict[str, Any], Optional[asyncio.Future]]
+
+
+class WriteBehindBuffer:
+    """Per-process queue of insert records, flushed in batches by one background task."""
+
+    def __init__(self) -> None:
+        self._writers: Dict[str, Writer] = {}
+        self._queue: Dict[str, List[_Item]] = {}
+        self._queued = 0
+        self._in_flight = 0
+        self._first_at: Optional[float] = None
+        self._wakeup = asyncio.Event()  # rows queued, or stopping
+        self._full = asyncio.Event()  # WRITE_BEHIND_MAX_BATCH rows queued, or stopping
+        self._space = asyncio.Event()  # rows written: blocked writers may retry
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        self.durability = DURABILITY_COMMIT
+
+    def register(self, stream: str, writer: Writer) -> None:
+        self._writers[stream] = writer
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def start(self) -> None:
+        durability = settings.WRITE_BEHIND_DURABILITY
+        if durability not in (DURABILITY_COMMIT, DURABILITY_BUFFERED):
+            raise ValueError(f"WRITE_BEHIND_DURABILITY must be {DURABILITY_COMMIT!r} or {DURABILITY_BUFFERED!r}")
+        self.durability = durability
+        self._closing = False
+        self._task = asyncio.create_task(self._run())
+        logger.info("Started write-behind buffer (durability=%s)", durability)
+
+    async def stop(self) -> None:
+        """Flush everything queued, then write inline again. Shielded: shutdown must not lose rows."""
+        task, self._task = self._task, None
+        if task is None:
+            return
+        self._closing = True
+        self._wakeup.set()
+        self._full.set()
+        with anyio.CancelScope(shield=True):
+            await task
+
+    async def add(self, stream: str, row: Dict[str, Any]) -> None:
+        """Queue `row` for `stream`'s writer (see the module docstring for what this waits for)."""
+        if stream not in self._writers:
+            raise KeyError(f"No write-behind writer registered for {stream!r}")
+        if self._task is None:
+            await self._write(stream, [row], relaxed=False)
+            return
+
+        await self._wait_for_space(stream)
+        future = asyncio.get_running_loop().create_future() if self.durability == DURABILITY_COMMIT else None
+        self._queue.setdefault(stream, []).append((row, future))
+        self._queued += 1
+        pending_rows.inc()
+        if self._first_at is None:
+            self._first_at = time.monotonic()
+        self._wakeup.set()
+        if self._queued >= settings.WRITE_BEHIND_MAX_BATCH:
+            self._full.set()
+        if future is not None:
+            # a cancelled request does not take its row out of the batch
+            await asyncio.shield(future)
+
+    async def _wait_for_space(self, stream: str) -> None:
+        deadline = time.monotonic() + settings.WRITE_BEHIND_BLOCK_SECONDS
+        while self._queued + self._in_flight >= settings.WRITE_BEHIND_MAX_PENDING:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                rejected.inc(stream=stream)
+                raise HTTPException(
+                    status_code=503, detail="Too many writes queued, try again shortly", headers={"Retry-After": "1"}
+                )
+            self._space.clear()
+            try:
+                await asyncio.wait_for(self._space.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run(self) -> None:
+        while True:
+            if not self._queued:
+                if self._closing:
+                    return
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            delay = self._first_at + settings.WRITE_BEHIND_FLUSH_MS / 1000 - time.monotonic()
+            if delay > 0 and self._queued < settings.WRITE_BEHIND_MAX_BATCH and not self._closing:
+                self._full.clear()
+                try:
+                    await asyncio.wait_for(self._full.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+            if self._closing:
+                trigger = "shutdown"
+            elif self._queued >= settings.WRITE_BEHIND_MAX_BATCH:
+                trigger = "size"
+            else:
+                trigger = "time"
+            try:
+                await self._flush(trigger)
+            except Exception:
+                logger.exception("Write-behind flush failed")
+
+    async def _flush(self, trigger: str) -> None:
+        queue, self._queue = self._queue, {}
+        count, self._queued, self._first_at = self._queued, 0, None
+        self._in_flight += count
+        try:
+            for stream, items in queue.items():
+                for i in range(0, len(items), settings.WRITE_BEHIND_MAX_BATCH):
+                    chunk = items[i:i + settings.WRITE_BEHIND_MAX_BATCH]
+                    await self._flush_chunk(stream, chunk, trigger)
+                    self._in_flight -= len(chunk)
+                    count -= len(chunk)
+                    pending_rows.dec(len(chunk))
+                    self._space.set()
+        finally:
+            # only if a chunk raised past _flush_chunk: do not leave phantom in-flight rows
+            self._in_flight -= count
+            pending_rows.dec(count)
+            self._space.set()
+
+    async def _flush_chunk(self, stream: str, items: List[_Item], trigger: str) -> None:
+        rows = [row for row, _ in items]
+        relaxed = self.durability == DURABILITY_BUFFERED
+        error: Optional[BaseException] = None
+        for attempt in range(1, settings.WRITE_BEHIND_MAX_ATTEMPTS + 1):
+            try:
+                await self._write(stream, rows, relaxed=relaxed)
+                error = None
+                break
+            except Exception as e:
+                error = e
+                if attempt < settings.WRITE_BEHIND_MAX_ATTEMPTS:
+                    logger.warning("Write-behind flush of %d %s rows failed (attempt %d): %s",
+                                   len(rows), stream, attempt, e)
+                    await asyncio.sleep(_RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1))
+
+        if error is None:
+            flushes.inc(stream=stream, trigger=trigger)
+            rows_written.inc(len(rows), stream=stream)
+            self._settle(items, None)
+        elif len(items) == 1:
+            self._give_up(stream, items, error)
+        else:
+            # one bad row (a constraint violation, say) must not fail the rows batched with it
+            logger.warning("Write-behind flush of %d %s rows failed, writing them one at a time: %s",
+                           len(rows), stream, error)
+            written = 0
+            for item in items:
+                try:
+                    await self._write(stream, [item[0]], relaxed=relaxed)
+                except Exception as e:
+                    self._give_up(stream, [item], e)
+                else:
+                    written += 1
+                    self._settle([item], None)
+            if written:
+                flushes.inc(stream=stream, trigger=trigger)
+                rows_written.inc(written, stream=stream)
+
+    def _give_up(self, stream: str, items: List[_Item], error: BaseException) -> None:
+        if self.durability == DURABILITY_BUFFERED:
+            # nobody is waiting for these rows: they are lost
+            dropped.inc(len(items), stream=stream)
+            logger.error("Write-behind dropped %d %s rows: %s", len(items), stream, error)
+        else:
+            logger.warning("Write-behind failed %d %s rows: %s", len(items), stream, error)
+        self._settle(items, error)
+
+    @staticmethod
+    def _settle(items: List[_Item], error: Optional[BaseException]) -> None:
+        for _, future in items:
+            if future is not None and not future.done():
+                if error is None:
+                    future.set_result(None)
+                else:
+                    future.set_exception(error)
+
+    async def _write(self, stream: str, rows: List[Dict[str, Any]], relaxed: bool) -> None:
+        async with AsyncSessionLocal() as db:
+            if relaxed:
+                # losing the last few ms of commits on a crash is accepted in "buffered" mode anyway
+                await db.execute(text("set local synchronous_commit = off"))
+            await self._writers[stream](db, rows)
+            await db.commit()
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "durability": self.durability,
+            "queued": self._queued,
+            "in_flight": self._in_flight,
+            "streams": sorted(self._writers),
+        }
+
+
+write_behind = WriteBehindBuffer()
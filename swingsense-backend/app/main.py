@@ -1,13 +1,54 @@
+import asyncio
+import functools
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from app.core.auth import check_auth_config, jwks
 from app.core.config import settings
+from app.core.idempotency import REPLAYED_HEADER, run_sweeper
+from app.core.llm import create_llm_client, init_tokenizer, warm_up
+from app.core.metrics import MetricsMiddleware
+from app.core.pagination import NEXT_CURSOR_HEADER
+from app.db.write_behind import write_behind
 from app.routers import health, me, questions, plans, progress, resources
+from app.workers.plan_jobs import plan_workers
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    check_auth_config()
+    # off the event loop: the first load may download the tokenizer file
+    await init_tokenizer()
+    # one pooled LLM client per process, injected into routes via get_llm_client
+    llm_client = create_llm_client()
+    app.state.llm_client = llm_client
+    if settings.LLM_WARMUP_CONNECTIONS > 0:
+        await warm_up(llm_client, settings.LLM_WARMUP_CONNECTIONS)
+    if settings.WRITE_BEHIND_ENABLED:
+        await write_behind.start()
+    background = []
+    if settings.SUPABASE_JWKS_URL:
+        background.append(asyncio.create_task(jwks.run_refresh_loop()))
+    if settings.IDEMPOTENCY_SWEEP_SECONDS > 0:
+        background.append(asyncio.create_task(run_sweeper()))
+    if settings.PLAN_JOB_WORKERS > 0:
+        await plan_workers.start(
+            functools.partial(plans.build_plan_for_job, client=llm_client), settings.PLAN_JOB_WORKERS
+        )
+    yield
+    await plan_workers.stop()
+    # after the server has drained requests: nothing is queued behind this
+    await write_behind.stop()
+    for task in background:
+        task.cancel()
+    await asyncio.gather(*background, return_exceptions=True)
+    await llm_client.close()
 
 def create_app() -> FastAPI:
     app = FastAPI(
         title="SwingSense Backend",
         description="FastAPI backend for SwingSense application",
-        version="1.0.0"
+        version="1.0.0",
+        lifespan=lifespan,
     )
     
     # Configure CORS
@@ -17,7 +58,11 @@ def create_app() -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        # readable by the frontend: pagination cursor, cache validators, idempotent replays
+        expose_headers=[NEXT_CURSOR_HEADER, "ETag", "Last-Modified", REPLAYED_HEADER],
     )
+    # outermost: per-route latency and status counts for GET /metrics
+    app.add_middleware(MetricsMiddleware)
     
     # Include routers
     app.include_router(health.router, tags=["health"])
@@ -1,7 +1,60 @@
-from fastapi import APIRouter
+import asyncio
+import time
+
+from fastapi import APIRouter, Depends, Response
+from sqlalchemy import text
+from app.core.config import settings
+from app.core.llm import backend_info, chat_flights, gateway, get_llm_client
+from app.core.metrics import CONTENT_TYPE, pool_status, registry
+from app.db.session import async_engine
 
 router = APIRouter()
 
 @router.get("/healthz")
 async def health_check():
+    """Liveness: the process is up and serving requests."""
     return {"status": "ok"}
+
+async def _ping_db() -> None:
+    async with async_engine.connect() as conn:
+        await conn.execute(text("select 1"))
+
+@router.get("/healthz/ready")
+async def readiness(response: Response):
+    """
+    Readiness: the database answers within READINESS_DB_TIMEOUT_SECONDS and the
+    connection pool is not exhausted with callers queued. Returns 503 otherwise,
+    so a load balancer stops routing to this worker. The LLM breaker is reported
+    but does not fail the check (most endpoints work without the LLM).
+    """
+    start = time.perf_counter()
+    try:
+        await asyncio.wait_for(_ping_db(), timeout=settings.READINESS_DB_TIMEOUT_SECONDS)
+        database = {"ok": True, "latency_ms": round((time.perf_counter() - start) * 1000, 1)}
+    except Exception as e:
+        database = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+    pool = pool_status(async_engine.sync_engine.pool, settings.DB_MAX_OVERFLOW)
+    pool["ok"] = pool["saturation"] < 1 or pool["waiting"] == 0
+    ready = database["ok"] and pool["ok"]
+    if not ready:
+        response.status_code = 503
+    return {
+        "status": "ready" if ready else "unavailable",
+        "database": database,
+        "pool": pool,
+        "llm": {"breaker_state": gateway.breaker.state},
+    }
+
+@router.get("/healthz/llm")
+async def llm_stats(client=Depends(get_llm_client)):
+    """Gateway state (breaker, limiter, retries, hedges, latency), single-flight counters and LLM_MODE."""
+    return {
+        "backend": backend_info(client),
+        "gateway": gateway.snapshot(),
+        "singleflight": chat_flights.snapshot(),
+    }
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus text format: HTTP, database pool/query and LLM metrics for this worker."""
+    return Response(content=registry.render(), media_type=CONTENT_TYPE)
@@ -1,43 +1,57 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends
+from pydantic import BaseModel, ConfigDict, Field
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.session import get_db
-from app.core.auth import get_current_user
-from typing import Dict, Any
+from app.core.auth import get_current_user, get_current_user_id
+from app.core.profiles import bootstrap_profile, update_profile
+from typing import Dict, Any, Optional
+import uuid
 
 router = APIRouter()
 
+class ProfileUpdate(BaseModel):
+    """Fields to change; omitted fields are left alone, null clears a field."""
+    model_config = ConfigDict(extra="forbid")
+
+    name: Optional[str] = Field(None, max_length=100)
+    years_played: Optional[int] = Field(None, ge=0, le=80)
+    handicap: Optional[float] = Field(None, ge=0, le=54)
+    strengths: Optional[str] = Field(None, max_length=500)
+    weaknesses: Optional[str] = Field(None, max_length=500)
+    goals: Optional[str] = Field(None, max_length=500)
+
 @router.get("/")
 async def get_me(
     current_user: Dict[str, Any] = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    user_id: uuid.UUID = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db)
 ):
     """
-    Get current user profile. Bootstrap user & profile rows if missing.
+    Get current user profile. Bootstrap user & profile rows if missing
+    (one round trip; later calls are served from the per-worker profile cache).
     """
-    # TODO: Implement user and profile table creation/retrieval
+    profile = await bootstrap_profile(db, user_id, current_user["email"])
     return {
         "user_id": current_user["user_id"],
         "email": current_user["email"],
-        "profile": {
-            "name": None,
-            "age": None,
-            "skill_level": None,
-            "goals": []
-        }
+        "profile": profile,
     }
 
 @router.put("/")
 async def update_me(
-    profile_data: Dict[str, Any],
+    profile_data: ProfileUpdate,
     current_user: Dict[str, Any] = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    user_id: uuid.UUID = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Update user profile fields.
     """
-    # TODO: Implement profile update logic
+    fields = profile_data.model_dump(exclude_unset=True)
+    profile = await update_profile(db, user_id, current_user["email"], fields)
     return {
         "message": "Profile updated successfully",
         "user_id": current_user["user_id"],
-        "updated_fields": list(profile_data.keys())
+        "updated_fields": list(fields.keys()),
+        "profile": profile,
     }
@@ -1,77 +1,481 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from app.db.session import get_db
-from app.db.models import TrainingPlan
-from pydantic import BaseModel, Field
-from openai import OpenAI
-import os
+from fastapi import APIRouter, Depends, Header, HTTPException, Path, Query, Request, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.auth import get_current_user_id
+from app.core.config import settings
+from app.core.idempotency import IDEMPOTENCY_HEADER, request_fingerprint, run_idempotent
+from app.core.http_cache import FastJSONResponse, SCOPE_PLANS, bump_version, cached_json
+from app.core.llm import chat_stream, get_llm_client, llm_http_error
+from app.core.llm_routing import log_route, plan_route, routed_completion, week_route
+from app.core.profiles import get_profile
+from app.core.sse import SSE_HEADERS, sse_event
+from app.db.session import get_db, AsyncSessionLocal
+from app.db.models import PLAN_COMPLETE, PLAN_PARTIAL, TrainingPlan
+from app.workers import plan_jobs
+from pydantic import BaseModel, Field, ValidationError
+from openai import AsyncOpenAI
+from contextlib import aclosing
+import anyio
+import json
+import time
+import uuid
+from typing import Annotated, List, Optional
 
 router = APIRouter()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
 class PlanInput(BaseModel):
-    years_played: int = Field(..., ge=0, le=80)
-    handicap: float = Field(..., ge=0, le=54)
-    strengths: str = Field(..., min_length=3, max_length=500)
-    weaknesses: str = Field(..., min_length=3, max_length=500)
-    goals: str = Field(..., min_length=3, max_length=500)
+    """Omitted fields are taken from the user's profile (PUT /me)."""
+    years_played: Optional[int] = Field(None, ge=0, le=80)
+    handicap: Optional[float] = Field(None, ge=0, le=54)
+    strengths: Optional[str] = Field(None, min_length=3, max_length=500)
+    weaknesses: Optional[str] = Field(None, min_length=3, max_length=500)
+    goals: Optional[str] = Field(None, min_length=3, max_length=500)
+
+PLAN_WEEKS = 4
+
+class PlanWeek(BaseModel):
+    week: int = Field(..., ge=1, le=PLAN_WEEKS)
+    focus: str = Field(..., min_length=3, max_length=300)
+    drills: List[Annotated[str, Field(min_length=3, max_length=500)]] = Field(..., min_length=1, max_length=8)
+    tips: List[Annotated[str, Field(min_length=3, max_length=500)]] = Field(default_factory=list, max_length=8)
+
+class StructuredPlan(BaseModel):
+    summary: str = Field(..., min_length=3, max_length=1000)
+    weeks: List[PlanWeek] = Field(..., min_length=PLAN_WEEKS, max_length=PLAN_WEEKS)
+
+class RegenerateWeekBody(BaseModel):
+    instructions: Optional[str] = Field(None, max_length=500, description="What to change, e.g. 'less putting'")
+
+# JSON schemas for structured output (strict mode: every property required, no extras).
+# Array lengths are checked by the pydantic models above when the answer comes back.
+_WEEK_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "week": {"type": "integer"},
+        "focus": {"type": "string"},
+        "drills": {"type": "array", "items": {"type": "string"}},
+        "tips": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["week", "focus", "drills", "tips"],
+    "additionalProperties": False,
+}
+# summary first, so streamed weeks can be picked out as they complete
+_PLAN_SCHEMA = {
+    "type": "object",
+    "properties": {"summary": {"type": "string"}, "weeks": {"type": "array", "items": _WEEK_SCHEMA}},
+    "required": ["summary", "weeks"],
+    "additionalProperties": False,
+}
+
+def _response_format(name: str, schema: dict) -> dict:
+    return {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": schema}}
+
+PLAN_RESPONSE_FORMAT = _response_format("training_plan", _PLAN_SCHEMA)
+WEEK_RESPONSE_FORMAT = _response_format("training_plan_week", _WEEK_SCHEMA)
 
 PLAN_PROMPT_TEMPLATE = (
     "You are SwingSense, a golf coach. Create a personalized 4-week training plan for this player:\n"
-    "- Years played: {years_played}\n"
-    "- Handicap: {handicap}\n"
-    "- Strengths: {strengths}\n"
-    "- Weaknesses: {weaknesses}\n"
-    "- Goals: {goals}\n"
-    "Give weekly focus, drills, and tips. Use concise bullet points."
+    "{player}\n"
+    "Start with a one or two sentence summary. For each week give its focus, 2-4 drills and 1-3 tips, "
+    "each a short sentence."
 )
 
-@router.post("/generate", status_code=status.HTTP_201_CREATED)
-def generate_plan(body: PlanInput, db: Session = Depends(get_db)):
-    prompt = PLAN_PROMPT_TEMPLATE.format(
+WEEK_PROMPT_TEMPLATE = (
+    "You are SwingSense, a golf coach. Rewrite week {n} of this player's 4-week training plan.\n"
+    "{player}\n"
+    "Plan summary: {summary}\n"
+    "Other weeks: {other_weeks}\n"
+    "Current week {n}: {week}\n"
+    "{instructions} Keep it consistent with the other weeks. Give the focus, 2-4 drills and 1-3 tips."
+)
+
+async def _with_profile(body: PlanInput, user_id: uuid.UUID, db: Optional[AsyncSession] = None) -> PlanInput:
+    """Fill omitted fields from the (cached) profile; 422 if any is still missing."""
+    missing = [f for f in PlanInput.model_fields if getattr(body, f) is None]
+    if not missing:
+        return body
+    profile = await get_profile(user_id, db) or {}
+    filled = {f: profile.get(f) for f in missing if profile.get(f) is not None}
+    still_missing = [f for f in missing if f not in filled]
+    if still_missing:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Missing plan fields (not in the request or your profile): {', '.join(still_missing)}",
+        )
+    return body.model_copy(update=filled)
+
+def _player_lines(p) -> str:
+    # p: a complete PlanInput or a TrainingPlan row
+    return (
+        f"- Years played: {p.years_played}\n"
+        f"- Handicap: {p.handicap}\n"
+        f"- Strengths: {p.strengths}\n"
+        f"- Weaknesses: {p.weaknesses}\n"
+        f"- Goals: {p.goals}"
+    )
+
+def _plan_messages(body: PlanInput) -> list:
+    return [
+        {"role": "system", "content": "You are a helpful golf coach."},
+        {"role": "user", "content": PLAN_PROMPT_TEMPLATE.format(player=_player_lines(body))},
+    ]
+
+def _week_messages(plan: TrainingPlan, n: int, instructions: Optional[str]) -> list:
+    """Only week n in full; the rest of the plan as its summary and one focus line per week."""
+    other_weeks = "; ".join(f"week {w['week']}: {w['focus']}" for w in plan.weeks if w["week"] != n)
+    prompt = WEEK_PROMPT_TEMPLATE.format(
+        n=n,
+        player=_player_lines(plan),
+        summary=plan.summary or "-",
+        other_weeks=other_weeks or "-",
+        week=json.dumps(plan.weeks[n - 1], separators=(",", ":")),
+        instructions=instructions or "Give it fresh drills and tips.",
+    )
+    return [
+        {"role": "system", "content": "You are a helpful golf coach."},
+        {"role": "user", "content": prompt},
+    ]
+
+def _parse_plan(content: str) -> StructuredPlan:
+    try:
+        plan = StructuredPlan.model_validate_json(content)
+    except ValidationError as e:
+        raise HTTPException(status_code=502, detail=f"AI returned an invalid plan: {e.errors()[0]['msg']}")
+    # number the weeks by position, whatever the model wrote
+    for i, week in enumerate(plan.weeks, start=1):
+        week.week = i
+    return plan
+
+def render_plan_text(summary: Optional[str], weeks: List[dict]) -> str:
+    """Plain-text version kept in TrainingPlan.plan for clients that do not read `weeks`."""
+    lines = [summary, ""] if summary else []
+    for w in weeks:
+        lines.append(f"Week {w['week']}: {w['focus']}")
+        lines.extend(f"- Drill: {d}" for d in w["drills"])
+        lines.extend(f"- Tip: {t}" for t in w["tips"])
+        lines.append("")
+    return "\n".join(lines).strip()
+
+def _plan_row(
+    user_id, body: PlanInput, summary: Optional[str], weeks: List[dict], plan_status: str = PLAN_COMPLETE
+) -> TrainingPlan:
+    return TrainingPlan(
+        user_id=user_id,
+        plan=render_plan_text(summary, weeks),
+        summary=summary,
+        weeks=weeks,
+        status=plan_status,
         years_played=body.years_played,
         handicap=body.handicap,
         strengths=body.strengths,
         weaknesses=body.weaknesses,
         goals=body.goals,
     )
+
+def _plan_out(plan: TrainingPlan) -> dict:
+    return {"id": str(plan.id), "plan": plan.plan, "summary": plan.summary, "weeks": plan.weeks, "status": plan.status}
+
+async def _save_plan(
+    user_id, body: PlanInput, summary: Optional[str], weeks: List[dict], plan_status: str = PLAN_COMPLETE
+):
+    """Persist a plan in its own short session (used after the request session is gone)."""
+    if not weeks:
+        return None
+    async with AsyncSessionLocal() as db:
+        plan = _plan_row(user_id, body, summary, weeks, plan_status)
+        db.add(plan)
+        await bump_version(db, user_id, SCOPE_PLANS)
+        await db.commit()
+        return plan.id
+
+class _WeekScanner:
+    """Picks complete week objects out of the plan JSON as it streams in."""
+
+    def __init__(self) -> None:
+        self.text = ""
+        self._pos: Optional[int] = None  # just inside the weeks array, once found
+        self._decoder = json.JSONDecoder()
+
+    def feed(self, delta: str) -> List[dict]:
+        self.text += delta
+        if self._pos is None:
+            key = self.text.find('"weeks"')
+            bracket = self.text.find("[", key) if key >= 0 else -1
+            if bracket < 0:
+                return []
+            self._pos = bracket + 1
+        found = []
+        while True:
+            pos = self._pos
+            while pos < len(self.text) and self.text[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= len(self.text) or self.text[pos] != "{":
+                return found
+            try:
+                obj, self._pos = self._decoder.raw_decode(self.text, pos)
+            except json.JSONDecodeError:
+                return found  # this week is not complete yet
+            found.append(obj)
+
+async def _stream_plan(client: AsyncOpenAI, user_id, body: PlanInput):
+    """
+    Send each week as a `week` SSE event as soon as the model has finished it,
+    then validate and save the whole plan. If the client disconnects or the
+    stream breaks, the weeks completed so far are still saved, marked partial
+    so they never become the user's current plan.
+    """
+    scanner = _WeekScanner()
+    weeks: List[dict] = []
+    saved = False
+    route = plan_route()
+    start = time.perf_counter()
     try:
-        resp = client.chat.completions.create(
-            model="gpt-4o-mini",
-            temperature=0.7,
-            messages=[
-                {"role": "system", "content": "You are a helpful golf coach."},
-                {"role": "user", "content": prompt},
-            ],
+        deltas = chat_stream(
+            client, temperature=0.7, messages=_plan_messages(body),
+            response_format=PLAN_RESPONSE_FORMAT, **route.params(),
         )
-        plan_text = resp.choices[0].message.content.strip()
+        async with aclosing(deltas):
+            async for delta in deltas:
+                for raw in scanner.feed(delta):
+                    try:
+                        week = PlanWeek.model_validate({**raw, "week": len(weeks) + 1}).model_dump()
+                    except ValidationError:
+                        continue  # the full plan is validated below
+                    weeks.append(week)
+                    yield sse_event("week", {"week": week})
+        plan = _parse_plan(scanner.text)
+        saved = True
+        plan_id = await _save_plan(user_id, body, plan.summary, [w.model_dump() for w in plan.weeks])
+        yield sse_event("done", {"id": str(plan_id) if plan_id else None, "summary": plan.summary})
     except Exception as e:
-        raise HTTPException(status_code=502, detail=f"LLM error: {e}")
+        yield sse_event("error", {"detail": llm_http_error(e).detail})
+    finally:
+        log_route("plan_stream", route, time.perf_counter() - start)
+        if not saved:
+            # shielded: on client disconnect this runs inside a cancelled scope
+            with anyio.CancelScope(shield=True):
+                await _save_plan(user_id, body, None, weeks, PLAN_PARTIAL)
 
-    plan = TrainingPlan(
-        plan=plan_text,
-        years_played=body.years_played,
-        handicap=body.handicap,
-        strengths=body.strengths,
-        weaknesses=body.weaknesses,
-        goals=body.goals,
+async def request_plan(client: AsyncOpenAI, body: PlanInput) -> StructuredPlan:
+    """Call OpenAI (strong tier, structured output) and return the validated plan."""
+    resp = await routed_completion(
+        client,
+        plan_route(),
+        "plan",
+        temperature=0.7,
+        messages=_plan_messages(body),
+        response_format=PLAN_RESPONSE_FORMAT,
+    )
+    return _parse_plan(resp.choices[0].message.content)
+
+async def build_plan_for_job(payload: dict, client: AsyncOpenAI) -> TrainingPlan:
+    """Background job handler (bound to the shared client at startup): generate the plan, return the unsaved row."""
+    payload = dict(payload)
+    user_id = payload.pop("user_id", None)
+    body = PlanInput(**payload)
+    plan = await request_plan(client, body)
+    return _plan_row(
+        uuid.UUID(user_id) if user_id else None, body, plan.summary, [w.model_dump() for w in plan.weeks]
     )
+
+@router.post("/generate", status_code=status.HTTP_201_CREATED)
+async def generate_plan(
+    body: PlanInput,
+    idempotency_key: Optional[str] = Header(
+        None, alias=IDEMPOTENCY_HEADER, description="Retries with the same key return the first response"
+    ),
+    user_id: uuid.UUID = Depends(get_current_user_id),
+    client: AsyncOpenAI = Depends(get_llm_client),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Generate and save a plan. Fields left out of the body come from the user's profile.
+    With an Idempotency-Key, a retry waits for or replays the first response.
+    """
+    return await run_idempotent(
+        user_id,
+        idempotency_key,
+        request_fingerprint("POST /plans/generate", body),
+        lambda: _generate_plan(body, user_id, client, db),
+    )
+
+async def _generate_plan(body: PlanInput, user_id: uuid.UUID, client: AsyncOpenAI, db: AsyncSession) -> dict:
+    body = await _with_profile(body, user_id, db)
+    await db.commit()  # no connection held during the LLM call
+    try:
+        structured = await request_plan(client, body)
+    except Exception as e:
+        raise llm_http_error(e)
+
+    plan = _plan_row(user_id, body, structured.summary, [w.model_dump() for w in structured.weeks])
     db.add(plan)
-    db.commit()
-    db.refresh(plan)
-    return {"plan": plan.plan, "id": str(plan.id)}
-
-@router.get("/current")
-def get_current_plan(db: Session = Depends(get_db)):
-    plan = db.query(TrainingPlan).order_by(TrainingPlan.created_at.desc()).first()
-    if not plan:
-        return {"plan": None}
-    return {
-        "plan": plan.plan,
-        "years_played": plan.years_played,
-        "handicap": plan.handicap,
-        "strengths": plan.strengths,
-        "weaknesses": plan.weaknesses,
-        "goals": plan.goals,
-        "created_at": plan.created_at,
-    }
+    await bump_version(db, user_id, SCOPE_PLANS)
+    await db.commit()
+    await db.refresh(plan)
+    return _plan_out(plan)
+
+@router.post("/generate/stream")
+async def generate_plan_stream(
+    body: PlanInput,
+    user_id: uuid.UUID = Depends(get_current_user_id),
+    client: AsyncOpenAI = Depends(get_llm_client),
+):
+    """
+    Streaming variant of POST /plans/generate: sends the plan as Server-Sent Events
+    (`week`..., `done` | `error`) and saves the TrainingPlan when the stream ends.
+    """
+    body = await _with_profile(body, user_id)
+    return StreamingResponse(_stream_plan(client, user_id, body), media_type="text/event-stream", headers=SSE_HEADERS)
+
+@router.post("/jobs", status_code=status.HTTP_202_ACCEPTED)
+async def enqueue_plan(
+    body: PlanInput,
+    user_id: uuid.UUID = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Queue plan generation in the background and return immediately.
+    Poll GET /plans/jobs/{job_id} (optionally with ?wait=N to long-poll) for the result.
+    """
+    body = await _with_profile(body, user_id, db)
+    job = await plan_jobs.enqueue_plan_job(db, {**body.model_dump(), "user_id": str(user_id)})
+    return {"job_id": str(job.id), "status": job.status, "poll_url": f"/plans/jobs/{job.id}"}
+
+@router.get("/jobs/stats")
+async def plan_job_stats():
+    """Job counters and average queue wait / run time for this worker process."""
+    return plan_jobs.job_stats.snapshot()
+
+@router.get("/jobs/{job_id}")
+async def get_plan_job(
+    job_id: uuid.UUID,
+    wait: float = Query(0, ge=0, description="Seconds to wait for the job to finish (long-poll)"),
+    user_id: uuid.UUID = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db),
+):
+    job = await plan_jobs.wait_for_job(job_id, min(wait, settings.PLAN_JOB_MAX_WAIT_SECONDS))
+    if job is None or job.payload.get("user_id") != str(user_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+    out = plan_jobs.job_to_dict(job)
+    if job.plan_id:
+        plan = await db.get(TrainingPlan, job.plan_id)
+        out["plan"] = plan.plan if plan else None
+        out["weeks"] = plan.weeks if plan else None
+    return out
+
+@router.get("/current", response_class=FastJSONResponse)
+async def get_current_plan(
+    request: Request,
+    user_id: uuid.UUID = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db),
+):
+    """The user's latest complete plan. Supports If-None-Match / If-Modified-Since (304 when unchanged)."""
+    async def build():
+        stmt = (
+            select(TrainingPlan)
+            .where(TrainingPlan.user_id == user_id, TrainingPlan.status == PLAN_COMPLETE)
+            .order_by(TrainingPlan.created_at.desc(), TrainingPlan.id.desc())
+            .limit(1)
+        )
+        plan = (await db.execute(stmt)).scalars().first()
+        if not plan:
+            return {"plan": None}, {}
+        return {
+            "id": str(plan.id),
+            "plan": plan.plan,
+            "summary": plan.summary,
+            "weeks": plan.weeks,
+            "years_played": plan.years_played,
+            "handicap": plan.handicap,
+            "strengths": plan.strengths,
+            "weaknesses": plan.weaknesses,
+            "goals": plan.goals,
+            "created_at": plan.created_at.isoformat(),
+        }, {}
+
+    return await cached_json(request, db, user_id, SCOPE_PLANS, "current", build)
+
+async def _owned_plan(db: AsyncSession, plan_id: uuid.UUID, user_id: uuid.UUID, n: int) -> TrainingPlan:
+    plan = await db.get(TrainingPlan, plan_id)
+    if plan is None or plan.user_id != user_id:
+        raise HTTPException(status_code=404, detail="Plan not found")
+    if not plan.weeks:
+        raise HTTPException(status_code=404, detail="Plan has no structured weeks (created before they existed)")
+    if n > len(plan.weeks):
+        raise HTTPException(status_code=404, detail=f"Plan has {len(plan.weeks)} weeks")
+    return plan
+
+@router.get("/{plan_id}/weeks/{n}", response_class=FastJSONResponse)
+async def get_plan_week(
+    request: Request,
+    plan_id: uuid.UUID,
+    n: int = Path(..., ge=1, le=PLAN_WEEKS),
+    user_id: uuid.UUID = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db),
+):
+    """One week of a plan (focus, drills, tips). Supports If-None-Match (304 when unchanged)."""
+    async def build():
+        plan = await _owned_plan(db, plan_id, user_id, n)
+        return {"plan_id": str(plan.id), **plan.weeks[n - 1]}, {}
+
+    return await cached_json(request, db, user_id, SCOPE_PLANS, f"plan:{plan_id}:week:{n}", build)
+
+@router.post("/{plan_id}/weeks/{n}/regenerate")
+async def regenerate_plan_week(
+    plan_id: uuid.UUID,
+    body: Optional[RegenerateWeekBody] = None,
+    n: int = Path(..., ge=1, le=PLAN_WEEKS),
+    idempotency_key: Optional[str] = Header(
+        None, alias=IDEMPOTENCY_HEADER, description="Retries with the same key return the first response"
+    ),
+    user_id: uuid.UUID = Depends(get_current_user_id),
+    client: AsyncOpenAI = Depends(get_llm_client),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Rewrite one week of a plan. Only that week, the plan summary and the other
+    weeks' focus lines go to the LLM, so this is far smaller than regenerating
+    the whole plan. The other weeks are left as they are.
+    """
+    body = body or RegenerateWeekBody()
+    return await run_idempotent(
+        user_id,
+        idempotency_key,
+        request_fingerprint(f"POST /plans/{plan_id}/weeks/{n}/regenerate", body),
+        lambda: _regenerate_week(plan_id, n, body, user_id, client, db),
+        status_code=200,
+    )
+
+async def _regenerate_week(
+    plan_id: uuid.UUID, n: int, body: RegenerateWeekBody, user_id: uuid.UUID, client: AsyncOpenAI, db: AsyncSession
+) -> dict:
+    plan = await _owned_plan(db, plan_id, user_id, n)
+    messages = _week_messages(plan, n, body.instructions)
+    await db.commit()  # no connection held during the LLM call
+
+    try:
+        resp = await routed_completion(
+            client, week_route(), "plan_week", temperature=0.7, messages=messages,
+            response_format=WEEK_RESPONSE_FORMAT,
+        )
+        week = PlanWeek.model_validate({**json.loads(resp.choices[0].message.content), "week": n}).model_dump()
+    except (ValueError, ValidationError):
+        raise HTTPException(status_code=502, detail="AI returned an invalid week")
+    except Exception as e:
+        raise llm_http_error(e)
+
+    # re-read under a row lock so a concurrent edit of another week is not lost
+    async with AsyncSessionLocal() as write:
+        row = (await write.execute(
+            select(TrainingPlan).where(TrainingPlan.id == plan_id).with_for_update()
+        )).scalars().first()
+        if row is None or not row.weeks or n > len(row.weeks):
+            raise HTTPException(status_code=404, detail="Plan not found")
+        weeks = list(row.weeks)
+        weeks[n - 1] = week
+        row.weeks = weeks
+        row.plan = render_plan_text(row.summary, weeks)
+        await bump_version(write, user_id, SCOPE_PLANS)
+        await write.commit()
+    return {"plan_id": str(plan_id), **week}
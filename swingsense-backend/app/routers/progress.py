@@ -1,44 +1,312 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy import Float, func, insert, select
+from sqlalchemy.dialects.postgresql import array
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.session import get_db
-from app.core.auth import get_current_user
-from typing import Dict, Any, List, Optional
-from datetime import datetime, date
+from app.db.models import ProgressMetric, ProgressRollup, ROLLUP_DAY, ROLLUP_WEEK
+from app.db.rollups import apply_rollups, period_start, rollup_stats
+from app.db.write_behind import write_behind
+from app.core.auth import get_current_user_id
+from app.core.config import settings
+from app.core.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, paginate, split_page
+from typing import Dict, Any, List, Optional, Tuple
+from datetime import datetime, date, time, timedelta, timezone
+import json
+import uuid
 
 router = APIRouter()
 
-@router.post("/")
+# Optional client-side timestamp inside a metric (e.g. when the shot was hit).
+# Stored as created_at so date ranges follow when it happened, not when it was uploaded.
+RECORDED_AT_KEY = "recorded_at"
+
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+PROGRESS_METRICS = "progress_metrics"
+
+# ---------- Helpers ----------
+
+def _metric_row(user_id: uuid.UUID, metric: Any, received_at: datetime) -> Dict[str, Any]:
+    if not isinstance(metric, dict):
+        raise ValueError("each metric must be a JSON object")
+    metric = dict(metric)
+    recorded_at = metric.pop(RECORDED_AT_KEY, None)
+    if recorded_at is None:
+        created_at = received_at
+    else:
+        created_at = datetime.fromisoformat(str(recorded_at).replace("Z", "+00:00"))
+        if created_at.tzinfo is None:
+            created_at = created_at.replace(tzinfo=timezone.utc)
+    return {"id": uuid.uuid4(), "user_id": user_id, "metric": metric, "created_at": created_at}
+
+async def _write_metrics(db: AsyncSession, rows: List[Dict[str, Any]]) -> None:
+    """Write-behind writer: one multi-row INSERT plus the rollups for a batch of single metrics."""
+    await db.execute(insert(ProgressMetric), rows)
+    await apply_rollups(db, rows)
+
+write_behind.register(PROGRESS_METRICS, _write_metrics)
+
+class _Constant:
+    """NaN / Infinity / -Infinity: json accepts them, but they are not JSON and jsonb rejects them."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+def _find_constant(value: Any) -> Optional[str]:
+    if isinstance(value, _Constant):
+        return value.name
+    children = value.values() if isinstance(value, dict) else value if isinstance(value, list) else ()
+    for child in children:
+        name = _find_constant(child)
+        if name is not None:
+            return name
+    return None
+
+def _parse_batch(raw: bytes, content_type: str) -> List[Any]:
+    """Decode an NDJSON body (one object per line) or a JSON array."""
+    if content_type.split(";")[0].strip().lower() in NDJSON_CONTENT_TYPES:
+        items = []
+        for lineno, line in enumerate(raw.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line, parse_constant=_Constant)
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"Invalid JSON on line {lineno}")
+            constant = _find_constant(item)
+            if constant is not None:
+                raise HTTPException(status_code=400, detail=f"Invalid JSON on line {lineno}: {constant} is not a number")
+            items.append(item)
+        return items
+    try:
+        items = json.loads(raw, parse_constant=_Constant)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+    for i, item in enumerate(items):
+        constant = _find_constant(item)
+        if constant is not None:
+            raise HTTPException(status_code=400, detail=f"Invalid JSON at index {i}: {constant} is not a number")
+    return items
+
+def _range_bounds(start_date: Optional[date], end_date: Optional[date]) -> Tuple[Optional[datetime], Optional[datetime]]:
+    """Inclusive UTC date range -> half-open [start, end) timestamps for an index range scan."""
+    if start_date and end_date and start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date must not be after end_date")
+    start = datetime.combine(start_date, time.min, tzinfo=timezone.utc) if start_date else None
+    end = datetime.combine(end_date + timedelta(days=1), time.min, tzinfo=timezone.utc) if end_date else None
+    return start, end
+
+def _in_range(stmt, start: Optional[datetime], end: Optional[datetime]):
+    if start is not None:
+        stmt = stmt.where(ProgressMetric.created_at >= start)
+    if end is not None:
+        stmt = stmt.where(ProgressMetric.created_at < end)
+    return stmt
+
+# ---------- Routes ----------
+
+@router.post("/", status_code=status.HTTP_201_CREATED)
 async def create_progress(
     progress_data: Dict[str, Any],
-    current_user: Dict[str, Any] = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    user_id: uuid.UUID = Depends(get_current_user_id),
 ):
     """
-    Create a new progress metric entry.
+    Record one progress metric (any JSON object). An optional `recorded_at`
+    ISO timestamp in the object is used as its time instead of now.
+    With WRITE_BEHIND_ENABLED the row is batched with other requests' metrics.
     """
-    # TODO: Implement database model and save progress data
+    try:
+        row = _metric_row(user_id, progress_data, datetime.now(timezone.utc))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid metric: {e}")
+    await write_behind.add(PROGRESS_METRICS, row)
     return {
         "message": "Progress recorded successfully",
-        "data": progress_data,
-        "user_id": current_user["user_id"],
-        "timestamp": datetime.utcnow().isoformat()
+        "id": str(row["id"]),
+        "data": row["metric"],
+        "user_id": str(user_id),
+        "timestamp": row["created_at"].isoformat()
     }
 
+@router.post("/batch", status_code=status.HTTP_201_CREATED)
+async def create_progress_batch(
+    request: Request,
+    user_id: uuid.UUID = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Record many metrics at once, e.g. a launch-monitor session.
+    Send a JSON array, or NDJSON (one object per line) with
+    Content-Type: application/x-ndjson. All rows are written in one transaction.
+    """
+    items = _parse_batch(await request.body(), request.headers.get("content-type", ""))
+    if len(items) > settings.PROGRESS_BATCH_MAX_ROWS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: {len(items)} rows (max {settings.PROGRESS_BATCH_MAX_ROWS})",
+        )
+    received_at = datetime.now(timezone.utc)
+    rows = []
+    for i, item in enumerate(items):
+        try:
+            rows.append(_metric_row(user_id, item, received_at))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid metric at index {i}: {e}")
+    if rows:
+        # executemany: SQLAlchemy batches these into multi-row INSERT ... VALUES statements
+        await db.execute(insert(ProgressMetric), rows)
+        await apply_rollups(db, rows)
+        await db.commit()
+    return {"inserted": len(rows), "user_id": str(user_id)}
+
+async def _rollup_buckets(
+    db: AsyncSession,
+    user_id: uuid.UUID,
+    granularity: str,
+    start_date: Optional[date],
+    end_date: Optional[date],
+    field: Optional[str],
+) -> List[Dict[str, Any]]:
+    """Pre-aggregated day/week buckets: cost depends on the range, not the user's history size."""
+    stmt = select(ProgressRollup).where(
+        ProgressRollup.user_id == user_id, ProgressRollup.period == granularity
+    )
+    if start_date:
+        stmt = stmt.where(ProgressRollup.period_start >= period_start(granularity, start_date))
+    if end_date:
+        stmt = stmt.where(ProgressRollup.period_start <= end_date)
+    if field:
+        stmt = stmt.where(ProgressRollup.metric_key == field)
+    stmt = stmt.order_by(ProgressRollup.period_start, ProgressRollup.metric_key)
+    buckets: Dict[date, Dict[str, Any]] = {}
+    for r in (await db.execute(stmt)).scalars():
+        buckets.setdefault(r.period_start, {})[r.metric_key] = rollup_stats(r)
+    return [{"period_start": day.isoformat(), "metrics": metrics} for day, metrics in buckets.items()]
+
 @router.get("/")
 async def get_progress(
+    response: Response,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
-    current_user: Dict[str, Any] = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    granularity: Optional[str] = Query(
+        None, pattern=f"^({ROLLUP_DAY}|{ROLLUP_WEEK})$",
+        description="Return day/week aggregates per numeric metric key instead of raw rows",
+    ),
+    field: Optional[str] = Query(None, max_length=100, description="Only this metric key (with granularity)"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    user_id: uuid.UUID = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db)
 ):
     """
-    Get progress data within a date range.
+    Progress within an inclusive UTC date range. With `granularity=day|week` this
+    reads the rollup tables (count/mean/min/max/stddev per metric key); weekly
+    buckets cover whole ISO weeks overlapping the range. Without it, raw metrics
+    are returned newest first, a page at a time.
     """
-    # TODO: Implement database query with date filtering
+    if granularity:
+        if start_date and end_date and start_date > end_date:
+            raise HTTPException(status_code=400, detail="start_date must not be after end_date")
+        return {
+            "granularity": granularity,
+            "buckets": await _rollup_buckets(db, user_id, granularity, start_date, end_date, field),
+            "user_id": str(user_id),
+            "start_date": start_date,
+            "end_date": end_date,
+        }
+
+    start, end = _range_bounds(start_date, end_date)
+    stmt = _in_range(select(ProgressMetric).where(ProgressMetric.user_id == user_id), start, end)
+    rows, next_cursor = split_page((await db.execute(paginate(stmt, ProgressMetric, cursor, limit))).scalars().all(), limit)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return {
+        "progress": [
+            {"id": str(r.id), "metric": r.metric, "created_at": r.created_at} for r in rows
+        ],
+        "user_id": str(user_id),
+        "start_date": start_date,
+        "end_date": end_date,
+    }
+
+@router.get("/summary")
+async def get_progress_summary(
+    field: str = Query(..., min_length=1, max_length=100, description="Numeric metric key, e.g. carry_yards"),
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    window: int = Query(7, ge=1, le=90, description="Rolling average window in days with data"),
+    percentiles: List[float] = Query([0.5, 0.9]),
+    user_id: uuid.UUID = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Per-day count/mean/min/max/percentiles of one numeric metric field, a rolling
+    mean over the last `window` days, and percentiles over the whole range.
+    Computed in Postgres, so only one row per day leaves the database.
+    Rows where the field is missing or not a number are ignored.
+    """
+    if not percentiles or any(not 0 <= p <= 1 for p in percentiles):
+        raise HTTPException(status_code=400, detail="percentiles must be between 0 and 1")
+    start, end = _range_bounds(start_date, end_date)
+
+    value = ProgressMetric.metric[field].astext.cast(Float)
+    filtered = _in_range(
+        select(ProgressMetric.created_at, value.label("value")).where(
+            ProgressMetric.user_id == user_id,
+            func.jsonb_typeof(ProgressMetric.metric[field]) == "number",
+        ),
+        start,
+        end,
+    ).subquery()
+
+    pct = array(percentiles)
+    day = func.date_trunc("day", func.timezone("UTC", filtered.c.created_at)).label("day")
+    daily = (
+        select(
+            day,
+            func.count().label("count"),
+            func.avg(filtered.c.value).label("mean"),
+            func.min(filtered.c.value).label("min"),
+            func.max(filtered.c.value).label("max"),
+            func.percentile_cont(pct).within_group(filtered.c.value).label("percentiles"),
+        )
+        .group_by(day)
+        .subquery()
+    )
+    rolling = func.avg(daily.c.mean).over(order_by=daily.c.day, rows=(-(window - 1), 0))
+    stmt = select(daily, rolling.label("rolling_mean")).order_by(daily.c.day)
+    days = (await db.execute(stmt)).mappings().all()
+
+    overall = (await db.execute(
+        select(
+            func.count(),
+            func.avg(filtered.c.value),
+            func.percentile_cont(pct).within_group(filtered.c.value),
+        )
+    )).one()
+
+    def _pct_map(values) -> Dict[str, Optional[float]]:
+        return {f"p{round(p * 100, 2):g}": v for p, v in zip(percentiles, values or [None] * len(percentiles))}
+
     return {
-        "progress": [],
-        "user_id": current_user["user_id"],
+        "field": field,
+        "user_id": str(user_id),
         "start_date": start_date,
         "end_date": end_date,
-        "message": "No progress data found"
+        "window": window,
+        "overall": {"count": overall[0], "mean": overall[1], "percentiles": _pct_map(overall[2])},
+        "days": [
+            {
+                "date": d["day"].date().isoformat(),
+                "count": d["count"],
+                "mean": d["mean"],
+                "min": d["min"],
+                "max": d["max"],
+                "percentiles": _pct_map(d["percentiles"]),
+                "rolling_mean": d["rolling_mean"],
+            }
+            for d in days
+        ],
     }
@@ -1,29 +1,60 @@
-from typing import List
+from typing import Annotated, Dict, List, Optional, Tuple
+from contextlib import aclosing
 from datetime import datetime
-import os
+import asyncio
+import logging
+import time
+import uuid
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from sqlalchemy import select
-from sqlalchemy.orm import Session
+from sqlalchemy import func, insert, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload, undefer
+import anyio
 
-from app.db.session import get_db
-from app.db.models import SwingQuestion, SwingFeedback
+from app.core.auth import get_current_user_id
+from app.core.config import settings
+from app.core.idempotency import IDEMPOTENCY_HEADER, request_fingerprint, run_idempotent
+from app.core.http_cache import FastJSONResponse, SCOPE_QUESTIONS, bump_version, cached_json, response_cache
+from app.core.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, cursor_headers, paginate, split_page
+from app.core.llm import chat_stream, get_llm_client, llm_http_error
+from app.core.llm_routing import classify_question, log_route, routed_completion
+from app.core.semantic_cache import embed_question, semantic_cache
+from app.core.sse import SSE_HEADERS, sse_event
+from app.core.thread_context import MAX_FOLD_TURNS, Turn, build_messages, fold_summary
+from app.db.session import get_db, AsyncSessionLocal
+from app.db.write_behind import write_behind
+from app.db.models import (
+    SwingQuestion,
+    SwingFeedback,
+    QUESTION_PENDING,
+    QUESTION_ANSWERED,
+    QUESTION_PARTIAL,
+    QUESTION_FAILED,
+)
+from openai import AsyncOpenAI
 
-# NEW: OpenAI client
-from openai import OpenAI
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
 # ---------- Pydantic Schemas ----------
 
 class AskBody(BaseModel):
     question: str = Field(..., min_length=3, max_length=2000)
 
+class BatchAskBody(BaseModel):
+    questions: List[Annotated[str, Field(min_length=3, max_length=2000)]] = Field(
+        ..., min_length=1, max_length=settings.QUESTION_BATCH_MAX_ITEMS
+    )
+
 class QuestionOut(BaseModel):
     id: str
     question: str
+    status: str
+    thread_id: Optional[str] = None
     created_at: datetime
 
 class FeedbackOut(BaseModel):
@@ -39,61 +70,551 @@ SYSTEM_PROMPT = (
     "one drill, avoid generic boilerplate, and keep it under 120 words."
 )
 
-def _q_to_out(row: SwingQuestion) -> QuestionOut:
-    return QuestionOut(id=str(row.id), question=row.question, created_at=row.created_at)
+# Read endpoints build plain dicts (shaped like QuestionOut / FeedbackOut) and render
+# them once: no per-row model validation or jsonable_encoder pass.
+
+def _q_to_dict(row: SwingQuestion) -> dict:
+    return {
+        "id": str(row.id),
+        "question": row.question,
+        "status": row.status,
+        "thread_id": str(row.thread_id) if row.thread_id else None,
+        "created_at": row.created_at.isoformat(),
+    }
+
+def _f_to_dict(row: SwingFeedback) -> dict:
+    return {"id": str(row.id), "feedback": row.feedback, "created_at": row.created_at.isoformat()}
+
+def _thread_to_dict(row: SwingQuestion) -> dict:
+    out = _q_to_dict(row)
+    out["feedback"] = [_f_to_dict(f) for f in sorted(row.feedback, key=lambda f: f.created_at)]
+    return out
 
-def _f_to_out(row: SwingFeedback) -> FeedbackOut:
-    return FeedbackOut(id=str(row.id), feedback=row.feedback, created_at=row.created_at)
+def _feedback_messages(question_text: str) -> list:
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": question_text},
+    ]
 
-def generate_feedback(question_text: str) -> str:
-    """Call OpenAI and return concise coaching feedback."""
+async def generate_feedback(
+    client: AsyncOpenAI, question_text: str, messages: Optional[list] = None, history_turns: int = 0
+) -> str:
+    """
+    Call OpenAI (on the tier the question is routed to) and return concise coaching feedback.
+    Follow-ups pass their thread context as `messages`.
+    """
     try:
-        resp = client.chat.completions.create(
-            model="gpt-4o-mini",
+        resp = await routed_completion(
+            client,
+            classify_question(question_text, history_turns),
+            "followup" if messages else "feedback",
             temperature=0.7,
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": question_text},
-            ],
+            messages=messages or _feedback_messages(question_text),
         )
         return resp.choices[0].message.content.strip()
     except Exception as e:
         # Surface a real error so we don't quietly insert canned text
-        raise HTTPException(status_code=502, detail=f"LLM error: {e}")
+        raise llm_http_error(e)
+
+async def _cache_lookup(client: AsyncOpenAI, question_text: str, no_cache: bool, db: AsyncSession):
+    """Embed the question and look for a similar answered one. Returns (embedding, hit)."""
+    embedding = await embed_question(client, question_text) if settings.SEMANTIC_CACHE_ENABLED else None
+    hit = None
+    if embedding is not None:
+        if no_cache:
+            semantic_cache.stats.record_bypass()
+        else:
+            hit = await semantic_cache.lookup(db, embedding)
+    return embedding, hit
+
+def _new_question(user_id, question_text: str, embedding, question_status: str) -> SwingQuestion:
+    # id assigned up front so cached feedback can reference it without a flush
+    q = SwingQuestion(id=uuid.uuid4(), user_id=user_id, question=question_text, status=question_status)
+    if embedding is not None and semantic_cache.persists_embeddings:
+        q.embedding = embedding
+    return q
+
+QUESTION_RESULTS = "question_results"
+
+async def _write_question_results(db: AsyncSession, rows: List[dict]) -> None:
+    """Write-behind writer: feedback rows, final statuses and version bumps for a batch of answers."""
+    feedback = [
+        {"question_id": r["question_id"], "user_id": r["user_id"], "feedback": r["feedback"]}
+        for r in rows if r["feedback"]
+    ]
+    if feedback:
+        await db.execute(insert(SwingFeedback), feedback)
+    by_status: Dict[str, List[uuid.UUID]] = {}
+    for r in rows:
+        by_status.setdefault(r["status"], []).append(r["question_id"])
+    for question_status, ids in by_status.items():
+        await db.execute(update(SwingQuestion).where(SwingQuestion.id.in_(ids)).values(status=question_status))
+    # same lock order in every flush, so concurrent flushes cannot deadlock on user_data_versions
+    for user_id in sorted({r["user_id"] for r in rows if r["user_id"]}, key=str):
+        await bump_version(db, user_id, SCOPE_QUESTIONS)
+
+write_behind.register(QUESTION_RESULTS, _write_question_results)
+
+async def _finish_question(question_id, user_id, feedback_text: Optional[str], status: str) -> None:
+    """
+    Second write phase: store the feedback (if any) and the final question status
+    in a new short transaction, after the LLM call has returned. With
+    WRITE_BEHIND_ENABLED that transaction is shared with other answers.
+    """
+    await write_behind.add(
+        QUESTION_RESULTS,
+        {"question_id": question_id, "user_id": user_id, "feedback": feedback_text, "status": status},
+    )
+
+async def _stream_feedback(client: AsyncOpenAI, question_id, user_id, question_text: str, embedding):
+    """
+    Forward completion tokens as SSE events, then persist the feedback.
+    If the client disconnects mid-stream, whatever was generated so far is still
+    saved and the question is marked partial.
+    """
+    parts: List[str] = []
+    complete = False
+    route = classify_question(question_text)
+    start = time.perf_counter()
+    try:
+        yield sse_event("question", {"id": str(question_id)})
+        deltas = chat_stream(client, temperature=0.7, messages=_feedback_messages(question_text), **route.params())
+        async with aclosing(deltas):
+            async for delta in deltas:
+                parts.append(delta)
+                yield sse_event("token", {"text": delta})
+        complete = True
+        yield sse_event("done", {"id": str(question_id), "cached": False})
+    except Exception as e:
+        yield sse_event("error", {"detail": llm_http_error(e).detail})
+    finally:
+        log_route("feedback_stream", route, time.perf_counter() - start)
+        feedback_text = "".join(parts).strip()
+        if complete:
+            final_status = QUESTION_ANSWERED
+        else:
+            final_status = QUESTION_PARTIAL if feedback_text else QUESTION_FAILED
+        # shielded: on client disconnect this runs inside a cancelled scope
+        with anyio.CancelScope(shield=True):
+            await _finish_question(question_id, user_id, feedback_text, final_status)
+        if complete and embedding is not None:
+            semantic_cache.remember(question_id, embedding, feedback_text)
+
+# ---------- Threads (follow-ups) ----------
+
+# one summary refresh per thread at a time, per process
+_summarizing: Dict[uuid.UUID, asyncio.Task] = {}
+
+def _answer(row: SwingQuestion) -> Optional[str]:
+    latest = max(row.feedback, key=lambda f: f.created_at, default=None)
+    return latest.feedback if latest else None
+
+def _thread_turns(root_id: uuid.UUID):
+    """Answered turns of a thread (its first question and the follow-ups), with their feedback."""
+    return (
+        select(SwingQuestion)
+        .where(
+            or_(SwingQuestion.id == root_id, SwingQuestion.thread_id == root_id),
+            SwingQuestion.status.in_([QUESTION_ANSWERED, QUESTION_PARTIAL]),
+        )
+        .options(selectinload(SwingQuestion.feedback))
+    )
+
+async def _load_thread(db: AsyncSession, thread_id: uuid.UUID, user_id: uuid.UUID) -> Tuple[SwingQuestion, List[Turn], int]:
+    """(first question, last THREAD_CONTEXT_TURNS turns oldest first, number of answered turns)."""
+    q = await db.get(SwingQuestion, thread_id)
+    if q is None or q.user_id != user_id:
+        raise HTTPException(status_code=404, detail="Thread not found")
+    root_id = q.thread_id or q.id
+    root = (await db.execute(
+        select(SwingQuestion).where(SwingQuestion.id == root_id).options(undefer(SwingQuestion.thread_summary))
+    )).scalars().one()
+
+    total = func.count().over().label("total")
+    rows = (await db.execute(
+        _thread_turns(root_id).add_columns(total)
+        .order_by(SwingQuestion.created_at.desc(), SwingQuestion.id.desc())
+        .limit(max(settings.THREAD_CONTEXT_TURNS, 1))
+    )).all()
+    turns = [Turn(r[0].question, _answer(r[0])) for r in reversed(rows) if _answer(r[0])]
+    return root, turns, rows[0].total if rows else 0
+
+async def _refresh_summary(client: AsyncOpenAI, root_id: uuid.UUID) -> None:
+    """
+    Fold the turns that have left the verbatim window (and are not in the summary yet)
+    into the thread's rolling summary, a few at a time. Runs after the answer is sent.
+    """
+    while True:
+        async with AsyncSessionLocal() as db:
+            root = (await db.execute(
+                select(SwingQuestion.thread_summary, SwingQuestion.thread_summary_until).where(SwingQuestion.id == root_id)
+            )).first()
+            if root is None:
+                return
+            stmt = _thread_turns(root_id)
+            if root.thread_summary_until is not None:
+                stmt = stmt.where(SwingQuestion.created_at > root.thread_summary_until)
+            rows = (await db.execute(
+                stmt.order_by(SwingQuestion.created_at.desc(), SwingQuestion.id.desc())
+                .offset(settings.THREAD_CONTEXT_TURNS)
+            )).scalars().all()
+        rows = [r for r in reversed(rows) if _answer(r)][:MAX_FOLD_TURNS]
+        if not rows:
+            return
+
+        summary = await fold_summary(client, root.thread_summary, [Turn(r.question, _answer(r)) for r in rows])
+        async with AsyncSessionLocal() as db:
+            # only if no other process folded these turns in the meantime
+            result = await db.execute(
+                update(SwingQuestion)
+                .where(
+                    SwingQuestion.id == root_id,
+                    SwingQuestion.thread_summary_until.is_not_distinct_from(root.thread_summary_until),
+                )
+                .values(thread_summary=summary, thread_summary_until=rows[-1].created_at)
+            )
+            await db.commit()
+        if result.rowcount != 1:
+            return
+
+def _schedule_summary(client: AsyncOpenAI, root_id: uuid.UUID) -> None:
+    if root_id in _summarizing:
+        return
+
+    async def run():
+        try:
+            await _refresh_summary(client, root_id)
+        except Exception as e:
+            logger.warning("Thread summary refresh failed for %s: %s", root_id, e)
+
+    task = asyncio.create_task(run())
+    _summarizing[root_id] = task
+    task.add_done_callback(lambda t: _summarizing.pop(root_id, None))
+
+async def _stream_cached(question_id, feedback_text: str):
+    yield sse_event("question", {"id": str(question_id)})
+    yield sse_event("token", {"text": feedback_text})
+    yield sse_event("done", {"id": str(question_id), "cached": True})
 
 # ---------- Routes (match OpenAPI docs) ----------
 
-@router.get("/questions/", response_model=List[QuestionOut])
-def list_questions(db: Session = Depends(get_db)):
-    """Latest 50 questions (scoped to user later if/when auth is added)."""
-    stmt = select(SwingQuestion).order_by(SwingQuestion.created_at.desc()).limit(50)
-    rows = db.execute(stmt).scalars().all()
-    return [_q_to_out(r) for r in rows]
+@router.get("/questions/", response_model=List[QuestionOut], response_class=FastJSONResponse)
+async def list_questions(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    user_id: uuid.UUID = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    The current user's questions, newest first. Pass X-Next-Cursor back as `cursor` for older ones.
+    Supports If-None-Match / If-Modified-Since (304 when nothing changed).
+    """
+    async def build():
+        stmt = paginate(select(SwingQuestion).where(SwingQuestion.user_id == user_id), SwingQuestion, cursor, limit)
+        rows, next_cursor = split_page((await db.execute(stmt)).scalars().all(), limit)
+        return [_q_to_dict(r) for r in rows], cursor_headers(next_cursor)
+
+    return await cached_json(request, db, user_id, SCOPE_QUESTIONS, "questions", build)
+
+@router.get("/threads/", response_class=FastJSONResponse)
+async def list_threads(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    user_id: uuid.UUID = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    The current user's questions with their feedback nested, newest first.
+    One page of questions plus one IN query for their feedback (selectinload),
+    so a page always contains every answer to the questions on it.
+    """
+    async def build():
+        stmt = paginate(
+            select(SwingQuestion)
+            .where(SwingQuestion.user_id == user_id)
+            .options(selectinload(SwingQuestion.feedback)),
+            SwingQuestion,
+            cursor,
+            limit,
+        )
+        rows, next_cursor = split_page((await db.execute(stmt)).scalars().all(), limit)
+        return [_thread_to_dict(r) for r in rows], cursor_headers(next_cursor)
+
+    return await cached_json(request, db, user_id, SCOPE_QUESTIONS, "threads", build)
+
+@router.get("/threads/{thread_id}", response_class=FastJSONResponse)
+async def get_thread(
+    request: Request,
+    thread_id: uuid.UUID,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    user_id: uuid.UUID = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db),
+):
+    """A thread's turns (first question and follow-ups, with feedback nested), newest first."""
+    async def build():
+        q = await db.get(SwingQuestion, thread_id)
+        if q is None or q.user_id != user_id:
+            raise HTTPException(status_code=404, detail="Thread not found")
+        root_id = q.thread_id or q.id
+        stmt = paginate(
+            select(SwingQuestion)
+            .where(or_(SwingQuestion.id == root_id, SwingQuestion.thread_id == root_id))
+            .options(selectinload(SwingQuestion.feedback)),
+            SwingQuestion,
+            cursor,
+            limit,
+        )
+        rows, next_cursor = split_page((await db.execute(stmt)).scalars().all(), limit)
+        return {"thread_id": str(root_id), "turns": [_thread_to_dict(r) for r in rows]}, cursor_headers(next_cursor)
+
+    return await cached_json(request, db, user_id, SCOPE_QUESTIONS, f"thread:{thread_id}", build)
+
+@router.post("/threads/{thread_id}/follow-ups", status_code=status.HTTP_201_CREATED)
+async def create_follow_up(
+    thread_id: uuid.UUID,
+    body: AskBody,
+    idempotency_key: Optional[str] = Header(
+        None, alias=IDEMPOTENCY_HEADER, description="Retries with the same key return the first response"
+    ),
+    user_id: uuid.UUID = Depends(get_current_user_id),
+    client: AsyncOpenAI = Depends(get_llm_client),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Ask a follow-up in the thread of `thread_id` (any question of the thread).
+    The model sees the thread's rolling summary, the last THREAD_CONTEXT_TURNS
+    turns and the new question, within THREAD_CONTEXT_TOKEN_BUDGET tokens, so
+    the prompt does not grow with the thread. The semantic cache is skipped:
+    the answer depends on the conversation.
+    """
+    return await run_idempotent(
+        user_id,
+        idempotency_key,
+        request_fingerprint(f"POST /questions/threads/{thread_id}/follow-ups", body),
+        lambda: _ask_follow_up(thread_id, body, user_id, client, db),
+    )
+
+async def _ask_follow_up(
+    thread_id: uuid.UUID, body: AskBody, user_id: uuid.UUID, client: AsyncOpenAI, db: AsyncSession
+) -> dict:
+    root, turns, answered_turns = await _load_thread(db, thread_id, user_id)
+    messages = build_messages(SYSTEM_PROMPT, body.question, root.thread_summary, turns)
+
+    q = SwingQuestion(id=uuid.uuid4(), user_id=user_id, question=body.question,
+                      status=QUESTION_PENDING, thread_id=root.id)
+    db.add(q)
+    await bump_version(db, user_id, SCOPE_QUESTIONS)
+    await db.commit()
+
+    try:
+        feedback_text = await generate_feedback(client, body.question, messages, history_turns=answered_turns)
+    except HTTPException:
+        await _finish_question(q.id, user_id, None, QUESTION_FAILED)
+        raise
+    await _finish_question(q.id, user_id, feedback_text, QUESTION_ANSWERED)
+
+    if answered_turns + 1 > settings.THREAD_CONTEXT_TURNS:
+        _schedule_summary(client, root.id)
+    return {"id": str(q.id), "thread_id": str(root.id), "status": QUESTION_ANSWERED, "cached": False}
 
 @router.post("/questions/", status_code=status.HTTP_201_CREATED)
-def create_question(body: AskBody, db: Session = Depends(get_db)):
+async def create_question(
+    body: AskBody,
+    no_cache: bool = Query(False, description="Skip the semantic answer cache"),
+    idempotency_key: Optional[str] = Header(
+        None, alias=IDEMPOTENCY_HEADER, description="Retries with the same key return the first response"
+    ),
+    user_id: uuid.UUID = Depends(get_current_user_id),
+    client: AsyncOpenAI = Depends(get_llm_client),
+    db: AsyncSession = Depends(get_db),
+):
     """
     Insert question -> call OpenAI -> insert feedback (linked to question).
+    Similar earlier questions are answered from the semantic cache instead of the LLM.
+    No DB connection is held during the LLM call: the question is committed as
+    `pending` first and the feedback is written in a second short transaction.
     Returns the new question id (the UI refreshes lists separately).
+    With an Idempotency-Key, a retry waits for or replays the first response.
     """
-    # 1) save the question
-    q = SwingQuestion(question=body.question)
+    return await run_idempotent(
+        user_id,
+        idempotency_key,
+        request_fingerprint("POST /questions/questions/", body, no_cache=no_cache),
+        lambda: _ask_question(body, no_cache, user_id, client, db),
+    )
+
+async def _ask_question(body: AskBody, no_cache: bool, user_id: uuid.UUID, client: AsyncOpenAI, db: AsyncSession) -> dict:
+    # 0) embed + look for a similar answered question
+    embedding, hit = await _cache_lookup(client, body.question, no_cache, db)
+
+    # 1) record the question (already answered on a cache hit) and release the connection
+    q = _new_question(user_id, body.question, embedding, QUESTION_ANSWERED if hit else QUESTION_PENDING)
     db.add(q)
-    db.flush()  # get q.id before commit
+    if hit:
+        db.add(SwingFeedback(question_id=q.id, user_id=user_id, feedback=hit.feedback))
+    await bump_version(db, user_id, SCOPE_QUESTIONS)
+    await db.commit()
+    if hit:
+        return {"id": str(q.id), "status": q.status, "cached": True}
 
-    # 2) generate real feedback
-    feedback_text = generate_feedback(body.question)
+    # 2) generate real feedback, no connection checked out
+    try:
+        feedback_text = await generate_feedback(client, body.question)
+    except HTTPException:
+        await _finish_question(q.id, user_id, None, QUESTION_FAILED)
+        raise
 
     # 3) save feedback linked to question
-    fb = SwingFeedback(question_id=q.id, feedback=feedback_text)
-    db.add(fb)
-    db.commit()
-
-    return {"id": str(q.id)}
-
-@router.get("/feedback/", response_model=List[FeedbackOut])
-def list_feedback(db: Session = Depends(get_db)):
-    """Latest 50 feedback entries."""
-    stmt = select(SwingFeedback).order_by(SwingFeedback.created_at.desc()).limit(50)
-    rows = db.execute(stmt).scalars().all()
-    return [_f_to_out(r) for r in rows]
+    await _finish_question(q.id, user_id, feedback_text, QUESTION_ANSWERED)
+
+    if embedding is not None:
+        semantic_cache.remember(q.id, embedding, feedback_text)
+
+    return {"id": str(q.id), "status": QUESTION_ANSWERED, "cached": False}
+
+@router.post("/questions/batch", status_code=status.HTTP_201_CREATED)
+async def create_question_batch(
+    body: BatchAskBody,
+    no_cache: bool = Query(False, description="Skip the semantic answer cache"),
+    idempotency_key: Optional[str] = Header(
+        None, alias=IDEMPOTENCY_HEADER, description="Retries with the same key return the first response"
+    ),
+    user_id: uuid.UUID = Depends(get_current_user_id),
+    client: AsyncOpenAI = Depends(get_llm_client),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Ask several questions at once. Feedback is generated concurrently (at most
+    QUESTION_BATCH_CONCURRENCY calls in flight per batch), so the batch takes about
+    as long as its slowest question. All questions and feedback are then written
+    with bulk inserts in one transaction. Each item reports its own outcome: a
+    failed LLM call marks that question `failed` without failing the batch.
+    """
+    return await run_idempotent(
+        user_id,
+        idempotency_key,
+        request_fingerprint("POST /questions/questions/batch", body, no_cache=no_cache),
+        lambda: _ask_batch(body, no_cache, user_id, client, db),
+    )
+
+async def _ask_batch(body: BatchAskBody, no_cache: bool, user_id: uuid.UUID, client: AsyncOpenAI, db: AsyncSession) -> dict:
+    texts = body.questions
+    slots = asyncio.Semaphore(settings.QUESTION_BATCH_CONCURRENCY)
+
+    async def bounded(coro):
+        async with slots:
+            return await coro
+
+    # 0) embed concurrently, then look up cache hits on this request's session
+    if settings.SEMANTIC_CACHE_ENABLED:
+        embeddings = await asyncio.gather(*(bounded(embed_question(client, t)) for t in texts))
+    else:
+        embeddings = [None] * len(texts)
+    hits = []
+    for embedding in embeddings:
+        hit = None
+        if embedding is not None:
+            if no_cache:
+                semantic_cache.stats.record_bypass()
+            else:
+                hit = await semantic_cache.lookup(db, embedding)
+        hits.append(hit)
+    await db.commit()  # return the connection to the pool while the LLM calls run
+
+    # 1) generate feedback for the misses, concurrently
+    misses = [i for i, hit in enumerate(hits) if hit is None]
+    generated = await asyncio.gather(
+        *(bounded(generate_feedback(client, texts[i])) for i in misses), return_exceptions=True
+    )
+    outcomes = {i: (hit.feedback, None) for i, hit in enumerate(hits) if hit is not None}
+    for i, result in zip(misses, generated):
+        if isinstance(result, BaseException):
+            error = result.detail if isinstance(result, HTTPException) else f"LLM error: {result}"
+            outcomes[i] = (None, error)
+        else:
+            outcomes[i] = (result, None)
+
+    # 2) persist everything in one transaction
+    question_rows, feedback_rows, results = [], [], []
+    for i, text in enumerate(texts):
+        feedback_text, error = outcomes[i]
+        row = {"id": uuid.uuid4(), "user_id": user_id, "question": text,
+               "status": QUESTION_FAILED if error else QUESTION_ANSWERED}
+        if semantic_cache.persists_embeddings:
+            row["embedding"] = embeddings[i]
+        question_rows.append(row)
+        if feedback_text:
+            feedback_rows.append({"id": uuid.uuid4(), "question_id": row["id"], "user_id": user_id, "feedback": feedback_text})
+        results.append({
+            "index": i,
+            "id": str(row["id"]),
+            "status": row["status"],
+            "cached": hits[i] is not None,
+            "feedback": feedback_text,
+            "error": error,
+        })
+    await db.execute(insert(SwingQuestion), question_rows)
+    if feedback_rows:
+        await db.execute(insert(SwingFeedback), feedback_rows)
+    await bump_version(db, user_id, SCOPE_QUESTIONS)
+    await db.commit()
+
+    for i in misses:
+        feedback_text, error = outcomes[i]
+        if not error and embeddings[i] is not None:
+            semantic_cache.remember(question_rows[i]["id"], embeddings[i], feedback_text)
+
+    failed = sum(1 for r in results if r["error"])
+    return {"succeeded": len(results) - failed, "failed": failed, "results": results}
+
+@router.post("/questions/stream")
+async def create_question_stream(
+    body: AskBody,
+    no_cache: bool = Query(False, description="Skip the semantic answer cache"),
+    user_id: uuid.UUID = Depends(get_current_user_id),
+    client: AsyncOpenAI = Depends(get_llm_client),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Streaming variant of POST /questions/: saves the question, then sends the
+    feedback as Server-Sent Events (`question`, `token`..., `done` | `error`).
+    The feedback row is written when the stream ends.
+    """
+    embedding, hit = await _cache_lookup(client, body.question, no_cache, db)
+
+    q = _new_question(user_id, body.question, embedding, QUESTION_ANSWERED if hit else QUESTION_PENDING)
+    db.add(q)
+    if hit:
+        db.add(SwingFeedback(question_id=q.id, user_id=user_id, feedback=hit.feedback))
+    await bump_version(db, user_id, SCOPE_QUESTIONS)
+    await db.commit()
+
+    if hit:
+        events = _stream_cached(q.id, hit.feedback)
+    else:
+        events = _stream_feedback(client, q.id, user_id, body.question, embedding)
+    return StreamingResponse(events, media_type="text/event-stream", headers=SSE_HEADERS)
+
+@router.get("/cache/stats")
+async def cache_stats():
+    """Semantic cache hit rate and current threshold/TTL settings, plus response cache counters."""
+    return {**semantic_cache.info(), "response_cache": response_cache.info()}
+
+@router.get("/feedback/", response_model=List[FeedbackOut], response_class=FastJSONResponse)
+async def list_feedback(
+    request: Request,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    user_id: uuid.UUID = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db),
+):
+    """The current user's feedback entries, newest first (same cursor and caching as /questions/)."""
+    async def build():
+        stmt = paginate(select(SwingFeedback).where(SwingFeedback.user_id == user_id), SwingFeedback, cursor, limit)
+        rows, next_cursor = split_page((await db.execute(stmt)).scalars().all(), limit)
+        return [_f_to_dict(r) for r in rows], cursor_headers(next_cursor)
+
+    return await cached_json(request, db, user_id, SCOPE_QUESTIONS, "feedback", build)
@@ -1,29 +1,55 @@
-from fastapi import APIRouter, Depends, Query, HTTPException
-from sqlalchemy.orm import Session
-from app.db.session import get_db
+from fastapi import APIRouter, Depends, Header, Query, HTTPException, Request
+from pydantic import BaseModel, Field, HttpUrl, TypeAdapter, ValidationError
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.session import get_db, AsyncSessionLocal
+from app.db.models import RESOURCE_SOURCE_IMPORTED, RESOURCE_SOURCE_LLM, Resource
 from app.core.auth import get_current_user
+from app.core.config import settings
+from app.core.llm import get_llm_client, llm_http_error
+from app.core.llm_routing import resources_route, routed_completion
+from app.core.singleflight import SingleFlight
 from typing import Dict, Any, Optional, List
-from openai import OpenAI
-import os, json
+from datetime import datetime, timedelta, timezone
+from openai import AsyncOpenAI
+import asyncio, hmac, logging, json, re, uuid
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-@router.get("/")
-async def get_resources(
-    issue: Optional[str] = Query(None, description="Filter resources by issue tag"),
-    current_user: Dict[str, Any] = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    """
-    Get resources related to a specific swing issue.
-    Uses OpenAI to suggest resources with title, description, and url.
-    """
-    if not issue:
-        raise HTTPException(status_code=400, detail="Please provide an issue to search for.")
+# ---------- Schemas ----------
 
-    try:
-        prompt = f"""
+class ResourceItem(BaseModel):
+    title: str = Field(..., min_length=3, max_length=300)
+    description: str = Field("", max_length=1000)
+    url: HttpUrl
+
+class ImportItem(ResourceItem):
+    issue: str = Field(..., min_length=2, max_length=200)
+
+_import_adapter = TypeAdapter(List[ImportItem])
+
+# ---------- Catalog helpers ----------
+
+_FILLER_WORDS = {
+    "a", "an", "the", "my", "i", "im", "how", "to", "do", "fix", "fixing", "stop",
+    "stopping", "with", "on", "of", "for", "help", "keep", "keeps", "is",
+}
+_NON_WORD_RE = re.compile(r"[^a-z0-9]+")
+
+# concurrent misses / refreshes for the same issue share one LLM call and one write
+_fetches = SingleFlight()
+_refreshing: Dict[str, asyncio.Task] = {}
+
+def normalize_issue(issue: str) -> str:
+    """'How do I fix my SLICE?' -> 'slice'"""
+    words = [w for w in _NON_WORD_RE.sub(" ", issue.lower()).split() if w not in _FILLER_WORDS]
+    return " ".join(words) or issue.strip().lower()
+
+def _resource_prompt(issue: str) -> str:
+    return f"""
         You are SwingSense, a golf coach.
         Provide exactly 3 useful online resources (articles, videos, drills) 
         that help a golfer fix the issue: "{issue}".
@@ -45,24 +71,221 @@ async def get_resources(
         ]
         """
 
-        resp = client.chat.completions.create(
-            model="gpt-4o-mini",
-            temperature=0.2,  # lower temp for structured output
-            messages=[
-                {"role": "system", "content": "You are a helpful golf coach that ONLY responds in raw JSON."},
-                {"role": "user", "content": prompt}
-            ],
-        )
+async def _fetch_from_llm(client: AsyncOpenAI, issue: str) -> List[ResourceItem]:
+    """Ask the model for resources and keep only entries that validate."""
+    resp = await routed_completion(
+        client,
+        resources_route(),
+        "resources",
+        temperature=0.2,  # lower temp for structured output
+        messages=[
+            {"role": "system", "content": "You are a helpful golf coach that ONLY responds in raw JSON."},
+            {"role": "user", "content": _resource_prompt(issue)}
+        ],
+    )
+    content = resp.choices[0].message.content.strip()
 
-        content = resp.choices[0].message.content.strip()
+    # Try parsing JSON strictly
+    try:
+        raw = json.loads(content)
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=502, detail=f"Invalid JSON returned by AI: {content[:200]}...")
 
-        # Try parsing JSON strictly
+    items = []
+    for entry in raw if isinstance(raw, list) else []:
         try:
-            resources: List[Dict[str, Any]] = json.loads(content)
-        except json.JSONDecodeError:
-            raise HTTPException(status_code=502, detail=f"Invalid JSON returned by AI: {content[:200]}...")
+            items.append(ResourceItem.model_validate(entry))
+        except ValidationError:
+            continue
+    if not items:
+        raise HTTPException(status_code=502, detail="AI returned no valid resources")
+    return items
+
+async def _store(db: AsyncSession, issue: str, issue_key: str, items: List[ResourceItem], source: str) -> None:
+    """
+    Upsert catalog entries for issue_key (caller commits).
+    RESOURCE_SOURCE_LLM replaces the LLM's previous entries: those not in
+    `items` are dropped and the rest renumbered after the curated ones.
+    RESOURCE_SOURCE_IMPORTED adds curated entries after the existing ones,
+    which keep their positions. Curated entries are never changed or dropped
+    by an LLM refresh.
+    """
+    now = datetime.now(timezone.utc)
+    replace = source == RESOURCE_SOURCE_LLM
+    # one row per url, otherwise ON CONFLICT would touch the same row twice
+    items = list({str(item.url): item for item in items}.values())
+    last_stmt = select(func.max(Resource.position)).where(Resource.issue_key == issue_key)
+    if replace:
+        last_stmt = last_stmt.where(Resource.source == RESOURCE_SOURCE_IMPORTED)
+    last = (await db.execute(last_stmt)).scalar()
+    first = last + 1 if last is not None else 0
+    rows = [
+        {
+            "id": uuid.uuid4(),
+            "issue": issue,
+            "issue_key": issue_key,
+            "url": str(item.url),
+            "title": item.title,
+            "description": item.description,
+            "position": first + n,
+            "source": source,
+            "refreshed_at": now,
+        }
+        for n, item in enumerate(items)
+    ]
+    stmt = insert(Resource).values(rows)
+    updates = {
+        "title": stmt.excluded.title,
+        "description": stmt.excluded.description,
+        "source": stmt.excluded.source,
+        "refreshed_at": stmt.excluded.refreshed_at,
+    }
+    if replace:
+        updates["position"] = stmt.excluded.position
+        # a url the admins curated stays as they wrote it
+        stmt = stmt.on_conflict_do_update(
+            constraint="uq_resources_issue_key_url", set_=updates, where=Resource.source == RESOURCE_SOURCE_LLM
+        )
+    else:
+        stmt = stmt.on_conflict_do_update(constraint="uq_resources_issue_key_url", set_=updates)
+    await db.execute(stmt)
+    if replace:
+        await db.execute(
+            delete(Resource).where(
+                Resource.issue_key == issue_key,
+                Resource.source == RESOURCE_SOURCE_LLM,
+                Resource.url.not_in([r["url"] for r in rows]),
+            )
+        )
+
+async def _generate_and_store(client: AsyncOpenAI, issue: str, issue_key: str) -> List[ResourceItem]:
+    items = await _fetch_from_llm(client, issue)
+    async with AsyncSessionLocal() as db:
+        await _store(db, issue, issue_key, items, RESOURCE_SOURCE_LLM)
+        await db.commit()
+    return items
+
+async def _lookup(db: AsyncSession, issue_key: str) -> List[Resource]:
+    """Resources of the closest catalog issue (trigram similarity), if close enough."""
+    similarity = func.similarity(Resource.issue_key, issue_key)
+    best_key = (
+        select(Resource.issue_key)
+        .where(Resource.issue_key.op("%")(issue_key), similarity >= settings.RESOURCE_MATCH_THRESHOLD)
+        .order_by(similarity.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    stmt = select(Resource).where(Resource.issue_key == best_key).order_by(Resource.position)
+    return (await db.execute(stmt)).scalars().all()
+
+async def _refresh(client: AsyncOpenAI, issue: str, issue_key: str) -> None:
+    try:
+        await _fetches.do(
+            issue_key,
+            lambda: _generate_and_store(client, issue, issue_key),
+            timeout=settings.LLM_SINGLEFLIGHT_TIMEOUT_SECONDS,
+        )
+    except Exception as e:
+        logger.warning("Background refresh of resources for %r failed: %s", issue_key, e)
+
+def _schedule_refresh(client: AsyncOpenAI, issue: str, issue_key: str) -> None:
+    """Regenerate a stale catalog entry without making the caller wait."""
+    if issue_key in _refreshing:
+        return
+    task = asyncio.create_task(_refresh(client, issue, issue_key))
+    _refreshing[issue_key] = task
+    task.add_done_callback(lambda t: _refreshing.pop(issue_key, None))
+
+def _to_out(items) -> List[Dict[str, Any]]:
+    return [
+        {"id": n + 1, "title": item.title, "description": item.description, "url": str(item.url)}
+        for n, item in enumerate(items)
+    ]
+
+async def _read_import(request: Request) -> List[ImportItem]:
+    """Read and validate an import body, refusing oversized ones before buffering them."""
+    too_large = HTTPException(
+        status_code=413, detail=f"Import body too large (max {settings.RESOURCE_IMPORT_MAX_BYTES} bytes)"
+    )
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > settings.RESOURCE_IMPORT_MAX_BYTES:
+        raise too_large
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > settings.RESOURCE_IMPORT_MAX_BYTES:
+            raise too_large
+    try:
+        items = _import_adapter.validate_json(bytes(body))
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False))
+    if len(items) > settings.RESOURCE_IMPORT_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Import too large: {len(items)} entries (max {settings.RESOURCE_IMPORT_MAX_ITEMS})",
+        )
+    return items
 
-        return {"resources": resources, "filter": issue, "user_id": current_user["user_id"]}
+# ---------- Routes ----------
 
+@router.get("/")
+async def get_resources(
+    issue: Optional[str] = Query(None, description="Filter resources by issue tag"),
+    current_user: Dict[str, Any] = Depends(get_current_user),
+    client: AsyncOpenAI = Depends(get_llm_client),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Get resources related to a specific swing issue.
+    Served from the resource catalog; on a miss, OpenAI suggests resources
+    (title, description, url) which are validated and stored for next time.
+    """
+    if not issue:
+        raise HTTPException(status_code=400, detail="Please provide an issue to search for.")
+
+    issue_key = normalize_issue(issue)
+    rows = await _lookup(db, issue_key)
+    await db.close()  # don't hold a connection across the LLM call below
+
+    if rows:
+        stale_before = datetime.now(timezone.utc) - timedelta(seconds=settings.RESOURCE_TTL_SECONDS)
+        curated = any(r.source == RESOURCE_SOURCE_IMPORTED for r in rows)
+        if not curated and min(r.refreshed_at for r in rows) < stale_before:
+            _schedule_refresh(client, rows[0].issue, rows[0].issue_key)
+        return {"resources": _to_out(rows), "filter": issue, "user_id": current_user["user_id"], "source": "catalog"}
+
+    try:
+        items = await _fetches.do(
+            issue_key,
+            lambda: _generate_and_store(client, issue, issue_key),
+            timeout=settings.LLM_SINGLEFLIGHT_TIMEOUT_SECONDS,
+        )
     except Exception as e:
-        raise HTTPException(status_code=502, detail=f"AI error: {e}")
\ No newline at end of file
+        raise llm_http_error(e)
+
+    return {"resources": _to_out(items), "filter": issue, "user_id": current_user["user_id"], "source": "ai"}
+
+@router.post("/import")
+async def import_resources(
+    request: Request,
+    x_admin_token: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Bulk-load curated resources into the catalog (admin only, X-Admin-Token header).
+    The body is a JSON array of {issue, title, description, url}, at most
+    RESOURCE_IMPORT_MAX_BYTES and RESOURCE_IMPORT_MAX_ITEMS entries.
+    Entries are grouped by normalized issue and upserted on (issue, url).
+    Issues with imported entries are no longer refreshed by the LLM.
+    """
+    if not settings.ADMIN_API_TOKEN or not hmac.compare_digest(x_admin_token or "", settings.ADMIN_API_TOKEN):
+        raise HTTPException(status_code=403, detail="Admin token required")
+    items = await _read_import(request)
+
+    groups: Dict[str, List[ImportItem]] = {}
+    for item in items:
+        groups.setdefault(normalize_issue(item.issue), []).append(item)
+    for issue_key, group in groups.items():
+        await _store(db, group[0].issue, issue_key, group, RESOURCE_SOURCE_IMPORTED)
+    await db.commit()
+    return {"imported": len(items), "issues": len(groups)}
@@ -0,0 +1,357 @@
+"""
+Durable background queue for training plan generation.
+
+Jobs live in the plan_jobs table. Workers in any number of processes or hosts
+claim them with SELECT ... FOR UPDATE SKIP LOCKED, so each job runs on one
+worker at a time and queued jobs survive restarts. Enqueueing sends
+NOTIFY plan_jobs so idle workers wake immediately; they also poll every
+PLAN_JOB_POLL_SECONDS in case a notification is missed.
+
+A running job holds a lease (locked_at). If its worker dies, the job becomes
+claimable again once the lease is older than twice PLAN_JOB_TIMEOUT_SECONDS.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import psycopg
+from sqlalchemy import and_, or_, select, text, update
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.http_cache import SCOPE_PLANS, bump_version
+from app.db.models import (
+    PlanJob,
+    TrainingPlan,
+    JOB_QUEUED,
+    JOB_RUNNING,
+    JOB_SUCCEEDED,
+    JOB_FAILED,
+)
+from app.db.session import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = "plan_jobs"
+TERMINAL_STATES = (JOB_SUCCEEDED, JOB_FAILED)
+
+# Runs the LLM call for a job payload and returns an unsaved TrainingPlan
+JobHandler = Callable[[Dict[str, Any]], Awaitable[TrainingPlan]]
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _ms(start: Optional[datetime], end: Optional[datetime]) -> Optional[float]:
+    if start is None or end is None:
+        return None
+    return (end - start).total_seconds() * 1000
+
+
+class JobStats:
+    """Per-process job counters and timing totals."""
+
+    def __init__(self) -> None:
+        self.enqueued = 0
+        self.started = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.retried = 0
+        self.queue_wait_ms_total = 0.0
+        self.run_ms_total = 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "enqueued": self.enqueued,
+            "started": self.started,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "retried": self.retried,
+            "avg_queue_wait_ms": self.queue_wait_ms_total / self.started if self.started else None,
+            "avg_run_ms": self.run_ms_total / self.succeeded if self.succeeded else None,
+        }
+
+
+job_stats = JobStats()
+
+
+# ---------- Waiting on jobs (long-poll) ----------
+
+class _Waiters:
+    """Per-job events so long-polls in this process return as soon as a local worker finishes."""
+
+    def __init__(self) -> None:
+        self._events: Dict[uuid.UUID, List[Any]] = {}  # job_id -> [event, refcount]
+
+    def acquire(self, job_id: uuid.UUID) -> asyncio.Event:
+        entry = self._events.setdefault(job_id, [asyncio.Event(), 0])
+        entry[1] += 1
+        return entry[0]
+
+    def release(self, job_id: uuid.UUID) -> None:
+        entry = self._events.get(job_id)
+        if entry is not None:
+            entry[1] -= 1
+            if entry[1] <= 0:
+                del self._events[job_id]
+
+    def notify(self, job_id: uuid.UUID) -> None:
+        entry = self._events.get(job_id)
+        if entry is not None:
+            entry[0].set()
+
+
+_waiters = _Waiters()
+
+
+async def wait_for_job(job_id: uuid.UUID, timeout: float) -> Optional[PlanJob]:
+    """Return the job once it is finished or `timeout` seconds have passed."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    event = _waiters.acquire(job_id)
+    try:
+        while True:
+            async with AsyncSessionLocal() as db:
+                job = await db.get(PlanJob, job_id)
+            remaining = deadline - loop.time()
+            if job is None or job.status in TERMINAL_STATES or remaining <= 0:
+                return job
+            # jobs finished by other processes are only seen by re-polling
+            try:
+                await asyncio.wait_for(event.wait(), timeout=min(remaining, settings.PLAN_JOB_POLL_SECONDS))
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        _waiters.release(job_id)
+
+
+# ---------- Queue operations ----------
+
+async def enqueue_plan_job(db: AsyncSession, payload: Dict[str, Any]) -> PlanJob:
+    job = PlanJob(
+        id=uuid.uuid4(),
+        status=JOB_QUEUED,
+        payload=payload,
+        attempts=0,
+        max_attempts=settings.PLAN_JOB_MAX_ATTEMPTS,
+    )
+    db.add(job)
+    # delivered to listeners when the transaction commits
+    await db.execute(text("select pg_notify(:channel, :job_id)"), {"channel": NOTIFY_CHANNEL, "job_id": str(job.id)})
+    await db.commit()
+    job_stats.enqueued += 1
+    plan_workers.wake()
+    return job
+
+
+async def claim_next_job(db: AsyncSession) -> Optional[PlanJob]:
+    """Lock the oldest runnable job, mark it running and commit. Skips jobs locked by other workers."""
+    now = _utcnow()
+    lease_expired = now - timedelta(seconds=settings.PLAN_JOB_TIMEOUT_SECONDS * 2)
+    stmt = (
+        select(PlanJob)
+        .where(
+            or_(
+                and_(PlanJob.status == JOB_QUEUED, PlanJob.run_after <= now),
+                and_(PlanJob.status == JOB_RUNNING, PlanJob.locked_at < lease_expired),
+            )
+        )
+        .order_by(PlanJob.run_after)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    )
+    job = (await db.execute(stmt)).scalars().first()
+    if job is None:
+        await db.rollback()
+        return None
+    job.status = JOB_RUNNING
+    job.attempts += 1
+    job.locked_at = now
+    if job.started_at is None:
+        job.started_at = now
+    await db.commit()
+    return job
+
+
+def _backoff_seconds(attempt: int) -> float:
+    """Exponential backoff with jitter: half fixed, half random."""
+    delay = settings.PLAN_JOB_BACKOFF_SECONDS * (2 ** (attempt - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def _owned(job: PlanJob):
+    # only the worker holding the current lease may finish the job
+    return and_(PlanJob.id == job.id, PlanJob.status == JOB_RUNNING, PlanJob.locked_at == job.locked_at)
+
+
+async def _complete(job: PlanJob, plan: TrainingPlan) -> bool:
+    """Save the plan and mark the job succeeded in one transaction."""
+    if plan.id is None:
+        plan.id = uuid.uuid4()
+    async with AsyncSessionLocal() as db:
+        db.add(plan)
+        await db.flush()  # plan row must exist before plan_jobs.plan_id references it
+        result = await db.execute(
+            update(PlanJob)
+            .where(_owned(job))
+            .values(status=JOB_SUCCEEDED, plan_id=plan.id, error=None, locked_at=None, finished_at=_utcnow())
+        )
+        if result.rowcount == 0:
+            await db.rollback()
+            return False
+        await bump_version(db, plan.user_id, SCOPE_PLANS)
+        await db.commit()
+        return True
+
+
+async def _fail(job: PlanJob, error: str) -> bool:
+    """Schedule a retry, or mark the job failed once attempts are used up. Returns True if retried."""
+    retry = job.attempts < job.max_attempts
+    if retry:
+        values = dict(status=JOB_QUEUED, locked_at=None, error=error,
+                      run_after=_utcnow() + timedelta(seconds=_backoff_seconds(job.attempts)))
+    else:
+        values = dict(status=JOB_FAILED, locked_at=None, error=error, finished_at=_utcnow())
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(PlanJob).where(_owned(job)).values(**values))
+        await db.commit()
+    return retry
+
+
+async def _requeue(job: PlanJob) -> None:
+    """Give an interrupted job back to the queue without counting the attempt."""
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            update(PlanJob)
+            .where(_owned(job))
+            .values(status=JOB_QUEUED, locked_at=None, attempts=PlanJob.attempts - 1, run_after=_utcnow())
+        )
+        await db.commit()
+
+
+# ---------- Worker pool ----------
+
+class PlanJobWorkers:
+    """A bounded pool of asyncio tasks that claim and run plan jobs."""
+
+    def __init__(self) -> None:
+        self._handler: Optional[JobHandler] = None
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+
+    def wake(self) -> None:
+        self._wakeup.set()
+
+    async def start(self, handler: JobHandler, concurrency: int) -> None:
+        self._handler = handler
+        self._tasks = [asyncio.create_task(self._worker_loop()) for _ in range(concurrency)]
+        self._tasks.append(asyncio.create_task(self._listen()))
+        logger.info("Started %d plan job workers", concurrency)
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker_loop(self) -> None:
+        while True:
+            try:
+                ran = await self._run_one()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Plan job worker error")
+                ran = False
+            if ran:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=settings.PLAN_JOB_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _run_one(self) -> bool:
+        async with AsyncSessionLocal() as db:
+            job = await claim_next_job(db)
+        if job is None:
+            return False
+
+        if job.attempts > job.max_attempts:
+            # reclaimed after its lease expired on the last attempt
+            await _fail(job, "worker lost while running final attempt")
+            self._finished(job, JOB_FAILED)
+            return True
+
+        job_stats.started += 1
+        job_stats.queue_wait_ms_total += _ms(job.created_at, job.locked_at) or 0.0
+        start = time.perf_counter()
+        try:
+            plan = await asyncio.wait_for(self._handler(job.payload), timeout=settings.PLAN_JOB_TIMEOUT_SECONDS)
+        except asyncio.CancelledError:
+            await asyncio.shield(_requeue(job))
+            raise
+        except Exception as e:
+            error = "timed out" if isinstance(e, asyncio.TimeoutError) else str(e)
+            logger.warning("Plan job %s attempt %d failed: %s", job.id, job.attempts, error)
+            if await _fail(job, error[:1000]):
+                job_stats.retried += 1
+            else:
+                self._finished(job, JOB_FAILED)
+            return True
+
+        if await _complete(job, plan):
+            job_stats.run_ms_total += (time.perf_counter() - start) * 1000
+            self._finished(job, JOB_SUCCEEDED)
+        else:
+            logger.warning("Plan job %s lease was lost; discarding result", job.id)
+        return True
+
+    def _finished(self, job: PlanJob, status: str) -> None:
+        if status == JOB_SUCCEEDED:
+            job_stats.succeeded += 1
+        else:
+            job_stats.failed += 1
+        _waiters.notify(job.id)
+
+    async def _listen(self) -> None:
+        """LISTEN for enqueue notifications from any process and wake idle workers."""
+        conninfo = make_url(settings.DATABASE_URL).set(drivername="postgresql").render_as_string(hide_password=False)
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(conninfo, autocommit=True) as conn:
+                    await conn.execute(f"LISTEN {NOTIFY_CHANNEL}")
+                    async for _ in conn.notifies():
+                        self.wake()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Plan job listener disconnected, relying on polling: %s", e)
+                await asyncio.sleep(settings.PLAN_JOB_POLL_SECONDS * 5)
+
+
+plan_workers = PlanJobWorkers()
+
+
+def job_to_dict(job: PlanJob) -> Dict[str, Any]:
+    return {
+        "job_id": str(job.id),
+        "status": job.status,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "plan_id": str(job.plan_id) if job.plan_id else None,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+        "queue_wait_ms": _ms(job.created_at, job.started_at),
+        "total_ms": _ms(job.created_at, job.finished_at),
+    }
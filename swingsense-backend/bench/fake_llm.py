@@ -0,0 +1,273 @@
+"""
+Local fake OpenAI-compatible server for exercising the app without real API calls.
+
+Run it and point the backend at it:
+
+    uvicorn bench.fake_llm:app --port 9000
+    OPENAI_BASE_URL=http://localhost:9000/v1 uvicorn app.main:app --port 8000
+
+Environment knobs:
+    FAKE_LLM_FIRST_TOKEN_MS   median delay before the first token (default 300)
+    FAKE_LLM_TOKEN_MS         delay between streamed tokens (default 20)
+    FAKE_LLM_LATENCY_SIGMA    lognormal spread of the first-token delay; 0 = fixed (default 0).
+                              p99 is about median * exp(2.33 * sigma), e.g. 0.5 -> 3.2x
+    FAKE_LLM_ERROR_RATE       fraction of requests answered with a 500 (default 0)
+    FAKE_LLM_RATE_LIMIT_RATE  fraction answered with a 429 and Retry-After (default 0)
+    FAKE_LLM_RETRY_AFTER_S    Retry-After sent with injected 429s (default 1)
+    FAKE_LLM_HANG_RATE        fraction that hang for FAKE_LLM_HANG_MS before answering (default 0)
+    FAKE_LLM_HANG_MS          (default 120000, past the backend's per-attempt timeout)
+    FAKE_LLM_STREAM_ABORT_RATE  fraction of streams cut off half-way (default 0)
+    FAKE_LLM_SEED             seed for the latency and fault draws (default random)
+
+max_tokens is honoured (a word counts as a token): longer replies are cut off
+with finish_reason "length", as the real API does.
+
+GET /fake/stats returns request and injected-fault counters; POST /fake/stats/reset clears them.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+import uuid
+from collections import Counter
+
+import numpy as np
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+FIRST_TOKEN_MS = float(os.getenv("FAKE_LLM_FIRST_TOKEN_MS", "300"))
+TOKEN_MS = float(os.getenv("FAKE_LLM_TOKEN_MS", "20"))
+LATENCY_SIGMA = float(os.getenv("FAKE_LLM_LATENCY_SIGMA", "0"))
+ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))
+RATE_LIMIT_RATE = float(os.getenv("FAKE_LLM_RATE_LIMIT_RATE", "0"))
+RETRY_AFTER_S = float(os.getenv("FAKE_LLM_RETRY_AFTER_S", "1"))
+HANG_RATE = float(os.getenv("FAKE_LLM_HANG_RATE", "0"))
+HANG_MS = float(os.getenv("FAKE_LLM_HANG_MS", "120000"))
+STREAM_ABORT_RATE = float(os.getenv("FAKE_LLM_STREAM_ABORT_RATE", "0"))
+
+rng = random.Random(os.getenv("FAKE_LLM_SEED"))
+stats: Counter = Counter()
+
+CANNED_REPLY = (
+    "1. Check your grip: rotate both hands slightly to the right. "
+    "2. Align feet, hips and shoulders parallel to the target line. "
+    "3. Start the downswing with your lower body. "
+    "Drill: hit half swings with a headcover outside the ball."
+)
+
+# for prompts that ask for raw JSON (the resource catalog)
+CANNED_RESOURCES = json.dumps([
+    {"id": 1, "title": "Fix your slice in 3 steps", "description": "Grip, path and face drills.",
+     "url": "https://example.com/fix-slice"},
+    {"id": 2, "title": "Square the clubface", "description": "Impact position drill with alignment sticks.",
+     "url": "https://example.com/square-face"},
+    {"id": 3, "title": "Lower body first", "description": "Sequencing the downswing from the ground up.",
+     "url": "https://example.com/lower-body"},
+])
+
+_WEEK_FOCUS = ["Grip and setup", "Swing path", "Short game", "On-course practice"]
+
+
+def _canned_week(n: int) -> dict:
+    return {
+        "week": n,
+        "focus": _WEEK_FOCUS[(n - 1) % len(_WEEK_FOCUS)],
+        "drills": ["Ten slow half swings with a pause at the top.", "Alignment stick gate drill, 20 balls."],
+        "tips": ["Film one swing a session and compare it with last week."],
+    }
+
+
+# structured output (response_format json_schema), by schema name
+CANNED_STRUCTURED = {
+    "training_plan": json.dumps({
+        "summary": "Four weeks moving from setup fundamentals to scoring on the course.",
+        "weeks": [_canned_week(n) for n in range(1, 5)],
+    }),
+    "training_plan_week": json.dumps(_canned_week(1)),
+}
+
+app = FastAPI(title="fake-llm")
+
+
+def _first_token_delay() -> float:
+    if LATENCY_SIGMA <= 0:
+        return FIRST_TOKEN_MS / 1000
+    # lognormal with the configured median
+    return FIRST_TOKEN_MS / 1000 * rng.lognormvariate(0.0, LATENCY_SIGMA)
+
+
+def _error(status: int, message: str, headers: dict = None) -> JSONResponse:
+    body = {"error": {"message": message, "type": "fake_llm_injected", "code": None}}
+    return JSONResponse(body, status_code=status, headers=headers)
+
+
+async def _injected_fault(endpoint: str):
+    """Maybe answer with an injected failure instead of the normal response."""
+    stats[f"{endpoint}_requests"] += 1
+    draw = rng.random()
+    if draw < ERROR_RATE:
+        stats["injected_500"] += 1
+        return _error(500, "injected server error")
+    draw -= ERROR_RATE
+    if draw < RATE_LIMIT_RATE:
+        stats["injected_429"] += 1
+        return _error(429, "injected rate limit", {"retry-after": f"{RETRY_AFTER_S:g}"})
+    draw -= RATE_LIMIT_RATE
+    if draw < HANG_RATE:
+        stats["injected_hang"] += 1
+        await asyncio.sleep(HANG_MS / 1000)
+    return None
+
+
+def _tokens(text: str):
+    # split on spaces but keep them, roughly like real token deltas
+    words = text.split(" ")
+    return [w + (" " if i < len(words) - 1 else "") for i, w in enumerate(words)]
+
+
+def _reply_for(messages: list, response_format=None) -> str:
+    schema = ((response_format or {}).get("json_schema") or {}).get("name")
+    if schema in CANNED_STRUCTURED:
+        return CANNED_STRUCTURED[schema]
+    wants_json = any("JSON" in (m.get("content") or "") for m in messages if m.get("role") == "system")
+    return CANNED_RESOURCES if wants_json else CANNED_REPLY
+
+
+def _usage(messages: list, content: str) -> dict:
+    prompt_tokens = sum(len((m.get("content") or "").split()) for m in messages) + 4 * len(messages)
+    completion_tokens = len(content.split())
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+def _truncate(content: str, max_tokens) -> tuple:
+    """Honour max_tokens (one word ~ one token here) like the real API: cut off with finish_reason "length"."""
+    words = content.split(" ")
+    if max_tokens and len(words) > max_tokens:
+        return " ".join(words[:max_tokens]), "length"
+    return content, "stop"
+
+
+def _completion(model: str, content: str, usage: dict, finish_reason: str = "stop") -> dict:
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": finish_reason,
+        }],
+        "usage": usage,
+    }
+
+
+def _chunk(cid: str, model: str, delta: dict, finish_reason=None) -> str:
+    payload = {
+        "id": cid,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(payload)}\n\n"
+
+
+def _usage_chunk(cid: str, model: str, usage: dict) -> str:
+    # stream_options.include_usage: a final chunk with no choices
+    payload = {"id": cid, "object": "chat.completion.chunk", "created": int(time.time()),
+               "model": model, "choices": [], "usage": usage}
+    return f"data: {json.dumps(payload)}\n\n"
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "fake")
+    fault = await _injected_fault("chat")
+    if fault is not None:
+        return fault
+    await asyncio.sleep(_first_token_delay())
+
+    messages = body.get("messages") or []
+    content, finish_reason = _truncate(_reply_for(messages, body.get("response_format")), body.get("max_tokens"))
+    usage = _usage(messages, content)
+    tokens = _tokens(content)
+
+    if not body.get("stream"):
+        await asyncio.sleep(TOKEN_MS * len(tokens) / 1000)
+        return _completion(model, content, usage, finish_reason)
+
+    include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+    abort = rng.random() < STREAM_ABORT_RATE
+    if abort:
+        stats["injected_stream_abort"] += 1
+
+    async def events():
+        cid = f"chatcmpl-{uuid.uuid4().hex}"
+        yield _chunk(cid, model, {"role": "assistant", "content": ""})
+        for i, tok in enumerate(tokens):
+            if abort and i == len(tokens) // 2:
+                # drop the connection mid-stream, like an upstream reset
+                raise ConnectionResetError("injected stream abort")
+            yield _chunk(cid, model, {"content": tok})
+            await asyncio.sleep(TOKEN_MS / 1000)
+        yield _chunk(cid, model, {}, finish_reason=finish_reason)
+        if include_usage:
+            yield _usage_chunk(cid, model, usage)
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+def _embed(text: str, dim: int) -> list:
+    # hashed bag of words: texts sharing words get similar vectors
+    vec = np.zeros(dim, dtype=np.float32)
+    for word in text.lower().split():
+        h = int.from_bytes(hashlib.md5(word.encode()).digest()[:4], "little")
+        vec[h % dim] += 1.0
+    norm = np.linalg.norm(vec)
+    return (vec / norm if norm else vec).tolist()
+
+
+@app.post("/v1/embeddings")
+async def embeddings(request: Request):
+    body = await request.json()
+    fault = await _injected_fault("embeddings")
+    if fault is not None:
+        return fault
+    inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+    dim = int(body.get("dimensions") or 1536)
+    tokens = sum(len(text.split()) for text in inputs)
+    return {
+        "object": "list",
+        "model": body.get("model", "fake-embedding"),
+        "data": [
+            {"object": "embedding", "index": i, "embedding": _embed(text, dim)}
+            for i, text in enumerate(inputs)
+        ],
+        "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+    }
+
+
+@app.get("/v1/models")
+async def models():
+    # cheap endpoint the backend hits for LLM_WARMUP_CONNECTIONS
+    return {"object": "list", "data": [{"id": "gpt-4o-mini", "object": "model", "created": 0, "owned_by": "fake"}]}
+
+
+@app.get("/fake/stats")
+async def fake_stats():
+    return dict(stats)
+
+
+@app.post("/fake/stats/reset")
+async def reset_fake_stats():
+    stats.clear()
+    return {}
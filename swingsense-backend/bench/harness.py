@@ -0,0 +1,257 @@
+"""
+Benchmark harness: the app and the fake LLM as real servers on a throwaway
+database, plus a closed-loop load generator that reports throughput and
+p50/p95/p99 latency.
+
+    async with bench_stack(fake_llm_env={"FAKE_LLM_LATENCY_SIGMA": "0.5"}) as stack:
+        async with stack.client() as client:
+            result = await run_load("threads", lambda i: client.get("/questions/threads/"),
+                                    concurrency=16, requests=500)
+        print(result.summary())
+
+The schema uses Postgres-only features (JSONB operators, pgvector, pg_trgm,
+ON CONFLICT), so SQLite cannot stand in. Instead a fresh database is created
+on the server named by BENCH_ADMIN_DATABASE_URL (default: DATABASE_URL),
+migrated with `alembic upgrade head`, and dropped with everything in it when
+the stack exits. The server needs the vector and pg_trgm extensions. Pass
+database_url= to reuse an existing, already migrated database instead.
+
+Requests carry unsigned dev tokens (see dev_headers), so the app is started
+with SUPABASE_JWKS_URL / SUPABASE_JWT_SECRET cleared and AUTH_ALLOW_UNVERIFIED=true.
+"""
+import asyncio
+import math
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from collections import Counter
+from contextlib import ExitStack, asynccontextmanager, contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional
+
+import httpx
+import jwt
+import psycopg
+from psycopg import sql
+from sqlalchemy.engine import make_url
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def dev_headers(user_id: Optional[uuid.UUID] = None) -> Dict[str, str]:
+    """Authorization header with an unsigned-mode dev token for `user_id` (random by default)."""
+    claims = {"sub": str(user_id or uuid.uuid4()), "exp": int(time.time()) + 6 * 3600}
+    return {"Authorization": f"Bearer {jwt.encode(claims, 'bench', algorithm='HS256')}"}
+
+
+# ---------- Disposable database ----------
+
+def _libpq_url(url: str) -> str:
+    # psycopg wants a plain postgresql:// URL, without SQLAlchemy's +driver suffix
+    return make_url(url).set(drivername="postgresql").render_as_string(hide_password=False)
+
+
+@contextmanager
+def disposable_database(admin_url: str, keep: bool = False) -> Iterator[str]:
+    """Create and migrate a uniquely named database next to `admin_url`; drop it on exit."""
+    name = f"swingsense_bench_{uuid.uuid4().hex[:8]}"
+    admin = _libpq_url(admin_url)
+    with psycopg.connect(admin, autocommit=True) as conn:
+        conn.execute(sql.SQL("create database {}").format(sql.Identifier(name)))
+    url = make_url(admin_url).set(database=name).render_as_string(hide_password=False)
+    try:
+        subprocess.run(
+            [sys.executable, "-m", "alembic", "upgrade", "head"],
+            cwd=BACKEND_DIR, env={**os.environ, "DATABASE_URL": url}, check=True,
+        )
+        yield url
+    finally:
+        if keep:
+            print(f"kept bench database {name}", file=sys.stderr)
+        else:
+            with psycopg.connect(admin, autocommit=True) as conn:
+                conn.execute(sql.SQL("drop database if exists {} with (force)").format(sql.Identifier(name)))
+
+
+# ---------- Servers ----------
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@contextmanager
+def _server(target: str, port: int, env: Dict[str, str], workers: int = 1) -> Iterator[subprocess.Popen]:
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", target, "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning", "--no-access-log"],
+        cwd=BACKEND_DIR, env={**os.environ, **env},
+    )
+    try:
+        yield proc
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+
+
+async def _wait_ready(url: str, proc: subprocess.Popen, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(timeout=2) as client:
+        while time.monotonic() < deadline:
+            if proc.poll() is not None:
+                raise RuntimeError(f"server for {url} exited with code {proc.returncode}")
+            try:
+                if (await client.get(url)).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise TimeoutError(f"{url} not ready after {timeout:.0f}s")
+
+
+@dataclass
+class BenchStack:
+    base_url: str
+    fake_llm_url: str
+    database_url: str
+
+    def client(self, user_id: Optional[uuid.UUID] = None, **kwargs: Any) -> httpx.AsyncClient:
+        """A client for the app, authenticated as `user_id`, with a pool big enough for the load."""
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=256)
+        return httpx.AsyncClient(base_url=self.base_url, headers=dev_headers(user_id),
+                                 timeout=180, limits=limits, **kwargs)
+
+    async def fake_llm_stats(self) -> Dict[str, int]:
+        async with httpx.AsyncClient(base_url=self.fake_llm_url) as client:
+            return (await client.get("/fake/stats")).json()
+
+
+@asynccontextmanager
+async def bench_stack(
+    *,
+    database_url: Optional[str] = None,
+    keep_db: bool = False,
+    fake_llm_env: Optional[Dict[str, str]] = None,
+    app_env: Optional[Dict[str, str]] = None,
+    workers: int = 1,
+) -> AsyncIterator[BenchStack]:
+    """Fake LLM + app (uvicorn subprocesses) on a disposable database, torn down on exit."""
+    with ExitStack() as stack:
+        if database_url is None:
+            admin_url = os.getenv("BENCH_ADMIN_DATABASE_URL") or os.getenv("DATABASE_URL")
+            if not admin_url:
+                raise RuntimeError("set BENCH_ADMIN_DATABASE_URL or DATABASE_URL to a Postgres server")
+            database_url = stack.enter_context(disposable_database(admin_url, keep_db))
+
+        fake_port, app_port = _free_port(), _free_port()
+        fake_llm_url = f"http://127.0.0.1:{fake_port}"
+        fake = stack.enter_context(_server("bench.fake_llm:app", fake_port, fake_llm_env or {}))
+        await _wait_ready(f"{fake_llm_url}/v1/models", fake)
+
+        env = {
+            "DATABASE_URL": database_url,
+            "OPENAI_BASE_URL": f"{fake_llm_url}/v1",
+            "OPENAI_API_KEY": "bench",
+            "SUPABASE_JWKS_URL": "",
+            "SUPABASE_JWT_SECRET": "",
+            "AUTH_ALLOW_UNVERIFIED": "true",
+            **(app_env or {}),
+        }
+        base_url = f"http://127.0.0.1:{app_port}"
+        server = stack.enter_context(_server("app.main:app", app_port, env, workers))
+        await _wait_ready(f"{base_url}/healthz/ready", server)
+        yield BenchStack(base_url=base_url, fake_llm_url=fake_llm_url, database_url=database_url)
+
+
+# ---------- Load generator ----------
+
+def percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile of already sorted values."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(q * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+@dataclass
+class LoadResult:
+    scenario: str
+    concurrency: int
+    elapsed_seconds: float
+    latencies_ms: List[float] = field(default_factory=list)  # successful requests only
+    statuses: Counter = field(default_factory=Counter)
+
+    @property
+    def requests(self) -> int:
+        return sum(self.statuses.values())
+
+    @property
+    def errors(self) -> int:
+        return self.requests - len(self.latencies_ms)
+
+    def summary(self) -> Dict[str, Any]:
+        ordered = sorted(self.latencies_ms)
+
+        def ms(value: Optional[float]) -> Optional[float]:
+            return round(value, 2) if value is not None else None
+
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "error_rate": round(self.errors / self.requests, 4) if self.requests else 0.0,
+            "throughput_rps": round(len(ordered) / self.elapsed_seconds, 2) if self.elapsed_seconds else 0.0,
+            "mean_ms": ms(statistics.fmean(ordered)) if ordered else None,
+            "p50_ms": ms(percentile(ordered, 0.50)),
+            "p95_ms": ms(percentile(ordered, 0.95)),
+            "p99_ms": ms(percentile(ordered, 0.99)),
+            "statuses": {str(k): v for k, v in sorted(self.statuses.items(), key=lambda kv: str(kv[0]))},
+        }
+
+
+async def run_load(
+    scenario: str,
+    send: Callable[[int], Awaitable[httpx.Response]],
+    *,
+    concurrency: int,
+    requests: int,
+    ok_statuses: tuple = (200, 201, 304),
+) -> LoadResult:
+    """
+    Closed loop: `concurrency` workers each send the next request as soon as
+    their previous one finishes, until `requests` have been sent. `send(i)`
+    issues request number i. Latency counts only responses in `ok_statuses`;
+    everything else (including transport errors) is an error.
+    """
+    result = LoadResult(scenario=scenario, concurrency=concurrency, elapsed_seconds=0.0)
+    next_index = 0
+
+    async def worker() -> None:
+        nonlocal next_index
+        while next_index < requests:
+            i = next_index
+            next_index += 1
+            start = time.perf_counter()
+            try:
+                resp = await send(i)
+            except httpx.HTTPError as e:
+                result.statuses[type(e).__name__] += 1
+                continue
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            result.statuses[resp.status_code] += 1
+            if resp.status_code in ok_statuses:
+                result.latencies_ms.append(elapsed_ms)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    result.elapsed_seconds = time.perf_counter() - start
+    return result
@@ -0,0 +1,87 @@
+"""
+Load test: slow LLM calls must not pin DB connections.
+
+Fires CONCURRENCY concurrent POST /questions/questions/ against the app (in-process,
+via httpx.ASGITransport) while the fake LLM is slow, samples how many pooled
+connections are checked out, and times GET /questions/questions/ meanwhile.
+
+    FAKE_LLM_FIRST_TOKEN_MS=5000 uvicorn bench.fake_llm:app --port 9000 &
+    OPENAI_BASE_URL=http://localhost:9000/v1 DATABASE_URL=postgresql://... \\
+        python -m bench.pool_load --concurrency 40
+
+With the two-phase write only a few connections stay checked out while the LLM
+calls run, so the mean is far below pool_size + max_overflow and reads are not
+stuck behind the LLM calls. The peak (and any overflow) comes from the first
+transactions of all CONCURRENCY requests arriving at once.
+Requests carry an unsigned dev token, so run the app without SUPABASE_JWKS_URL /
+SUPABASE_JWT_SECRET configured and with AUTH_ALLOW_UNVERIFIED=true.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+import httpx
+import jwt
+
+from app.db.session import async_engine
+from app.main import app
+
+
+async def _sample_pool(stop: asyncio.Event, samples: list) -> None:
+    while not stop.is_set():
+        samples.append(async_engine.pool.checkedout())
+        await asyncio.sleep(0.05)
+
+
+async def _timed_reads(client: httpx.AsyncClient, stop: asyncio.Event, latencies: list) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        resp = await client.get("/questions/questions/")
+        resp.raise_for_status()
+        latencies.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(0.1)
+
+
+def _dev_headers() -> dict:
+    token = jwt.encode({"sub": str(uuid.uuid4()), "exp": int(time.time()) + 3600}, "bench", algorithm="HS256")
+    return {"Authorization": f"Bearer {token}"}
+
+
+async def main(concurrency: int) -> None:
+    transport = httpx.ASGITransport(app=app)
+    # ASGITransport does not send lifespan events; run startup (LLM client, workers) ourselves
+    async with app.router.lifespan_context(app), \
+            httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120,
+                              headers=_dev_headers()) as client:
+        stop = asyncio.Event()
+        samples, read_ms = [], []
+        sampler = asyncio.create_task(_sample_pool(stop, samples))
+        reader = asyncio.create_task(_timed_reads(client, stop, read_ms))
+
+        writes = [
+            client.post("/questions/questions/?no_cache=true", json={"question": f"why do I slice #{i}"})
+            for i in range(concurrency)
+        ]
+        results = await asyncio.gather(*writes, return_exceptions=True)
+        stop.set()
+        await asyncio.gather(sampler, reader)
+
+    ok = sum(1 for r in results if isinstance(r, httpx.Response) and r.status_code == 201)
+    pool = async_engine.pool
+    print(f"writes ok:            {ok}/{concurrency}")
+    print(f"pool size/overflow:   {pool.size()}/{pool._max_overflow}")
+    print(f"peak checked out:     {max(samples, default=0)}")
+    print(f"peak overflow:        {max(0, max(samples, default=0) - pool.size())}")
+    print(f"mean checked out:     {statistics.fmean(samples) if samples else 0:.2f}")
+    if read_ms:
+        print(f"concurrent reads:     n={len(read_ms)} max={max(read_ms):.1f}ms "
+              f"median={statistics.median(read_ms):.1f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=40)
+    args = parser.parse_args()
+    asyncio.run(main(args.concurrency))
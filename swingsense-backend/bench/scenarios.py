@@ -0,0 +1,270 @@
+"""
+Scenario benchmarks against a full stack (bench.harness): app + fake LLM on a
+disposable Postgres database, each scenario run at increasing concurrency.
+
+    DATABASE_URL=postgresql://postgres@localhost/postgres python -m bench.scenarios
+    python -m bench.scenarios --scenario lists --concurrency 1 8 32 --requests 1000
+    python -m bench.scenarios --fake-latency-sigma 0.5 --fake-error-rate 0.02
+    python -m bench.scenarios --llm-mode replay --cassette bench/cassettes/llm.jsonl
+
+Scenarios:
+    questions  POST /questions/questions/?no_cache=true (LLM call + two short transactions)
+    plans      POST /plans/generate
+    resources  GET /resources/?issue=... over a few issues (catalog hits after the first fetch)
+    lists      GET threads / questions / feedback / plans/current / progress for one seeded user
+
+Prints throughput and p50/p95/p99 per scenario and concurrency. --output writes
+the same numbers as JSON; --baseline compares against a stored run
+(bench/baseline.json) and exits 1 on a regression beyond --tolerance, or
+when the baseline is missing, empty or lacks a measured scenario, so a PR
+can paste the comparison. Refresh the baseline with --write-baseline
+on the reference machine; comparisons are only meaningful between runs with
+the same fake LLM settings, which are stored next to the numbers.
+
+--llm-mode record saves every LLM answer to --cassette (point OPENAI_BASE_URL
+and OPENAI_API_KEY at the real API with --real-llm to capture real output once);
+--llm-mode replay serves them back without any LLM, so the run measures only the
+app and the database (--replay-latency recorded keeps the original timings).
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+from bench.harness import BenchStack, LoadResult, bench_stack, run_load
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baseline.json"
+
+# writes are spread over a few users, like real traffic
+WRITE_USERS = 20
+
+ISSUES = ["slice", "hook", "topping the ball", "chunked wedges", "three putts"]
+
+PLAN_BODY = {
+    "years_played": 6,
+    "handicap": 14.2,
+    "strengths": "iron play, lag putting",
+    "weaknesses": "driver slice under pressure",
+    "goals": "break 80 this season",
+}
+
+
+@dataclass
+class Scenario:
+    description: str
+    # prepare(stack, clients) seeds data through the API if needed and returns send(i) for run_load
+    prepare: Callable[[BenchStack, List[httpx.AsyncClient]], Awaitable[Callable[[int], Awaitable[httpx.Response]]]]
+
+
+async def _prepare_questions(stack: BenchStack, clients: List[httpx.AsyncClient]):
+    def send(i: int):
+        return clients[i % len(clients)].post(
+            "/questions/questions/", params={"no_cache": "true"},
+            json={"question": f"why does my driver slice when I swing hard, attempt {i}"},
+        )
+    return send
+
+
+async def _prepare_plans(stack: BenchStack, clients: List[httpx.AsyncClient]):
+    def send(i: int):
+        return clients[i % len(clients)].post("/plans/generate", json=PLAN_BODY)
+    return send
+
+
+async def _prepare_resources(stack: BenchStack, clients: List[httpx.AsyncClient]):
+    def send(i: int):
+        return clients[i % len(clients)].get("/resources/", params={"issue": ISSUES[i % len(ISSUES)]})
+    return send
+
+
+async def _prepare_lists(stack: BenchStack, clients: List[httpx.AsyncClient]):
+    client = clients[0]
+    # one user with a realistic history: 100 answered questions, a plan, 2000 metrics
+    for start in range(0, 100, 20):
+        resp = await client.post("/questions/questions/batch", json={
+            "questions": [f"how do I fix my {ISSUES[n % len(ISSUES)]}, take {n}" for n in range(start, start + 20)],
+        })
+        resp.raise_for_status()
+    (await client.post("/plans/generate", json=PLAN_BODY)).raise_for_status()
+    metrics = [{"carry_yards": 150 + n % 60, "ball_speed": 110 + n % 25, "club": "7i"} for n in range(2000)]
+    (await client.post("/progress/batch", json=metrics)).raise_for_status()
+
+    paths = [
+        ("/questions/threads/", {"limit": 50}),
+        ("/questions/questions/", {"limit": 50}),
+        ("/questions/feedback/", {"limit": 50}),
+        ("/plans/current", {}),
+        ("/progress/", {"limit": 100}),
+        ("/progress/", {"granularity": "day", "field": "carry_yards"}),
+    ]
+
+    def send(i: int):
+        path, params = paths[i % len(paths)]
+        return client.get(path, params=params)
+    return send
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    "questions": Scenario("POST /questions/questions/ (no cache)", _prepare_questions),
+    "plans": Scenario("POST /plans/generate", _prepare_plans),
+    "resources": Scenario("GET /resources/?issue=", _prepare_resources),
+    "lists": Scenario("per-user list endpoints", _prepare_lists),
+}
+
+
+# ---------- Reporting ----------
+
+def _print_table(results: List[LoadResult]) -> None:
+    header = f"{'scenario':<10} {'conc':>4} {'reqs':>6} {'err%':>6} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    print(header)
+    print("-" * len(header))
+
+    def fmt(v: Optional[float]) -> str:
+        return f"{v:9.1f}" if v is not None else f"{'-':>9}"
+
+    for r in results:
+        s = r.summary()
+        print(f"{r.scenario:<10} {r.concurrency:>4} {s['requests']:>6} {s['error_rate'] * 100:>6.1f} "
+              f"{s['throughput_rps']:>9.1f} {fmt(s['p50_ms'])} {fmt(s['p95_ms'])} {fmt(s['p99_ms'])}")
+
+
+def _report(results: List[LoadResult], config: Dict[str, Any]) -> Dict[str, Any]:
+    by_scenario: Dict[str, Dict[str, Any]] = {}
+    for r in results:
+        by_scenario.setdefault(r.scenario, {})[str(r.concurrency)] = r.summary()
+    return {
+        "recorded_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(),
+                    "processor": platform.machine(), "cpus": os.cpu_count()},
+        "config": config,
+        "results": by_scenario,
+    }
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """
+    Regressions of `report` against `baseline`: p95 up, throughput down, or more
+    errors. A measured scenario/concurrency with no baseline entry is a problem
+    too, so an empty or stale baseline cannot make the check pass by default.
+    """
+    if not baseline.get("results"):
+        return ["baseline has no results; record one on the reference machine with --write-baseline"]
+    if baseline.get("config") != report["config"]:
+        print("warning: baseline was recorded with different settings; numbers may not be comparable",
+              file=sys.stderr)
+    problems = []
+    for scenario, levels in report["results"].items():
+        for conc, now in levels.items():
+            base = baseline.get("results", {}).get(scenario, {}).get(conc)
+            label = f"{scenario} @ concurrency {conc}"
+            if base is None:
+                problems.append(f"{label}: no baseline entry (refresh the baseline with --write-baseline)")
+                continue
+            if now["p95_ms"] and base.get("p95_ms") and now["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+                problems.append(f"{label}: p95 {base['p95_ms']:.1f} -> {now['p95_ms']:.1f} ms")
+            if base.get("throughput_rps") and now["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+                problems.append(f"{label}: throughput {base['throughput_rps']:.1f} -> {now['throughput_rps']:.1f} rps")
+            if now["error_rate"] > base.get("error_rate", 0) + 0.01:
+                problems.append(f"{label}: error rate {base.get('error_rate', 0):.2%} -> {now['error_rate']:.2%}")
+    return problems
+
+
+# ---------- Main ----------
+
+async def main(args: argparse.Namespace) -> int:
+    fake_llm_env = {
+        "FAKE_LLM_FIRST_TOKEN_MS": str(args.fake_first_token_ms),
+        "FAKE_LLM_TOKEN_MS": str(args.fake_token_ms),
+        "FAKE_LLM_LATENCY_SIGMA": str(args.fake_latency_sigma),
+        "FAKE_LLM_ERROR_RATE": str(args.fake_error_rate),
+        "FAKE_LLM_SEED": "1",
+    }
+    config = {
+        "fake_llm": fake_llm_env,
+        "llm_mode": args.llm_mode,
+        "requests": args.requests,
+        "workers": args.workers,
+    }
+    app_env = {
+        "LLM_MODE": args.llm_mode,
+        "LLM_CASSETTE_PATH": str(Path(args.cassette).resolve()),
+        "LLM_REPLAY_LATENCY": args.replay_latency,
+        # the fake LLM has no account quota: measure the app, not the gateway's token buckets
+        "LLM_RPM_LIMIT": "0",
+        "LLM_TPM_LIMIT": "0",
+    }
+    if args.llm_mode == "replay":
+        config["replay_latency"] = args.replay_latency
+    if args.real_llm:
+        # keep the caller's OPENAI_BASE_URL / OPENAI_API_KEY instead of the fake server
+        app_env.update({k: os.environ.get(k, "") for k in ("OPENAI_BASE_URL", "OPENAI_API_KEY")})
+        for quota in ("LLM_RPM_LIMIT", "LLM_TPM_LIMIT"):
+            del app_env[quota]  # the real account's limits apply
+        config["fake_llm"] = None
+    results: List[LoadResult] = []
+    async with bench_stack(database_url=args.database_url, keep_db=args.keep_db,
+                           fake_llm_env=fake_llm_env, app_env=app_env, workers=args.workers) as stack:
+        for name in args.scenario:
+            clients = [stack.client(uuid.uuid4()) for _ in range(WRITE_USERS)]
+            try:
+                send = await SCENARIOS[name].prepare(stack, clients)
+                # warm-up: connections, caches, first catalog fetches
+                await run_load(name, send, concurrency=min(4, args.requests), requests=min(20, args.requests))
+                for concurrency in args.concurrency:
+                    result = await run_load(name, send, concurrency=concurrency, requests=args.requests)
+                    results.append(result)
+                    print(f"{name} @ {concurrency}: {result.summary()['throughput_rps']} rps", file=sys.stderr)
+            finally:
+                await asyncio.gather(*(c.aclose() for c in clients))
+        print(f"fake LLM: {await stack.fake_llm_stats()}", file=sys.stderr)
+
+    _print_table(results)
+    report = _report(results, config)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2) + "\n")
+    if args.write_baseline:
+        Path(args.baseline).write_text(json.dumps(report, indent=2) + "\n")
+        print(f"baseline written to {args.baseline}")
+        return 0
+    baseline_path = Path(args.baseline)
+    if not baseline_path.exists():
+        print(f"NO BASELINE: {baseline_path} does not exist, nothing was compared")
+        return 1
+    problems = compare(report, json.loads(baseline_path.read_text()), args.tolerance)
+    for p in problems:
+        print(f"REGRESSION {p}")
+    if problems:
+        return 1
+    print(f"no regressions against {baseline_path} (tolerance {args.tolerance:.0%})")
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SwingSense scenario benchmarks")
+    parser.add_argument("--scenario", nargs="+", choices=sorted(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 16, 64])
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario and concurrency level")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--database-url", default=None, help="reuse this migrated database instead of a disposable one")
+    parser.add_argument("--keep-db", action="store_true", help="do not drop the disposable database")
+    parser.add_argument("--fake-first-token-ms", type=float, default=300)
+    parser.add_argument("--fake-token-ms", type=float, default=5)
+    parser.add_argument("--fake-latency-sigma", type=float, default=0.3)
+    parser.add_argument("--fake-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-mode", choices=["live", "record", "replay"], default="live")
+    parser.add_argument("--cassette", default="bench/cassettes/llm.jsonl", help="LLM_CASSETTE_PATH for record/replay")
+    parser.add_argument("--replay-latency", choices=["none", "recorded"], default="none")
+    parser.add_argument("--real-llm", action="store_true", help="use OPENAI_BASE_URL/OPENAI_API_KEY, not the fake server")
+    parser.add_argument("--output", default=None, help="write results as JSON")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE))
+    parser.add_argument("--write-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative p95/throughput change")
+    sys.exit(asyncio.run(main(parser.parse_args())))
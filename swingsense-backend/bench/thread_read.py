@@ -0,0 +1,119 @@
+"""
+Read benchmark: GET /questions/threads/ vs the two-call pattern the frontend used.
+
+Seeds QUESTIONS questions (each with one feedback row) for a throwaway user,
+then times, in-process via httpx.ASGITransport:
+  - two-call: GET /questions/questions/ + GET /questions/feedback/ and a
+    client-side join on question id (feedback rows carry no question id, so
+    the old UI could only pair them by position)
+  - thread:   GET /questions/threads/
+and counts the SQL statements each pattern sends per page. The per-user
+response cache is off unless --http-cache is given, so every call runs its queries.
+
+    DATABASE_URL=postgresql://... OPENAI_API_KEY=x python -m bench.thread_read --questions 500
+
+Requests carry an unsigned dev token, so run without SUPABASE_JWKS_URL /
+SUPABASE_JWT_SECRET configured and with AUTH_ALLOW_UNVERIFIED=true. Seeded rows are deleted afterwards.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import jwt
+from sqlalchemy import delete, event
+
+from app.core.config import settings
+from app.db.models import QUESTION_ANSWERED, SwingFeedback, SwingQuestion
+from app.db.session import AsyncSessionLocal, async_engine
+from app.main import app
+
+_statements = 0
+
+
+@event.listens_for(async_engine.sync_engine, "before_cursor_execute")
+def _count_statement(*_args) -> None:
+    global _statements
+    _statements += 1
+
+
+async def _seed(user_id: uuid.UUID, count: int) -> None:
+    now = datetime.now(timezone.utc)
+    async with AsyncSessionLocal() as db:
+        for i in range(count):
+            asked = now - timedelta(minutes=count - i)
+            q = SwingQuestion(id=uuid.uuid4(), user_id=user_id, question=f"why do I slice #{i}",
+                              status=QUESTION_ANSWERED, created_at=asked)
+            db.add(q)
+            db.add(SwingFeedback(question_id=q.id, user_id=user_id, created_at=asked + timedelta(seconds=5),
+                                 feedback="1. Check your grip. 2. Square the face at impact. " * 4))
+        await db.commit()
+
+
+async def _cleanup(user_id: uuid.UUID) -> None:
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(SwingQuestion).where(SwingQuestion.user_id == user_id))
+        await db.commit()
+
+
+async def _two_calls(client: httpx.AsyncClient, limit: int) -> int:
+    questions, feedback = await asyncio.gather(
+        client.get("/questions/questions/", params={"limit": limit}),
+        client.get("/questions/feedback/", params={"limit": limit}),
+    )
+    questions.raise_for_status()
+    feedback.raise_for_status()
+    joined = [dict(q, feedback=[f]) for q, f in zip(questions.json(), feedback.json())]
+    return len(joined)
+
+
+async def _thread(client: httpx.AsyncClient, limit: int) -> int:
+    resp = await client.get("/questions/threads/", params={"limit": limit})
+    resp.raise_for_status()
+    return len(resp.json())
+
+
+async def _time(label: str, iterations: int, fn) -> None:
+    samples = []
+    statements_before = _statements
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    p95 = samples[int(len(samples) * 0.95) - 1] if len(samples) >= 20 else samples[-1]
+    queries = (_statements - statements_before) / iterations
+    print(f"{label:<10} queries={queries:4.1f}  mean={statistics.fmean(samples):7.2f}ms  "
+          f"p50={statistics.median(samples):7.2f}ms  p95={p95:7.2f}ms")
+
+
+async def main(questions: int, limit: int, iterations: int, http_cache: bool) -> None:
+    settings.HTTP_CACHE_ENABLED = http_cache
+    user_id = uuid.uuid4()
+    token = jwt.encode({"sub": str(user_id), "exp": int(time.time()) + 3600}, "bench", algorithm="HS256")
+    await _seed(user_id, questions)
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench",
+                                     headers={"Authorization": f"Bearer {token}"}) as client:
+            # warm up connections and caches
+            await _two_calls(client, limit)
+            await _thread(client, limit)
+            print(f"{questions} questions seeded, page size {limit}, {iterations} iterations")
+            await _time("two-call", iterations, lambda: _two_calls(client, limit))
+            await _time("thread", iterations, lambda: _thread(client, limit))
+    finally:
+        await _cleanup(user_id)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--questions", type=int, default=500)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--http-cache", action="store_true", help="serve repeat pages from the response cache")
+    args = parser.parse_args()
+    asyncio.run(main(args.questions, args.limit, args.iterations, args.http_cache))
@@ -0,0 +1,51 @@
+import os
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.db.session import _async_url
+
+
+@pytest.fixture
+def anyio_backend():
+    # the app runs on asyncio only
+    return "asyncio"
+
+
+class FakeClock:
+    """Stands in for time.monotonic in cache tests."""
+
+    def __init__(self, now: float = 1000.0) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture(scope="session")
+def database_url():
+    """A migrated throwaway database next to TEST_DATABASE_URL (needs vector and pg_trgm), or skip."""
+    admin_url = os.environ.get("TEST_DATABASE_URL")
+    if not admin_url:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    from bench.harness import disposable_database
+    with disposable_database(admin_url) as url:
+        yield url
+
+
+@pytest.fixture
+async def session_factory(database_url):
+    """An async_sessionmaker on the test database, for patching over AsyncSessionLocal."""
+    engine = create_async_engine(_async_url(database_url))
+    try:
+        yield async_sessionmaker(engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+    finally:
+        await engine.dispose()
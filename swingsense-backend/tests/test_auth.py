@@ -0,0 +1,142 @@
+import json
+import time
+import uuid
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+from jwt.algorithms import RSAAlgorithm
+
+from app.core import auth
+from app.core.auth import JWKSCache, VerifiedTokenCache
+from app.core.config import settings
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(scope="module")
+def signing_key():
+    return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+def _write_jwks(path, *keys):
+    jwks = []
+    for kid, private_key in keys:
+        jwk = json.loads(RSAAlgorithm.to_jwk(private_key.public_key()))
+        jwk.update({"kid": kid, "alg": "RS256", "use": "sig"})
+        jwks.append(jwk)
+    path.write_text(json.dumps({"keys": jwks}))
+
+
+def _token(private_key, kid="key-1", **claims):
+    now = int(time.time())
+    claims = {"sub": str(uuid.uuid4()), "aud": "authenticated", "iat": now, "exp": now + 3600, **claims}
+    return jwt.encode(claims, private_key, algorithm="RS256", headers={"kid": kid})
+
+
+@pytest.fixture
+def jwks_file(tmp_path, monkeypatch, signing_key):
+    path = tmp_path / "jwks.json"
+    _write_jwks(path, ("key-1", signing_key))
+    monkeypatch.setattr(settings, "SUPABASE_JWKS_URL", str(path))
+    monkeypatch.setattr(settings, "SUPABASE_JWT_SECRET", "")
+    monkeypatch.setattr(settings, "JWT_AUDIENCE", "authenticated")
+    monkeypatch.setattr(settings, "JWKS_MIN_REFRESH_SECONDS", 0)
+    monkeypatch.setattr(settings, "AUTH_ALLOW_UNVERIFIED", False)
+    monkeypatch.setattr(auth, "jwks", JWKSCache(str(path)))
+    monkeypatch.setattr(auth, "token_cache", VerifiedTokenCache(maxsize=10))
+    return path
+
+
+async def _user(token):
+    return await auth.get_current_user(HTTPAuthorizationCredentials(scheme="Bearer", credentials=token))
+
+
+async def test_valid_token_is_verified_against_the_jwks(jwks_file, signing_key):
+    user_id = str(uuid.uuid4())
+    user = await _user(_token(signing_key, sub=user_id, email="golfer@example.com"))
+    assert user == {"user_id": user_id, "email": "golfer@example.com"}
+
+
+@pytest.mark.parametrize("claims", [
+    {"exp": int(time.time()) - 3600},
+    {"aud": "someone-else"},
+])
+async def test_expired_or_foreign_tokens_are_rejected(jwks_file, signing_key, claims):
+    with pytest.raises(HTTPException) as exc:
+        await _user(_token(signing_key, **claims))
+    assert exc.value.status_code == 401
+
+
+async def test_forged_signature_is_rejected(jwks_file):
+    forger = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    with pytest.raises(HTTPException) as exc:
+        await _user(_token(forger))
+    assert exc.value.status_code == 401
+
+
+async def test_unknown_kid_refetches_the_jwks_after_rotation(jwks_file, signing_key):
+    await _user(_token(signing_key))
+    rotated = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    _write_jwks(jwks_file, ("key-1", signing_key), ("key-2", rotated))
+    assert (await _user(_token(rotated, kid="key-2")))["user_id"]
+
+
+async def test_unknown_kid_refreshes_are_rate_limited(jwks_file, signing_key, monkeypatch):
+    await auth.jwks.refresh()
+    monkeypatch.setattr(settings, "JWKS_MIN_REFRESH_SECONDS", 60)
+    rotated = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    _write_jwks(jwks_file, ("key-2", rotated))
+    # the file has the key, but it was read less than a minute ago
+    with pytest.raises(HTTPException):
+        await _user(_token(rotated, kid="key-2"))
+
+
+async def test_verified_tokens_are_served_from_the_cache(jwks_file, signing_key, monkeypatch):
+    verified = []
+    verify = auth.verify_token
+
+    async def counting_verify(token):
+        verified.append(token)
+        return await verify(token)
+
+    monkeypatch.setattr(auth, "verify_token", counting_verify)
+    token = _token(signing_key)
+    first = await auth.decode_token(token)
+    assert await auth.decode_token(token) == first
+    assert len(verified) == 1
+
+
+def test_token_cache_expires_with_the_token_and_evicts_lru():
+    cache = VerifiedTokenCache(maxsize=2)
+    cache.put("expired", {"sub": "a", "exp": time.time() - 1})
+    assert cache.get("expired") is None
+
+    later = time.time() + 3600
+    cache.put("a", {"sub": "a", "exp": later})
+    cache.put("b", {"sub": "b", "exp": later})
+    cache.get("a")
+    cache.put("c", {"sub": "c", "exp": later})
+    assert cache.get("b") is None
+    assert cache.get("a")["sub"] == "a" and cache.get("c")["sub"] == "c"
+
+
+async def test_hs256_tokens_use_the_jwt_secret(jwks_file, monkeypatch):
+    monkeypatch.setattr(settings, "SUPABASE_JWT_SECRET", "s" * 32)
+    token = jwt.encode({"sub": "user-1", "aud": "authenticated", "exp": int(time.time()) + 60}, "s" * 32,
+                       algorithm="HS256")
+    assert (await auth.decode_token(token))["sub"] == "user-1"
+
+
+async def test_no_keys_configured_fails_closed(monkeypatch):
+    monkeypatch.setattr(settings, "SUPABASE_JWKS_URL", "")
+    monkeypatch.setattr(settings, "SUPABASE_JWT_SECRET", "")
+    monkeypatch.setattr(settings, "AUTH_ALLOW_UNVERIFIED", False)
+    unsigned = jwt.encode({"sub": "anyone", "exp": int(time.time()) + 60}, "guess", algorithm="HS256")
+    with pytest.raises(jwt.InvalidTokenError):
+        await auth.decode_token(unsigned)
+
+    monkeypatch.setattr(settings, "AUTH_ALLOW_UNVERIFIED", True)
+    assert (await auth.decode_token(unsigned))["sub"] == "anyone"
@@ -0,0 +1,148 @@
+import asyncio
+import json
+import uuid
+from datetime import timedelta
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import select, update
+
+from app.core import idempotency
+from app.core.idempotency import REPLAYED_HEADER, request_fingerprint, run_idempotent
+from app.db.models import IDEMPOTENCY_COMPLETED, IdempotencyKey
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(autouse=True)
+def use_test_database(monkeypatch, session_factory):
+    monkeypatch.setattr(idempotency, "AsyncSessionLocal", session_factory)
+    return session_factory
+
+
+class Handler:
+    def __init__(self, fail=False, gate=None):
+        self.calls = 0
+        self.fail = fail
+        self.gate = gate
+
+    async def __call__(self):
+        self.calls += 1
+        if self.gate is not None:
+            await self.gate.wait()
+        if self.fail:
+            raise RuntimeError("LLM down")
+        return {"id": str(uuid.uuid4()), "call": self.calls}
+
+
+def _body(response):
+    return json.loads(response.body)
+
+
+async def test_fingerprint_covers_endpoint_body_and_params():
+    base = request_fingerprint("questions", {"question": "slice"}, no_cache=False)
+    assert base == request_fingerprint("questions", {"question": "slice"}, no_cache=False)
+    assert base != request_fingerprint("questions", {"question": "hook"}, no_cache=False)
+    assert base != request_fingerprint("questions", {"question": "slice"}, no_cache=True)
+    assert base != request_fingerprint("plans", {"question": "slice"}, no_cache=False)
+
+
+async def test_without_a_key_the_handler_just_runs():
+    handler = Handler()
+    assert (await run_idempotent(uuid.uuid4(), None, "fp", handler))["call"] == 1
+
+
+async def test_retry_replays_the_stored_response():
+    user, handler = uuid.uuid4(), Handler()
+    first = await run_idempotent(user, "key-1", "fp", handler, status_code=201)
+    second = await run_idempotent(user, "key-1", "fp", handler, status_code=201)
+    assert handler.calls == 1
+    assert (first.status_code, second.status_code) == (201, 201)
+    assert _body(second) == _body(first)
+    assert second.headers[REPLAYED_HEADER] == "true"
+    assert REPLAYED_HEADER.lower() not in first.headers
+
+
+async def test_keys_are_per_user():
+    handler = Handler()
+    await run_idempotent(uuid.uuid4(), "shared", "fp", handler)
+    await run_idempotent(uuid.uuid4(), "shared", "fp", handler)
+    assert handler.calls == 2
+
+
+async def test_reused_key_with_a_different_request_is_a_422():
+    user = uuid.uuid4()
+    await run_idempotent(user, "key-1", "fp-a", Handler())
+    with pytest.raises(HTTPException) as exc:
+        await run_idempotent(user, "key-1", "fp-b", Handler())
+    assert exc.value.status_code == 422
+
+
+@pytest.mark.parametrize("key", ["", "k" * 256])
+async def test_invalid_keys_are_a_400(key):
+    with pytest.raises(HTTPException) as exc:
+        await run_idempotent(uuid.uuid4(), key, "fp", Handler())
+    assert exc.value.status_code == 400
+
+
+async def test_failed_request_releases_its_key():
+    user = uuid.uuid4()
+    with pytest.raises(RuntimeError):
+        await run_idempotent(user, "key-1", "fp", Handler(fail=True))
+    handler = Handler()
+    response = await run_idempotent(user, "key-1", "fp", handler)
+    assert handler.calls == 1 and REPLAYED_HEADER.lower() not in response.headers
+
+
+async def test_concurrent_retry_waits_for_the_original():
+    user, gate = uuid.uuid4(), asyncio.Event()
+    handler = Handler(gate=gate)
+    original = asyncio.create_task(run_idempotent(user, "key-1", "fp", handler))
+    while handler.calls == 0:
+        await asyncio.sleep(0.01)
+    retry = asyncio.create_task(run_idempotent(user, "key-1", "fp", handler))
+    await asyncio.sleep(0.05)
+    assert not retry.done()
+    gate.set()
+    first, second = await asyncio.wait_for(asyncio.gather(original, retry), 10)
+    assert handler.calls == 1
+    assert _body(second) == _body(first) and second.headers[REPLAYED_HEADER] == "true"
+
+
+async def test_still_running_after_the_wait_is_a_409(monkeypatch):
+    monkeypatch.setattr(idempotency.settings, "IDEMPOTENCY_WAIT_SECONDS", 0.05)
+    user, gate = uuid.uuid4(), asyncio.Event()
+    handler = Handler(gate=gate)
+    original = asyncio.create_task(run_idempotent(user, "key-1", "fp", handler))
+    while handler.calls == 0:
+        await asyncio.sleep(0.01)
+    with pytest.raises(HTTPException) as exc:
+        await run_idempotent(user, "key-1", "fp", handler)
+    assert exc.value.status_code == 409 and exc.value.headers["Retry-After"]
+    gate.set()
+    await original
+
+
+async def test_request_that_lost_its_lease_keeps_the_new_owners_row(use_test_database):
+    user, gate = uuid.uuid4(), asyncio.Event()
+    handler = Handler(gate=gate)
+    original = asyncio.create_task(run_idempotent(user, "key-1", "fp", handler))
+    while handler.calls == 0:
+        await asyncio.sleep(0.01)
+
+    # another process took the key over as abandoned while the handler ran
+    async with use_test_database() as db:
+        row = (await db.execute(select(IdempotencyKey).where(IdempotencyKey.user_id == user))).scalar_one()
+        await db.execute(
+            update(IdempotencyKey)
+            .where(IdempotencyKey.user_id == user)
+            .values(locked_at=row.locked_at + timedelta(seconds=1))
+        )
+        await db.commit()
+
+    gate.set()
+    response = await original
+    assert response.status_code == 201 and _body(response)["call"] == 1
+    async with use_test_database() as db:
+        row = (await db.execute(select(IdempotencyKey).where(IdempotencyKey.user_id == user))).scalar_one()
+    assert row.status != IDEMPOTENCY_COMPLETED and row.response_body is None
@@ -0,0 +1,184 @@
+import asyncio
+import time
+
+import httpx
+import openai
+import pytest
+
+from app.core import llm
+from app.core.config import settings
+from app.core.llm import CircuitBreaker, CircuitOpenError, LLMGateway, TokenBucket, _backoff_seconds
+
+pytestmark = pytest.mark.anyio
+
+
+def _api_error(cls, status, headers=None):
+    response = httpx.Response(status, headers=headers, request=httpx.Request("POST", "http://llm.test/v1/chat"))
+    return cls(f"HTTP {status}", response=response, body=None)
+
+
+class Upstream:
+    """Fails with the given errors in turn, then answers."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "answer"
+
+
+@pytest.fixture
+def gateway(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_RPM_LIMIT", 0)
+    monkeypatch.setattr(settings, "LLM_TPM_LIMIT", 0)
+    monkeypatch.setattr(settings, "LLM_MAX_RETRIES", 2)
+    monkeypatch.setattr(settings, "LLM_RETRY_BASE_SECONDS", 0.001)
+    monkeypatch.setattr(settings, "LLM_BREAKER_FAILURE_THRESHOLD", 3)
+    monkeypatch.setattr(settings, "LLM_HEDGE_ENABLED", False)
+    return LLMGateway()
+
+
+# ---------- Token bucket ----------
+
+def test_token_bucket_drains_and_refills(monkeypatch, clock):
+    monkeypatch.setattr(llm.time, "monotonic", clock)
+    bucket = TokenBucket(per_minute=60)  # one per second
+    assert bucket.try_acquire(60)
+    assert not bucket.try_acquire(1)
+    clock.advance(2)
+    assert bucket.try_acquire(2)
+    assert not bucket.try_acquire(1)
+    clock.advance(3600)
+    assert bucket.try_acquire(60) and not bucket.try_acquire(1)  # never beyond capacity
+
+
+def test_token_bucket_adjust_charges_the_real_cost(monkeypatch, clock):
+    monkeypatch.setattr(llm.time, "monotonic", clock)
+    bucket = TokenBucket(per_minute=100)
+    bucket.try_acquire(10)
+    bucket.adjust(40)  # the call used 50 tokens, not the estimated 10
+    assert bucket.tokens == 50
+    bucket.adjust(-20)
+    assert bucket.tokens == 70
+
+
+def test_disabled_token_bucket_never_limits():
+    bucket = TokenBucket(per_minute=0)
+    assert all(bucket.try_acquire(10**9) for _ in range(3))
+
+
+async def test_token_bucket_acquire_waits_for_refill():
+    bucket = TokenBucket(per_minute=600)  # ten per second
+    await bucket.acquire(600)
+    start = time.monotonic()
+    await bucket.acquire(2)
+    assert 0.15 <= time.monotonic() - start < 1.0
+
+
+async def test_oversized_request_waits_for_a_full_bucket_then_overdraws():
+    bucket = TokenBucket(per_minute=600)
+    await bucket.acquire(1000)
+    assert bucket.tokens < -399
+
+
+# ---------- Circuit breaker ----------
+
+def test_breaker_opens_after_consecutive_failures(monkeypatch, clock):
+    monkeypatch.setattr(llm.time, "monotonic", clock)
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=30)
+    breaker.record_failure()
+    breaker.record_success()  # a success resets the count
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError) as exc:
+        breaker.before_call()
+    assert exc.value.retry_after == 30
+
+
+def test_breaker_half_open_allows_one_probe(monkeypatch, clock):
+    monkeypatch.setattr(llm.time, "monotonic", clock)
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=30)
+    breaker.record_failure()
+    clock.advance(30)
+    assert breaker.state == "half_open"
+    breaker.before_call()  # the probe
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+    breaker.before_call()
+
+
+def test_failed_probe_reopens_the_breaker(monkeypatch, clock):
+    monkeypatch.setattr(llm.time, "monotonic", clock)
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=30)
+    breaker.record_failure()
+    clock.advance(31)
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.times_opened == 1  # still the same outage
+
+
+# ---------- Gateway ----------
+
+async def test_retries_transient_errors(gateway):
+    upstream = Upstream(_api_error(openai.InternalServerError, 500), asyncio.TimeoutError())
+    assert await gateway.call(upstream, est_tokens=10) == "answer"
+    assert upstream.calls == 3
+    assert gateway.stats.retries == 2
+    assert gateway.stats.timeouts == 1
+    assert gateway.breaker.failures == 0
+
+
+async def test_gives_up_after_max_retries(gateway):
+    upstream = Upstream(*[_api_error(openai.InternalServerError, 503) for _ in range(5)])
+    with pytest.raises(openai.InternalServerError):
+        await gateway.call(upstream, est_tokens=10)
+    assert upstream.calls == 3  # the first try and LLM_MAX_RETRIES=2 retries
+    assert gateway.stats.failures == 1
+
+
+async def test_client_errors_are_not_retried(gateway):
+    upstream = Upstream(_api_error(openai.BadRequestError, 400))
+    with pytest.raises(openai.BadRequestError):
+        await gateway.call(upstream, est_tokens=10)
+    assert upstream.calls == 1
+    assert gateway.breaker.failures == 0
+
+
+async def test_rate_limits_are_retried_but_do_not_trip_the_breaker(gateway):
+    upstream = Upstream(*[_api_error(openai.RateLimitError, 429) for _ in range(2)])
+    assert await gateway.call(upstream, est_tokens=10) == "answer"
+    assert gateway.stats.rate_limited == 2
+    assert gateway.breaker.failures == 0
+
+
+async def test_open_breaker_fails_fast(gateway, monkeypatch):
+    monkeypatch.setattr(settings, "LLM_MAX_RETRIES", 0)
+    for _ in range(3):
+        with pytest.raises(openai.APIConnectionError):
+            await gateway.call(Upstream(openai.APIConnectionError(request=httpx.Request("POST", "http://x"))),
+                               est_tokens=10)
+    upstream = Upstream()
+    with pytest.raises(CircuitOpenError):
+        await gateway.call(upstream, est_tokens=10)
+    assert upstream.calls == 0
+    assert gateway.stats.rejected == 1
+
+
+def test_backoff_honours_retry_after(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_RETRY_BASE_SECONDS", 0.001)
+    monkeypatch.setattr(settings, "LLM_RETRY_MAX_SECONDS", 20.0)
+    assert _backoff_seconds(1, _api_error(openai.RateLimitError, 429, {"retry-after": "3"})) == 3.0
+    assert _backoff_seconds(1, _api_error(openai.RateLimitError, 429, {"retry-after-ms": "1500"})) == 1.5
+    # capped: a server cannot park the request for an hour
+    assert _backoff_seconds(1, _api_error(openai.RateLimitError, 429, {"retry-after": "3600"})) == 20.0
+    assert _backoff_seconds(1, _api_error(openai.InternalServerError, 500)) <= 0.002
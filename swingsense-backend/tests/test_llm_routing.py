@@ -0,0 +1,49 @@
+import pytest
+
+from app.core.config import settings
+from app.core.llm_routing import TIER_FAST, TIER_STRONG, classify_question, summary_route
+
+
+@pytest.mark.parametrize("question, reason", [
+    ("How do I stop my slice?", "common_fault"),
+    ("What should I practice today", "short"),
+])
+def test_short_questions_go_fast(question, reason):
+    route = classify_question(question)
+    assert route.tier == TIER_FAST
+    assert route.model == settings.LLM_FAST_MODEL
+    assert route.max_tokens == settings.LLM_FAST_MAX_TOKENS
+    assert reason in route.reasons
+
+
+@pytest.mark.parametrize("question, reason", [
+    ("why do I slice? " + "and it gets worse when I swing harder " * 10, "long"),
+    ("Why do I hook my driver? Why do I slice my irons?", "multi_part"),
+    ("1. my grip\n2. my stance\n", "multi_part"),
+    ("compare the biomechanics of a draw", "complex_terms"),
+])
+def test_long_multi_part_or_complex_questions_go_strong(question, reason):
+    route = classify_question(question)
+    assert route.tier == TIER_STRONG
+    assert route.model == settings.LLM_STRONG_MODEL
+    assert reason in route.reasons
+
+
+def test_one_complex_term_alone_stays_fast_but_deep_threads_tip_it():
+    assert classify_question("explain my slice").tier == TIER_FAST
+    route = classify_question("explain my slice", history_turns=settings.LLM_ROUTING_HISTORY_TURNS)
+    assert route.tier == TIER_STRONG
+    assert "history" in route.reasons
+
+
+def test_routing_disabled_sends_everything_strong(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_ROUTING_ENABLED", False)
+    route = classify_question("slice?")
+    assert route.tier == TIER_STRONG
+    assert route.reasons == ("routing_disabled",)
+
+
+def test_summary_route_keeps_its_own_cap():
+    route = summary_route()
+    assert route.max_tokens == settings.THREAD_SUMMARY_MAX_TOKENS
+    assert route.max_tokens_fixed
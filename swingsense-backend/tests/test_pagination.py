@@ -0,0 +1,45 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from app.core.pagination import NEXT_CURSOR_HEADER, cursor_headers, decode_cursor, encode_cursor, split_page
+
+
+def _rows(n):
+    start = datetime(2026, 10, 1, 12, 0, tzinfo=timezone.utc)
+    return [SimpleNamespace(id=uuid.uuid4(), created_at=start - timedelta(minutes=i)) for i in range(n)]
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2026, 10, 18, 9, 30, 15, 123456, tzinfo=timezone.utc)
+    row_id = uuid.uuid4()
+    cursor = encode_cursor(created_at, row_id)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (created_at, row_id)
+
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", "", encode_cursor(datetime(2026, 1, 1), uuid.uuid4())[:-6]])
+def test_invalid_cursor_is_a_400(cursor):
+    with pytest.raises(HTTPException) as exc:
+        decode_cursor(cursor)
+    assert exc.value.status_code == 400
+
+
+def test_split_page_with_a_next_page():
+    rows = _rows(4)
+    page, cursor = split_page(rows, 3)
+    assert page == rows[:3]
+    assert decode_cursor(cursor) == (rows[2].created_at, rows[2].id)
+    assert cursor_headers(cursor) == {NEXT_CURSOR_HEADER: cursor}
+
+
+@pytest.mark.parametrize("count", [0, 2, 3])
+def test_split_page_on_the_last_page(count):
+    rows = _rows(count)
+    page, cursor = split_page(rows, 3)
+    assert page == rows
+    assert cursor is None
+    assert cursor_headers(cursor) == {}
@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+from app.routers.plans import _WeekScanner
+
+PLAN = {
+    "summary": "Fix the slice, then build distance.",
+    "weeks": [
+        {"week": 1, "focus": "Grip {and} alignment", "drills": ["Alignment sticks, 30 balls"], "tips": ['Say "square"']},
+        {"week": 2, "focus": "Path", "drills": ["Headcover drill"], "tips": ["Swing out to right field"]},
+        {"week": 3, "focus": "Tempo", "drills": ["3:1 count"], "tips": ["Smooth, not slow"]},
+    ],
+}
+
+
+def _feed_all(chunks):
+    scanner = _WeekScanner()
+    found = []
+    for chunk in chunks:
+        found.extend(scanner.feed(chunk))
+    return scanner, found
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, 50, 10_000])
+def test_weeks_are_found_whatever_the_chunking(size):
+    text = json.dumps(PLAN, indent=2)
+    scanner, found = _feed_all(text[i:i + size] for i in range(0, len(text), size))
+    assert found == PLAN["weeks"]
+    assert scanner.text == text
+
+
+def test_a_week_is_emitted_as_soon_as_it_closes():
+    text = json.dumps(PLAN)
+    end_of_first = text.rindex("}", 0, text.index('"week": 2')) + 1
+    scanner = _WeekScanner()
+    assert scanner.feed(text[:end_of_first - 1]) == []
+    assert scanner.feed(text[end_of_first - 1:end_of_first]) == [PLAN["weeks"][0]]
+
+
+def test_braces_and_quotes_inside_strings_do_not_split_weeks():
+    text = json.dumps(PLAN)
+    _, found = _feed_all(text[i:i + 2] for i in range(0, len(text), 2))
+    assert found[0]["focus"] == "Grip {and} alignment"
+    assert found[0]["tips"] == ['Say "square"']
+
+
+def test_no_weeks_key_yet():
+    scanner = _WeekScanner()
+    assert scanner.feed('{"summary": "weeks [ coming"') == []
@@ -0,0 +1,51 @@
+import uuid
+
+import pytest
+
+from app.core import profiles
+from app.core.profiles import ProfileCache
+
+
+@pytest.fixture(autouse=True)
+def fake_monotonic(monkeypatch, clock):
+    monkeypatch.setattr(profiles.time, "monotonic", clock)
+    return clock
+
+
+def test_profile_cache_hit_miss_and_ttl(clock):
+    cache = ProfileCache(maxsize=10, ttl_seconds=60)
+    user = uuid.uuid4()
+    assert cache.get(user) == (False, None)
+
+    cache.put(user, {"handicap": 12.0})
+    assert cache.get(user) == (True, {"handicap": 12.0})
+
+    clock.advance(61)
+    assert cache.get(user) == (False, None)
+    assert cache.info()["entries"] == 0
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_profile_cache_remembers_missing_profiles():
+    cache = ProfileCache(maxsize=10, ttl_seconds=60)
+    user = uuid.uuid4()
+    cache.put(user, None)
+    assert cache.get(user) == (True, None)
+
+
+def test_profile_cache_evicts_least_recently_used():
+    cache = ProfileCache(maxsize=2, ttl_seconds=60)
+    a, b, c = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    cache.put(a, {"name": "a"})
+    cache.put(b, {"name": "b"})
+    cache.get(a)  # a is now the most recent
+    cache.put(c, {"name": "c"})
+    assert cache.get(b) == (False, None)
+    assert cache.get(a)[0] and cache.get(c)[0]
+
+
+def test_profile_cache_disabled_with_zero_ttl():
+    cache = ProfileCache(maxsize=10, ttl_seconds=0)
+    user = uuid.uuid4()
+    cache.put(user, {"name": "x"})
+    assert cache.get(user) == (False, None)
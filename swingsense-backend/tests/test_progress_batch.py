@@ -0,0 +1,38 @@
+import pytest
+from fastapi import HTTPException
+
+from app.routers.progress import _parse_batch
+
+NDJSON = "application/x-ndjson"
+
+
+def test_ndjson_and_array_bodies():
+    assert _parse_batch(b'{"a": 1}\n\n{"b": 2.5}\n', NDJSON) == [{"a": 1}, {"b": 2.5}]
+    assert _parse_batch(b'[{"a": 1}, {"s": "NaN"}]', "application/json") == [{"a": 1}, {"s": "NaN"}]
+
+
+@pytest.mark.parametrize("constant", ["NaN", "Infinity", "-Infinity"])
+def test_non_finite_numbers_name_the_ndjson_line(constant):
+    body = f'{{"a": 1}}\n{{"b": {{"c": [1, {constant}]}}}}\n'.encode()
+    with pytest.raises(HTTPException) as exc:
+        _parse_batch(body, NDJSON)
+    assert exc.value.status_code == 400
+    assert exc.value.detail == f"Invalid JSON on line 2: {constant} is not a number"
+
+
+def test_non_finite_numbers_name_the_array_index():
+    with pytest.raises(HTTPException) as exc:
+        _parse_batch(b'[{"a": 1}, {"b": NaN}]', "application/json")
+    assert exc.value.status_code == 400
+    assert exc.value.detail == "Invalid JSON at index 1: NaN is not a number"
+
+
+@pytest.mark.parametrize("body, content_type", [
+    (b'{"a": 1}\n{"b": }\n', NDJSON),
+    (b'{"a": 1}', "application/json"),
+    (b"NaN", "application/json"),
+])
+def test_malformed_bodies_are_a_400(body, content_type):
+    with pytest.raises(HTTPException) as exc:
+        _parse_batch(body, content_type)
+    assert exc.value.status_code == 400
@@ -0,0 +1,46 @@
+import uuid
+
+import pytest
+
+from app.core import http_cache
+from app.core.http_cache import ResponseCache
+
+
+@pytest.fixture(autouse=True)
+def fake_monotonic(monkeypatch, clock):
+    monkeypatch.setattr(http_cache.time, "monotonic", clock)
+    return clock
+
+
+def test_response_cache_requires_the_current_etag(clock):
+    cache = ResponseCache(maxsize=10, ttl_seconds=60)
+    key = (uuid.uuid4(), "questions", "threads?")
+    cache.put(key, 'W/"v1"', b"[]", {"X-Next-Cursor": "abc"})
+    assert cache.get(key, 'W/"v1"') == (b"[]", {"X-Next-Cursor": "abc"})
+    # a newer version invalidates the stored body
+    assert cache.get(key, 'W/"v2"') is None
+    assert cache.get(key, 'W/"v1"') is None
+
+
+def test_response_cache_ttl(clock):
+    cache = ResponseCache(maxsize=10, ttl_seconds=5)
+    key = (uuid.uuid4(), "plans", "current?")
+    cache.put(key, "e", b"{}", {})
+    clock.advance(5)
+    assert cache.get(key, "e") is None
+
+
+def test_response_cache_lru_and_invalidate():
+    cache = ResponseCache(maxsize=2, ttl_seconds=60)
+    user, other = uuid.uuid4(), uuid.uuid4()
+    first, second, third = (user, "questions", "a"), (user, "questions", "b"), (other, "questions", "a")
+    cache.put(first, "e", b"1", {})
+    cache.put(second, "e", b"2", {})
+    cache.get(first, "e")
+    cache.put(third, "e", b"3", {})
+    assert cache.get(second, "e") is None
+    assert cache.get(first, "e") == (b"1", {})
+
+    cache.invalidate(user, "questions")
+    assert cache.get(first, "e") is None
+    assert cache.get(third, "e") == (b"3", {})
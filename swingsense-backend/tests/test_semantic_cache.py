@@ -0,0 +1,115 @@
+import time
+import uuid
+
+import numpy as np
+import pytest
+
+from app.core import semantic_cache as sc
+from app.core.config import settings
+from app.core.semantic_cache import CacheHit, NumpyIndex, SemanticCache, normalize_question
+
+pytestmark = pytest.mark.anyio
+
+DIM = 8
+
+
+def _unit(*values):
+    vec = np.zeros(DIM, dtype=np.float32)
+    vec[:len(values)] = values
+    return vec / np.linalg.norm(vec)
+
+
+class FailingDB:
+    """An AsyncSession whose statements fail, like a database without the vector extension."""
+
+    def __init__(self):
+        self.executed = 0
+        self.rolled_back = 0
+
+    async def execute(self, stmt):
+        self.executed += 1
+        raise RuntimeError('type "vector" does not exist')
+
+    async def rollback(self):
+        self.rolled_back += 1
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    monkeypatch.setattr(settings, "SEMANTIC_CACHE_BACKEND", "pgvector")
+    monkeypatch.setattr(settings, "SEMANTIC_CACHE_THRESHOLD", 0.9)
+    monkeypatch.setattr(settings, "SEMANTIC_CACHE_PGVECTOR_RETRY_SECONDS", 30.0)
+    monkeypatch.setattr(settings, "EMBEDDING_DIM", DIM)
+    return SemanticCache()
+
+
+def test_normalize_question():
+    assert normalize_question("  How do I   fix my SLICE?? ") == "how do i fix my slice"
+
+
+def test_numpy_index_returns_the_closest_entry_above_the_threshold():
+    index = NumpyIndex(DIM, max_entries=10)
+    slice_id, hook_id = uuid.uuid4(), uuid.uuid4()
+    index.add(slice_id, _unit(1, 0), "open clubface")
+    index.add(hook_id, _unit(0, 1), "closed clubface")
+
+    hit = index.search(_unit(1, 0.1), threshold=0.9)
+    assert (hit.question_id, hit.feedback) == (slice_id, "open clubface")
+    assert hit.similarity == pytest.approx(0.995, abs=1e-3)
+    assert index.search(_unit(1, 1), threshold=0.9) is None
+
+
+def test_numpy_index_ignores_expired_entries_and_keeps_the_newest(monkeypatch):
+    monkeypatch.setattr(settings, "SEMANTIC_CACHE_TTL_SECONDS", 60)
+    index = NumpyIndex(DIM, max_entries=2)
+    index.add(uuid.uuid4(), _unit(1, 0), "old", stamp=time.time() - 61)
+    assert len(index) == 0
+
+    first, second, third = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    index.add(first, _unit(1, 0), "first")
+    index.add(second, _unit(0, 1), "second")
+    index.add(third, _unit(0, 0, 1), "third")
+    assert len(index) == 2
+    assert index.search(_unit(1, 0), threshold=0.9) is None
+    assert index.search(_unit(0, 0, 1), threshold=0.9).question_id == third
+
+
+async def test_numpy_backend_never_touches_the_database(cache, monkeypatch):
+    monkeypatch.setattr(settings, "SEMANTIC_CACHE_BACKEND", "numpy")
+    cache = SemanticCache()
+    question_id = uuid.uuid4()
+    cache.remember(question_id, _unit(1, 0), "feedback")
+    db = FailingDB()
+    assert (await cache.lookup(db, _unit(1, 0))).question_id == question_id
+    assert db.executed == 0
+    assert cache.backend == "numpy" and not cache.persists_embeddings
+
+
+async def test_failed_pgvector_lookup_falls_back_to_numpy(cache):
+    assert cache.backend == "pgvector" and cache.persists_embeddings
+    db = FailingDB()
+    assert await cache.lookup(db, _unit(1, 0)) is None
+    assert (db.executed, db.rolled_back) == (1, 1)
+    # during the cooldown answers go to the in-process index and are served from it
+    assert cache.backend == "numpy" and not cache.persists_embeddings
+    question_id = uuid.uuid4()
+    cache.remember(question_id, _unit(1, 0), "feedback")
+    hit = await cache.lookup(db, _unit(1, 0))
+    assert isinstance(hit, CacheHit) and hit.question_id == question_id
+    assert db.executed == 1
+    assert cache.stats.snapshot()["hits"] == 1
+
+
+async def test_pgvector_is_retried_after_the_cooldown(cache, monkeypatch, clock):
+    monkeypatch.setattr(sc.time, "monotonic", clock)
+    db = FailingDB()
+    await cache.lookup(db, _unit(1, 0))
+    clock.advance(29)
+    await cache.lookup(db, _unit(1, 0))
+    assert db.executed == 1
+
+    clock.advance(1)
+    assert cache.backend == "pgvector"
+    await cache.lookup(db, _unit(1, 0))
+    assert db.executed == 2
+    assert cache.backend == "numpy"  # failed again: another cooldown
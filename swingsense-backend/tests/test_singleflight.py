@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+from app.core.singleflight import SingleFlight
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_concurrent_callers_share_one_execution():
+    flight = SingleFlight()
+    calls = 0
+    release = asyncio.Event()
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return "answer"
+
+    waiters = [asyncio.create_task(flight.do("slice", work, timeout=5)) for _ in range(5)]
+    await asyncio.sleep(0)
+    release.set()
+
+    assert await asyncio.gather(*waiters) == ["answer"] * 5
+    assert calls == 1
+    assert flight.snapshot() == {"executed": 1, "coalesced": 4, "errors": 0, "timeouts": 0, "inflight": 0}
+
+
+async def test_different_keys_run_separately():
+    flight = SingleFlight()
+
+    async def work(value):
+        await asyncio.sleep(0)
+        return value
+
+    results = await asyncio.gather(flight.do("a", lambda: work(1), 5), flight.do("b", lambda: work(2), 5))
+    assert results == [1, 2]
+    assert flight.executed == 2
+
+
+async def test_every_caller_gets_the_same_exception_and_the_key_is_freed():
+    flight = SingleFlight()
+
+    async def boom():
+        await asyncio.sleep(0)
+        raise RuntimeError("upstream down")
+
+    results = await asyncio.gather(*(flight.do("k", boom, timeout=5) for _ in range(3)), return_exceptions=True)
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert flight.errors == 1
+    assert flight.snapshot()["inflight"] == 0
+
+    async def ok():
+        return "recovered"
+
+    assert await flight.do("k", ok, timeout=5) == "recovered"
+
+
+async def test_timeout_cancels_the_shared_call():
+    flight = SingleFlight()
+    cancelled = asyncio.Event()
+
+    async def stuck():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    with pytest.raises(asyncio.TimeoutError):
+        await flight.do("k", stuck, timeout=0.05)
+    await asyncio.wait_for(cancelled.wait(), timeout=1)
+    assert flight.timeouts == 1
+    await asyncio.sleep(0)
+    assert flight.snapshot()["inflight"] == 0
+
+
+async def test_cancelled_waiter_does_not_cancel_the_others():
+    flight = SingleFlight()
+    release = asyncio.Event()
+
+    async def work():
+        await release.wait()
+        return "done"
+
+    first = asyncio.create_task(flight.do("k", work, timeout=5))
+    second = asyncio.create_task(flight.do("k", work, timeout=5))
+    await asyncio.sleep(0)
+    first.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await first
+
+    release.set()
+    assert await second == "done"
+    assert flight.executed == 1
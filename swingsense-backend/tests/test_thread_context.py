@@ -0,0 +1,75 @@
+import pytest
+
+from app.core.config import settings
+from app.core.llm import MESSAGE_OVERHEAD_TOKENS, count_tokens
+from app.core.thread_context import Turn, _truncate, build_messages
+
+SYSTEM = "You are a golf coach."
+
+
+def _total(messages):
+    return sum(count_tokens(m["content"]) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+
+def _turns(n, words=20):
+    return [Turn(f"question {i} " + "grip " * words, f"answer {i} " + "rotate " * words) for i in range(n)]
+
+
+@pytest.fixture
+def budget(monkeypatch):
+    def set_budget(tokens, turns=4):
+        monkeypatch.setattr(settings, "THREAD_CONTEXT_TOKEN_BUDGET", tokens)
+        monkeypatch.setattr(settings, "THREAD_CONTEXT_TURNS", turns)
+    return set_budget
+
+
+def test_everything_fits(budget):
+    budget(10_000)
+    messages = build_messages(SYSTEM, "and my driver?", "Player slices.", _turns(2))
+    assert [m["role"] for m in messages] == ["system", "system", "user", "assistant", "user", "assistant", "user"]
+    assert messages[1]["content"].endswith("Player slices.")
+    assert messages[-1] == {"role": "user", "content": "and my driver?"}
+
+
+def test_only_the_last_k_turns_are_sent(budget):
+    budget(10_000, turns=2)
+    messages = build_messages(SYSTEM, "next?", None, _turns(5))
+    questions = [m["content"] for m in messages if m["role"] == "user"][:-1]
+    assert [q.split()[1] for q in questions] == ["3", "4"]
+
+
+def test_budget_drops_oldest_turns_first_and_is_never_exceeded(budget):
+    budget(150)
+    turns = _turns(4)
+    messages = build_messages(SYSTEM, "next?", None, turns)
+    assert _total(messages) <= 150
+    kept = [m["content"] for m in messages if m["role"] == "assistant"]
+    assert kept and kept[-1] == turns[-1].answer
+    assert len(kept) < len(turns)
+
+
+def test_latest_turn_outranks_the_summary_which_is_shortened(budget):
+    budget(160)
+    turns = _turns(3)
+    summary = "earlier advice " * 200
+    messages = build_messages(SYSTEM, "next?", summary, turns)
+    assert _total(messages) <= 160
+    assert turns[-1].answer in [m["content"] for m in messages]
+    summaries = [m for m in messages[1:] if m["role"] == "system"]
+    if summaries:
+        assert len(summaries[0]["content"]) < len(summary)
+
+
+def test_question_and_system_prompt_are_always_kept(budget):
+    budget(10)
+    messages = build_messages(SYSTEM, "why do I shank it?", "summary " * 50, _turns(3))
+    assert messages == [{"role": "system", "content": SYSTEM}, {"role": "user", "content": "why do I shank it?"}]
+
+
+def test_truncate_keeps_whole_words_within_the_limit():
+    text = "keep your head still through impact " * 20
+    short = _truncate(text, 10)
+    assert count_tokens(short) <= 10
+    assert text.startswith(short)
+    assert _truncate(text, 0) == ""
+    assert _truncate("short", 10) == "short"
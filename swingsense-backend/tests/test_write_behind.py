@@ -0,0 +1,145 @@
+import asyncio
+import uuid
+
+import pytest
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app.db import write_behind as wb
+from app.db.write_behind import DURABILITY_BUFFERED, DURABILITY_COMMIT, WriteBehindBuffer
+
+pytestmark = pytest.mark.anyio
+
+
+class BadRow(Exception):
+    pass
+
+
+class RecordingBuffer(WriteBehindBuffer):
+    """Writes to a list instead of the database; a batch holding a row with "bad" fails."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.stream = f"test-{uuid.uuid4().hex[:8]}"  # own metric series per test
+        self.batches = []
+        self.gate = None  # set to an asyncio.Event to hold writes until it is set
+        self.register(self.stream, None)
+
+    async def _write(self, stream, rows, relaxed):
+        if self.gate is not None:
+            await self.gate.wait()
+        if any(row.get("bad") for row in rows):
+            raise BadRow("bad row")
+        self.batches.append([row["n"] for row in rows])
+
+
+def _count(counter, stream, **labels):
+    return counter._values.get(tuple(str(v) for v in (stream, *labels.values())), 0)
+
+
+@pytest.fixture
+def buffer(monkeypatch):
+    monkeypatch.setattr(settings, "WRITE_BEHIND_DURABILITY", DURABILITY_COMMIT)
+    monkeypatch.setattr(settings, "WRITE_BEHIND_FLUSH_MS", 10_000.0)
+    monkeypatch.setattr(settings, "WRITE_BEHIND_MAX_BATCH", 3)
+    monkeypatch.setattr(settings, "WRITE_BEHIND_MAX_PENDING", 100)
+    monkeypatch.setattr(settings, "WRITE_BEHIND_MAX_ATTEMPTS", 2)
+    monkeypatch.setattr(wb, "_RETRY_BACKOFF_SECONDS", 0.0)
+    return RecordingBuffer()
+
+
+async def test_writes_inline_when_not_started(buffer):
+    await buffer.add(buffer.stream, {"n": 1})
+    assert buffer.batches == [[1]]
+
+
+async def test_unknown_stream_is_an_error(buffer):
+    with pytest.raises(KeyError):
+        await buffer.add("nope", {"n": 1})
+
+
+async def test_size_trigger_flushes_one_batch(buffer):
+    await buffer.start()
+    try:
+        await asyncio.wait_for(asyncio.gather(*(buffer.add(buffer.stream, {"n": n}) for n in range(3))), 5)
+    finally:
+        await buffer.stop()
+    assert buffer.batches == [[0, 1, 2]]
+    assert _count(wb.flushes, buffer.stream, trigger="size") == 1
+    assert _count(wb.rows_written, buffer.stream) == 3
+
+
+async def test_time_trigger_flushes_a_partial_batch(buffer, monkeypatch):
+    monkeypatch.setattr(settings, "WRITE_BEHIND_FLUSH_MS", 10.0)
+    await buffer.start()
+    try:
+        await asyncio.wait_for(asyncio.gather(*(buffer.add(buffer.stream, {"n": n}) for n in range(2))), 5)
+    finally:
+        await buffer.stop()
+    assert buffer.batches == [[0, 1]]
+    assert _count(wb.flushes, buffer.stream, trigger="time") == 1
+
+
+async def test_stop_flushes_queued_rows(buffer, monkeypatch):
+    monkeypatch.setattr(settings, "WRITE_BEHIND_DURABILITY", DURABILITY_BUFFERED)
+    await buffer.start()
+    await buffer.add(buffer.stream, {"n": 1})
+    assert buffer.batches == []
+    await buffer.stop()
+    assert buffer.batches == [[1]]
+    assert _count(wb.flushes, buffer.stream, trigger="shutdown") == 1
+    assert not buffer.running
+
+
+async def test_a_bad_row_fails_alone(buffer):
+    await buffer.start()
+    try:
+        results = await asyncio.wait_for(asyncio.gather(
+            buffer.add(buffer.stream, {"n": 0}),
+            buffer.add(buffer.stream, {"n": 1, "bad": True}),
+            buffer.add(buffer.stream, {"n": 2}),
+            return_exceptions=True,
+        ), 5)
+    finally:
+        await buffer.stop()
+    assert results[0] is None and results[2] is None
+    assert isinstance(results[1], BadRow)
+    assert buffer.batches == [[0], [2]]
+    assert _count(wb.rows_written, buffer.stream) == 2
+    # the caller got the error: nothing was dropped
+    assert _count(wb.dropped, buffer.stream) == 0
+
+
+async def test_buffered_mode_drops_only_the_bad_row(buffer, monkeypatch):
+    monkeypatch.setattr(settings, "WRITE_BEHIND_DURABILITY", DURABILITY_BUFFERED)
+    await buffer.start()
+    for n in range(3):
+        await buffer.add(buffer.stream, {"n": n, "bad": n == 1})
+    await buffer.stop()
+    assert buffer.batches == [[0], [2]]
+    assert _count(wb.dropped, buffer.stream) == 1
+
+
+async def test_backpressure_rejects_with_503(buffer, monkeypatch):
+    monkeypatch.setattr(settings, "WRITE_BEHIND_DURABILITY", DURABILITY_BUFFERED)
+    monkeypatch.setattr(settings, "WRITE_BEHIND_FLUSH_MS", 0.0)
+    monkeypatch.setattr(settings, "WRITE_BEHIND_MAX_PENDING", 2)
+    monkeypatch.setattr(settings, "WRITE_BEHIND_BLOCK_SECONDS", 0.05)
+    buffer.gate = asyncio.Event()
+    await buffer.start()
+    try:
+        await buffer.add(buffer.stream, {"n": 0})
+        await buffer.add(buffer.stream, {"n": 1})
+        with pytest.raises(HTTPException) as exc:
+            await buffer.add(buffer.stream, {"n": 2})
+        assert exc.value.status_code == 503
+        assert exc.value.headers == {"Retry-After": "1"}
+        assert _count(wb.rejected, buffer.stream) == 1
+
+        # once the stuck write finishes there is room again
+        buffer.gate.set()
+        await asyncio.wait_for(buffer.add(buffer.stream, {"n": 3}), 5)
+    finally:
+        buffer.gate.set()
+        await buffer.stop()
+    assert sorted(n for batch in buffer.batches for n in batch) == [0, 1, 3]